@@ -0,0 +1,50 @@
+"""Add obituaries.updated_at
+
+Revision ID: 0a7c5e9b3d21
+Revises: f2b6d8a4c1e9
+Create Date: 2026-10-19 21:14:02.639874
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a7c5e9b3d21'
+down_revision: Union[str, None] = 'f2b6d8a4c1e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Kept current by a trigger, so raw SQL updates (bulk jobs, scripts) count too
+TRIGGER_FUNCTION_SQL = """
+CREATE FUNCTION obituaries_set_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+TRIGGER_SQL = """
+CREATE TRIGGER obituaries_updated_at BEFORE UPDATE ON obituaries
+FOR EACH ROW EXECUTE FUNCTION obituaries_set_updated_at()
+"""
+
+
+def upgrade() -> None:
+    # Existing rows take their creation time
+    op.add_column('obituaries', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE obituaries SET updated_at = created_at")
+    op.alter_column('obituaries', 'updated_at', nullable=False, server_default=sa.text('now()'))
+    op.create_index(op.f('ix_obituaries_updated_at'), 'obituaries', ['updated_at'], unique=False)
+    op.execute(TRIGGER_FUNCTION_SQL)
+    op.execute(TRIGGER_SQL)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER obituaries_updated_at ON obituaries")
+    op.execute("DROP FUNCTION obituaries_set_updated_at()")
+    op.drop_index(op.f('ix_obituaries_updated_at'), table_name='obituaries')
+    op.drop_column('obituaries', 'updated_at')
@@ -0,0 +1,33 @@
+"""Add ingest checkpoints
+
+Revision ID: 3f1c9d2b7e4a
+Revises: aa3a502383be
+Create Date: 2026-10-19 09:12:41.218530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9d2b7e4a'
+down_revision: Union[str, None] = 'aa3a502383be'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ingest_checkpoints',
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('records_read', sa.BigInteger(), nullable=False),
+        sa.Column('rows_loaded', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('source')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('ingest_checkpoints')
@@ -0,0 +1,36 @@
+"""Add final_score leaderboard indexes
+
+Revision ID: 6d3a9f1b2c84
+Revises: 0a7c5e9b3d21
+Create Date: 2026-10-19 23:02:17.418306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d3a9f1b2c84'
+down_revision: Union[str, None] = '0a7c5e9b3d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SCORED = sa.text('final_score IS NOT NULL')
+
+
+def upgrade() -> None:
+    # Partial, so unscored rows don't take up space. Partitioned tables can't
+    # build indexes concurrently; each partition gets a local copy
+    op.create_index('ix_obituaries_style_final_score', 'obituaries',
+                    ['obituary_style', sa.text('final_score DESC'), sa.text('id DESC')],
+                    unique=False, postgresql_where=SCORED)
+    op.create_index('ix_obituaries_final_score', 'obituaries',
+                    [sa.text('final_score DESC'), sa.text('id DESC')],
+                    unique=False, postgresql_where=SCORED)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_obituaries_final_score', table_name='obituaries')
+    op.drop_index('ix_obituaries_style_final_score', table_name='obituaries')
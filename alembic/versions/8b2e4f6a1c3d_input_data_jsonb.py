@@ -0,0 +1,87 @@
+"""Store input_data as JSONB with extracted columns
+
+Revision ID: 8b2e4f6a1c3d
+Revises: 3f1c9d2b7e4a
+Create Date: 2026-10-19 14:03:27.511942
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4f6a1c3d'
+down_revision: Union[str, None] = '3f1c9d2b7e4a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows per UPDATE when unwrapping double-encoded input_data
+BATCH_SIZE = 5000
+
+UNWRAP_BATCH_SQL = """
+UPDATE obituaries
+SET input_data = (input_data #>> '{}')::json
+WHERE id >= :start AND id < :stop AND json_typeof(input_data) = 'string'
+"""
+
+
+def year_expression(key: str, date_key: str) -> str:
+    # Structured inputs carry the year; scratchpad inputs a free-form date
+    return (
+        f"CASE WHEN input_data ->> '{key}' ~ '^[0-9]{{1,4}}$' "
+        f"THEN (input_data ->> '{key}')::integer "
+        f"ELSE substring(input_data #>> '{{additional_fields,{date_key}}}' FROM '([0-9]{{4}})')::integer END"
+    )
+
+
+GENERATED_COLUMNS = (
+    ('name', sa.String(),
+     "COALESCE(input_data ->> 'name', NULLIF(btrim("
+     "COALESCE(input_data #>> '{additional_fields,first_name}', '') || ' ' || "
+     "COALESCE(input_data #>> '{additional_fields,last_name}', '')), ''))"),
+    ('birth_year', sa.Integer(), year_expression('birth_year', 'date_of_birth')),
+    ('death_year', sa.Integer(), year_expression('death_year', 'date_of_death')),
+    ('obituary_style', sa.String(), "input_data ->> 'obituary_style'"),
+    ('obituary_length', sa.String(), "input_data ->> 'obituary_length'"),
+)
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+
+    # Rows written with json.dumps() hold a JSON string wrapping the object.
+    # Unwrap them while the column is still json, in id ranges committed one
+    # at a time, so only the rows of the current batch are locked
+    with op.get_context().autocommit_block():
+        low, high = connection.execute(sa.text("SELECT min(id), max(id) FROM obituaries")).one()
+        if low is not None:
+            for start in range(low, high + 1, BATCH_SIZE):
+                connection.execute(sa.text(UNWRAP_BATCH_SQL), {"start": start, "stop": start + BATCH_SIZE})
+
+    # The type change and the generated columns each rewrite the table under
+    # an ACCESS EXCLUSIVE lock, so they share one ALTER TABLE and one rewrite
+    actions = ["ALTER COLUMN input_data TYPE jsonb USING input_data::jsonb"]
+    for name, type_, expression in GENERATED_COLUMNS:
+        actions.append(f"ADD COLUMN {name} {type_.compile(dialect=connection.dialect)} "
+                       f"GENERATED ALWAYS AS ({expression}) STORED")
+    op.execute("ALTER TABLE obituaries\n    " + ",\n    ".join(actions))
+
+    # Built concurrently so writes continue meanwhile
+    with op.get_context().autocommit_block():
+        for name, _, _ in GENERATED_COLUMNS:
+            op.create_index(op.f(f'ix_obituaries_{name}'), 'obituaries', [name],
+                            unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    for name, _, _ in reversed(GENERATED_COLUMNS):
+        op.drop_index(op.f(f'ix_obituaries_{name}'), table_name='obituaries')
+        op.drop_column('obituaries', name)
+    op.alter_column('obituaries', 'input_data',
+               existing_type=postgresql.JSONB(astext_type=sa.Text()),
+               type_=sa.JSON(),
+               existing_nullable=False,
+               postgresql_using='input_data::json')
@@ -0,0 +1,32 @@
+"""Add embedding_backfills
+
+Revision ID: a58d3e7c2f61
+Revises: e3b7c1d4f9a2
+Create Date: 2026-10-20 11:38:09.264517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a58d3e7c2f61'
+down_revision: Union[str, None] = 'e3b7c1d4f9a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'embedding_backfills',
+        sa.Column('model', sa.String(), nullable=False),
+        sa.Column('dims', sa.Integer(), nullable=False),
+        sa.Column('checked_through', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('model', 'dims')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('embedding_backfills')
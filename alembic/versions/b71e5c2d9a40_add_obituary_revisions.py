@@ -0,0 +1,37 @@
+"""Add obituary_revisions
+
+Revision ID: b71e5c2d9a40
+Revises: 6d3a9f1b2c84
+Create Date: 2026-10-20 00:12:45.093817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71e5c2d9a40'
+down_revision: Union[str, None] = '6d3a9f1b2c84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # No foreign key into the partitioned obituaries table, as for obituary_embeddings
+    op.create_table(
+        'obituary_revisions',
+        sa.Column('obituary_id', sa.Integer(), nullable=False),
+        sa.Column('revision', sa.Integer(), nullable=False),
+        sa.Column('generated_text', sa.String(), nullable=False),
+        sa.Column('changed_fields', postgresql.JSONB(astext_type=sa.Text()), server_default='{}', nullable=False),
+        sa.Column('obit_metadata', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('obituary_id', 'revision')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('obituary_revisions')
@@ -0,0 +1,35 @@
+"""Add name prefix and HNSW embedding indexes
+
+Revision ID: c47d9e1f2a6b
+Revises: 8b2e4f6a1c3d
+Create Date: 2026-10-19 15:41:08.730215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47d9e1f2a6b'
+down_revision: Union[str, None] = '8b2e4f6a1c3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Built concurrently so writes continue while the HNSW graph is built
+    with op.get_context().autocommit_block():
+        op.create_index('ix_obituaries_name_prefix', 'obituaries',
+                        [sa.text('lower(name) text_pattern_ops')],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_obituaries_embedding_hnsw', 'obituaries', ['embedding'],
+                        unique=False, postgresql_using='hnsw',
+                        postgresql_ops={'embedding': 'vector_cosine_ops'},
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_obituaries_embedding_hnsw', table_name='obituaries', postgresql_using='hnsw')
+    op.drop_index('ix_obituaries_name_prefix', table_name='obituaries')
@@ -0,0 +1,31 @@
+"""Add a default partition to obituaries
+
+Revision ID: d94f2a6c8e15
+Revises: b71e5c2d9a40
+Create Date: 2026-10-20 09:41:27.530164
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd94f2a6c8e15'
+down_revision: Union[str, None] = 'b71e5c2d9a40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Takes rows for months that have no partition yet, instead of failing the
+    # insert; scripts.maintain_partitions moves them into their months.
+    # f2b6d8a4c1e9 creates it too, so this only adds it to databases that were
+    # partitioned before it did
+    op.execute("CREATE TABLE IF NOT EXISTS obituaries_default PARTITION OF obituaries DEFAULT")
+
+
+def downgrade() -> None:
+    # Left in place: it may be the one f2b6d8a4c1e9 created, holding rows
+    # older than any monthly partition
+    pass
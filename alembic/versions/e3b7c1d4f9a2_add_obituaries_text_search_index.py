@@ -0,0 +1,31 @@
+"""Add the full-text search index on generated_text
+
+Revision ID: e3b7c1d4f9a2
+Revises: d94f2a6c8e15
+Create Date: 2026-10-20 10:26:51.847302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b7c1d4f9a2'
+down_revision: Union[str, None] = 'd94f2a6c8e15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Must match the expression in app.services.search.text_search, or the
+    # planner won't use it. Partitioned tables can't build indexes
+    # concurrently; each partition gets a local copy
+    op.create_index('ix_obituaries_text_search', 'obituaries',
+                    [sa.text("to_tsvector('english', generated_text)")],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_obituaries_text_search', table_name='obituaries')
@@ -0,0 +1,47 @@
+"""Add model-versioned obituary embeddings
+
+Revision ID: e5a8c3b7d9f0
+Revises: c47d9e1f2a6b
+Create Date: 2026-10-19 17:22:54.106387
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a8c3b7d9f0'
+down_revision: Union[str, None] = 'c47d9e1f2a6b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Existing embeddings were all made with this model, at its native size
+BACKFILL_SQL = """
+INSERT INTO obituary_embeddings (obituary_id, model, dims, content_hash, embedding)
+SELECT id, 'text-embedding-ada-002', 1536,
+       encode(sha256(convert_to(generated_text, 'UTF8')), 'hex'), embedding
+FROM obituaries
+WHERE embedding IS NOT NULL
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        'obituary_embeddings',
+        sa.Column('obituary_id', sa.Integer(), nullable=False),
+        sa.Column('model', sa.String(), nullable=False),
+        sa.Column('dims', sa.Integer(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('embedding', Vector(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['obituary_id'], ['obituaries.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('obituary_id', 'model', 'dims')
+    )
+    op.execute(BACKFILL_SQL)
+
+
+def downgrade() -> None:
+    op.drop_table('obituary_embeddings')
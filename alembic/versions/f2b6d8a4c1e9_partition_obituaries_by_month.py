@@ -0,0 +1,137 @@
+"""Restore created_at and partition obituaries by month
+
+Revision ID: f2b6d8a4c1e9
+Revises: e5a8c3b7d9f0
+Create Date: 2026-10-19 19:05:36.482917
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b6d8a4c1e9'
+down_revision: Union[str, None] = 'e5a8c3b7d9f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partitions created beyond the current month
+MONTHS_AHEAD = 3
+# Months with rows get their own partition back this far; older rows go to
+# the default partition (app.core.partitions.BACKFILL_MONTHS)
+BACKFILL_MONTHS = 24
+
+# The original created_at values were dropped with the column, so this is a
+# best effort: a timestamp carried in obit_metadata (e.g. from bulk ingest),
+# otherwise the time of this migration. Never later than now. A value shaped
+# like a date can still be impossible (2023-02-30), so the cast is caught
+# rather than failing the migration.
+CREATED_AT_FUNCTION = """
+CREATE FUNCTION pg_temp.obituary_created_at(metadata json) RETURNS timestamptz AS $$
+BEGIN
+    IF metadata ->> 'created_at' ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}([ T][0-9:.]+)?([+-][0-9:]+|Z)?$' THEN
+        RETURN LEAST((metadata ->> 'created_at')::timestamptz, now());
+    END IF;
+    RETURN now();
+EXCEPTION WHEN data_exception THEN
+    RETURN now();
+END
+$$ LANGUAGE plpgsql STABLE
+"""
+CREATED_AT_SQL = "pg_temp.obituary_created_at(obit_metadata)"
+
+STORED_COLUMNS = "id, input_data, generated_text, openai_score, teacher_score, final_score, embedding, obit_metadata"
+
+INDEXED_COLUMNS = ('created_at', 'name', 'birth_year', 'death_year', 'obituary_style', 'obituary_length')
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_indexes() -> None:
+    # Created on the parent, so each partition gets its own local copy
+    for name in INDEXED_COLUMNS:
+        op.create_index(op.f(f'ix_obituaries_{name}'), 'obituaries', [name], unique=False)
+    op.create_index('ix_obituaries_name_prefix', 'obituaries',
+                    [sa.text('lower(name) text_pattern_ops')], unique=False)
+    op.create_index('ix_obituaries_embedding_hnsw', 'obituaries', ['embedding'],
+                    unique=False, postgresql_using='hnsw',
+                    postgresql_ops={'embedding': 'vector_cosine_ops'})
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    op.execute(f"""
+        CREATE TABLE obituaries_partitioned (
+            LIKE obituaries INCLUDING DEFAULTS INCLUDING GENERATED,
+            created_at timestamptz NOT NULL DEFAULT now()
+        ) PARTITION BY RANGE (created_at)
+    """)
+
+    op.execute(CREATED_AT_FUNCTION)
+
+    # A partition per month that has rows, not per month since the oldest
+    # row: one archival date would otherwise create hundreds of tables
+    now = datetime.now(timezone.utc)
+    current = date(now.year, now.month, 1)
+    months = set(connection.execute(sa.text(
+        f"SELECT DISTINCT CAST(date_trunc('month', {CREATED_AT_SQL} AT TIME ZONE 'UTC') AS date) FROM obituaries"
+    )).scalars())
+    months = {month for month in months if month >= add_months(current, -BACKFILL_MONTHS)}
+    months.update(add_months(current, ahead) for ahead in range(MONTHS_AHEAD + 1))
+    for month in sorted(months):
+        op.execute(
+            f"CREATE TABLE obituaries_y{month.year}m{month.month:02d} PARTITION OF obituaries_partitioned "
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+            f"TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+        )
+    # Older rows, and later ones for months without a partition
+    op.execute("CREATE TABLE obituaries_default PARTITION OF obituaries_partitioned DEFAULT")
+
+    op.execute(f"""
+        INSERT INTO obituaries_partitioned ({STORED_COLUMNS}, created_at)
+        SELECT {STORED_COLUMNS}, {CREATED_AT_SQL} FROM obituaries
+    """)
+    op.execute("DROP FUNCTION pg_temp.obituary_created_at(json)")
+
+    # A foreign key into a partitioned table must include the partition key,
+    # so embeddings reference obituaries by id without a constraint
+    op.drop_constraint('obituary_embeddings_obituary_id_fkey', 'obituary_embeddings', type_='foreignkey')
+    op.execute("ALTER SEQUENCE obituaries_id_seq OWNED BY obituaries_partitioned.id")
+    op.drop_table('obituaries')
+    op.rename_table('obituaries_partitioned', 'obituaries')
+    op.create_primary_key('obituaries_pkey', 'obituaries', ['id', 'created_at'])
+    create_indexes()
+
+
+def downgrade() -> None:
+    op.execute("""
+        CREATE TABLE obituaries_unpartitioned (
+            LIKE obituaries INCLUDING DEFAULTS INCLUDING GENERATED
+        )
+    """)
+    op.execute(f"""
+        INSERT INTO obituaries_unpartitioned ({STORED_COLUMNS}, created_at)
+        SELECT {STORED_COLUMNS}, created_at FROM obituaries
+    """)
+    op.execute("ALTER SEQUENCE obituaries_id_seq OWNED BY obituaries_unpartitioned.id")
+    # Also drops every partition
+    op.drop_table('obituaries')
+    op.rename_table('obituaries_unpartitioned', 'obituaries')
+    op.drop_column('obituaries', 'created_at')
+    op.create_primary_key('obituaries_pkey', 'obituaries', ['id'])
+    op.create_index(op.f('ix_obituaries_id'), 'obituaries', ['id'], unique=False)
+    for name in INDEXED_COLUMNS[1:]:
+        op.create_index(op.f(f'ix_obituaries_{name}'), 'obituaries', [name], unique=False)
+    op.create_index('ix_obituaries_name_prefix', 'obituaries',
+                    [sa.text('lower(name) text_pattern_ops')], unique=False)
+    op.create_index('ix_obituaries_embedding_hnsw', 'obituaries', ['embedding'],
+                    unique=False, postgresql_using='hnsw',
+                    postgresql_ops={'embedding': 'vector_cosine_ops'})
+    op.create_foreign_key('obituary_embeddings_obituary_id_fkey', 'obituary_embeddings', 'obituaries',
+                          ['obituary_id'], ['id'], ondelete='CASCADE')
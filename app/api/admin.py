@@ -0,0 +1,73 @@
+import asyncio
+import hmac
+import os
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.core import profiling
+from app.core.profiling import ProfilerBusy
+
+# Admin endpoints are disabled (404) unless a token is configured
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def require_admin(authorization: Optional[str] = Header(None)):
+    """Bearer-token check for the admin endpoints."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Admin token required.",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+router = APIRouter(prefix="/admin/profile", dependencies=[Depends(require_admin)])
+
+
+@router.get("/cpu")
+async def profile_cpu(
+    seconds: float = Query(10, gt=0, le=profiling.MAX_PROFILE_SECONDS),
+    interval_ms: float = Query(10, ge=1, le=1000, description="Time between samples"),
+    format: Literal["collapsed", "json"] = Query("collapsed"),
+    include_idle: bool = Query(False, description="Keep samples of threads that are waiting"),
+):
+    """
+    Sample every thread's stack for `seconds`. Returns collapsed stacks for
+    flamegraph.pl or speedscope, or a d3-flame-graph JSON tree.
+    """
+    try:
+        # Sampled from a thread of its own; the event loop keeps serving meanwhile
+        counts = await asyncio.to_thread(profiling.sample_stacks, seconds, interval_ms / 1000, include_idle)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "json":
+        return profiling.flamegraph_tree(counts)
+    return PlainTextResponse(profiling.collapsed(counts))
+
+
+@router.post("/memory/start")
+def start_memory_profile(frames: int = Query(10, ge=1, le=profiling.MAX_TRACEMALLOC_FRAMES)):
+    """Start tracemalloc and take the baseline that `diff=true` compares against."""
+    return profiling.start_memory_tracing(frames)
+
+
+@router.post("/memory/stop")
+def stop_memory_profile():
+    """Stop tracemalloc, removing its overhead."""
+    return profiling.stop_memory_tracing()
+
+
+@router.get("/memory")
+def memory_profile(
+    limit: int = Query(20, ge=1, le=500),
+    group_by: Literal["lineno", "filename", "traceback"] = Query("lineno"),
+    diff: bool = Query(False, description="Growth since the baseline instead of current totals"),
+):
+    """Top allocation sites while tracemalloc is running."""
+    try:
+        sites = profiling.top_allocations(limit, group_by, diff)
+    except (ProfilerBusy, RuntimeError) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {**profiling.memory_status(), "sites": sites}
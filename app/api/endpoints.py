@@ -1,20 +1,35 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import text
+from app.core.async_database import ASYNCPG_READS
 from app.core.database import get_db
+from app.core.tracing import span
+from app.api.responses import OrjsonResponse
 from app.core.models import Obituary
-from app.core.schemas import ObituaryCreate, ObituaryResponse
+from app.core.schemas import ObituaryCreate, ObituaryFilters, ObituaryResponse, RankedObituaryResponse, SearchRequest
 from app.services.obituary_service import generate_obituary_service
 from app.core.scratchpad_notes_request import ScratchpadNotesRequest
+from app.core.prewritten_obituary_request import RefineRequest
 from app.services.prompt_builder import (
     build_user_prompt_for_obit_from_scratchpad_notes,
     SYSTEM_GUIDELINES_SCRATCHPAD
 )
+from app.services.openai_client import EMBEDDING_MODEL
+from app.services.embeddings import backfill_embeddings, embed_texts, ensure_embeddings, store_embeddings
+from app.services.model_router import routed_chat_completion
+from app.services.rate_limiter import Priority
+from app.services.circuit_breaker import CircuitOpenError, breakers
+from app.services.search import list_obituaries, similar_obituaries, text_search, top_obituaries, vector_search
+from app.services import vector_reads
+from app.services.export import export_ndjson
+from app.services.judge import judge_queue
+from app.services.usage import last_usage
+from app.services.refine import Refinement, RefinementIncomplete, changed_fields, list_revisions, load_obituary
+from typing import Optional
 import json
-import openai
-import app.core.config as config
-import numpy as np
 import logging
 import time
 import socket
@@ -22,9 +37,6 @@ import os
 
 router = APIRouter()
 
-# Initialize OpenAI client
-client = openai.OpenAI(api_key=config.OPENAI_API_KEY)
-
 # Hosted Graphite Configuration
 GRAPHITE_HOST = "carbon.hostedgraphite.com"
 GRAPHITE_PORT = 2003
@@ -42,83 +54,185 @@ class HostedGraphiteTCPClient:
     def send_metric(self, metric_name, value):
         try:
             message = f"{self.api_key}.{metric_name} {value}\n"
-            with socket.create_connection((self.host, self.port)) as sock:
+            with span("graphite.send", metric=metric_name), socket.create_connection((self.host, self.port)) as sock:
                 sock.sendall(message.encode("utf-8"))
-            print(f"✅ Sent: {message.strip()}")
+            log.debug("Sent metric %s", metric_name)
         except Exception as e:
-            print(f"❌ Failed to send metric: {e}")
+            log.warning(f"Failed to send metric {metric_name}: {e}")
 
 graphite_client = HostedGraphiteTCPClient(GRAPHITE_HOST, GRAPHITE_PORT, GRAPHITE_API_KEY)
 
-def get_embedding(text):
+def get_embedding(text, priority=Priority.INTERACTIVE, model=EMBEDDING_MODEL, dims=None):
     """Generate OpenAI embeddings and return as a list of floats."""
-    response = client.embeddings.create(
-        model="text-embedding-ada-002",
-        input=text
-    )
-    return response.data[0].embedding  # Returns list of floats
+    # Hedge only interactive lookups; backfills aren't latency sensitive
+    return embed_texts([text], model, dims, priority, hedge=priority == Priority.INTERACTIVE, endpoint="search")[0]
 
 @router.post("/generate_embeddings/{obituary_id}")
-def generate_embeddings_for_obituary(obituary_id: int, db: Session = Depends(get_db)):
-    """Generate embeddings for a specific obituary and store them in the database."""
+def generate_embeddings_for_obituary(
+    obituary_id: int,
+    model: str = Query(EMBEDDING_MODEL, description="Embedding model"),
+    dims: Optional[int] = Query(None, ge=1, description="Embedding size; the model's native size when omitted"),
+    db: Session = Depends(get_db)
+):
+    """Generate embeddings for a specific obituary, unless its text is unchanged since the last run."""
     obituary = db.query(Obituary).filter(Obituary.id == obituary_id).first()
 
     if not obituary:
         raise HTTPException(status_code=404, detail="Obituary not found.")
 
-    embedding = get_embedding(obituary.generated_text)
-    obituary.embedding = embedding
-    db.commit()
+    if not ensure_embeddings(db, [obituary], model, dims, priority=Priority.INTERACTIVE):
+        return {"message": f"Embedding for obituary ID {obituary_id} is up to date."}
 
     return {"message": f"Generated embedding for obituary ID {obituary_id}."}
 
 @router.post("/generate_embeddings")
-def generate_embeddings(db: Session = Depends(get_db)):
-    """Retrieve obituaries without embeddings, generate them, and store in the database."""
-    obituaries = db.query(Obituary).filter(Obituary.embedding.is_(None)).all()
+def generate_embeddings(
+    model: str = Query(EMBEDDING_MODEL, description="Embedding model"),
+    dims: Optional[int] = Query(None, ge=1, description="Embedding size; the model's native size when omitted"),
+    db: Session = Depends(get_db)
+):
+    """Embed obituaries that are new or whose text changed since they were last embedded with this model."""
+    updated_count = backfill_embeddings(db, model, dims, priority=Priority.BACKGROUND)
 
-    if not obituaries:
+    if not updated_count:
         return {"message": "No obituaries found that need embeddings."}
 
-    updated_count = 0
-    for obit in obituaries:
-        embedding = get_embedding(obit.generated_text)
-        obit.embedding = embedding
-        db.commit()
-        updated_count += 1
-
     return {"message": f"Updated embeddings for {updated_count} obituaries."}
 
 @router.post("/generate_obituary", response_model=ObituaryResponse)
 def generate_obituary_endpoint(obit_data: ObituaryCreate, db: Session = Depends(get_db)):
     return generate_obituary_service(obit_data.dict(), db)
 
-@router.get("/obituaries", response_model=list[ObituaryResponse])
-def get_obituaries(db: Session = Depends(get_db)):
-    obituaries = db.query(Obituary).all()
- 
-    def ensure_list(value):
-        """Ensures the value is always returned as a list."""
-        if isinstance(value, list):
-            return value
-        if isinstance(value, str):
-            return [value]
-        return []
+def ensure_list(value):
+    """Ensures the value is always returned as a list."""
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        return [value]
+    return []
+
+def obituary_response(row):
+    """
+    An ObituaryResponse-shaped dict for a stored row, ready for OrjsonResponse.
+    Name and years come from the columns extracted from input_data, which also
+    cover scratchpad inputs.
+    """
+    input_data = row["input_data"]
+    return {
+        "id": row["id"],
+        "name": row["name"] or "Unknown",
+        "birth_year": row["birth_year"] or 1900,
+        "death_year": row["death_year"] or 2000,
+        "career": input_data.get("career") or "Unknown",
+        "achievements": ensure_list(input_data.get("achievements", [])),
+        "community_impact": ensure_list(input_data.get("community_impact", [])),
+        "services": ensure_list(input_data.get("services", [])),
+        "gender_pronouns": input_data.get("gender_pronouns") or None,
+        "generated_text": row["generated_text"] or "No obituary available",
+        "created_at": row["created_at"],
+    }
+
+@router.get("/obituaries", response_model=list[ObituaryResponse], response_class=OrjsonResponse)
+def get_obituaries(
+    filters: ObituaryFilters = Depends(),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; all matches when omitted"),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    """List obituaries matching the filters, ordered by ID."""
+    rows = list_obituaries(db, filters, limit=limit, offset=offset)
+
+    return OrjsonResponse([obituary_response(row) for row in rows])
 
+@router.get("/obituaries/top", response_model=list[RankedObituaryResponse], response_class=OrjsonResponse)
+def get_top_obituaries(
+    filters: ObituaryFilters = Depends(),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """
+    Leaderboard: the highest final_score obituaries matching the filters,
+    e.g. the best recent ones in a style with `obituary_style` and
+    `created_after`. Unscored obituaries are left out.
+    """
+    rows = top_obituaries(db, filters, limit)
+
+    return OrjsonResponse([
+        {**obituary_response(row), "openai_score": row["openai_score"],
+         "teacher_score": row["teacher_score"], "final_score": row["final_score"]}
+        for row in rows
+    ])
+
+@router.get("/obituaries/export", response_class=StreamingResponse)
+def export_obituaries(
+    filters: ObituaryFilters = Depends(),
+    include_embeddings: bool = Query(False, description="Add each embedding as base64 little-endian float32")
+):
+    """
+    Stream every obituary matching the filters as NDJSON, one object per
+    line, straight from a server-side cursor.
+    """
+    if ASYNCPG_READS:
+        chunks = vector_reads.export_ndjson(filters, include_embeddings)
+    else:
+        chunks = export_ndjson(filters, include_embeddings)
+    return StreamingResponse(chunks, media_type="application/x-ndjson")
+
+@router.get("/obituaries/{obituary_id}/similar", response_model=list[ObituaryResponse],
+            response_class=OrjsonResponse)
+async def get_similar_obituaries(
+    obituary_id: int,
+    filters: ObituaryFilters = Depends(),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """The obituaries nearest to this one by embedding, among those matching the filters."""
+    if ASYNCPG_READS:
+        rows = await vector_reads.similar_obituaries(obituary_id, filters, limit)
+    else:
+        rows = await run_in_threadpool(similar_obituaries, db, obituary_id, filters, limit)
+    if rows is None:
+        raise HTTPException(status_code=404, detail="Obituary not found or has no embedding yet.")
+
+    return OrjsonResponse([obituary_response(row) for row in rows])
+
+@router.post("/obituaries/{obituary_id}/refine")
+async def refine_obituary(obituary_id: int, request: RefineRequest, db: Session = Depends(get_db)):
+    """
+    Revise a stored obituary for corrected details. Only the current text and
+    the fields that changed are sent to the model. The new text is streamed
+    as plain text, or returned whole with `should_stream: false`; either way
+    it is stored as a new revision once complete. A text the model cut off
+    or left empty is not stored: the stream ends with an error line, and the
+    JSON response is a 502.
+    """
+    obituary = await run_in_threadpool(load_obituary, db, obituary_id)
+    if obituary is None:
+        raise HTTPException(status_code=404, detail="Obituary not found.")
+    changed = changed_fields(obituary["input_data"], request.additional_fields)
+    if not changed:
+        raise HTTPException(status_code=400, detail="No additional fields differ from the stored values.")
+
+    refinement = Refinement(obituary, changed)
+    if request.should_stream:
+        return StreamingResponse(refinement.stream(), media_type="text/plain; charset=utf-8",
+                                 headers={"X-Obituary-Id": str(obituary_id)})
+    try:
+        async for _ in refinement.chunks():
+            pass
+    except RefinementIncomplete as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return {"obituary_id": obituary_id, "revision": refinement.revision,
+            "changed_fields": changed, "response": refinement.text}
+
+@router.get("/obituaries/{obituary_id}/revisions")
+def get_obituary_revisions(obituary_id: int, db: Session = Depends(get_db)):
+    """Every stored revision of an obituary, oldest first; revision 0 is the text before the first refinement."""
     return [
-        ObituaryResponse(
-            id=obit.id,
-            name=(json.loads(obit.input_data).get("name") if isinstance(obit.input_data, str) else obit.input_data.get("name")) or "Unknown",
-            birth_year=(json.loads(obit.input_data).get("birth_year") if isinstance(obit.input_data, str) else obit.input_data.get("birth_year")) or 1900,
-            death_year=(json.loads(obit.input_data).get("death_year") if isinstance(obit.input_data, str) else obit.input_data.get("death_year")) or 2000,
-            career=(json.loads(obit.input_data).get("career") if isinstance(obit.input_data, str) else obit.input_data.get("career")) or "Unknown",
-            achievements=ensure_list(json.loads(obit.input_data).get("achievements", [])) if isinstance(obit.input_data, str) else ensure_list(obit.input_data.get("achievements", [])),
-            community_impact=ensure_list(json.loads(obit.input_data).get("community_impact", [])) if isinstance(obit.input_data, str) else ensure_list(obit.input_data.get("community_impact", [])),
-            services=ensure_list(json.loads(obit.input_data).get("services", [])) if isinstance(obit.input_data, str) else ensure_list(obit.input_data.get("services", [])),
-            gender_pronouns=(json.loads(obit.input_data).get("gender_pronouns") if isinstance(obit.input_data, str) else obit.input_data.get("gender_pronouns")) or None,
-            generated_text=obit.generated_text or "No obituary available"
-        )
-        for obit in obituaries
+        {"revision": revision.revision, "generated_text": revision.generated_text,
+         "changed_fields": revision.changed_fields, "metadata": revision.obit_metadata,
+         "created_at": revision.created_at}
+        for revision in list_revisions(db, obituary_id)
     ]
 
 @router.post("/scratchpad")
@@ -126,38 +240,51 @@ def generate_scratchpad_prompt(request: ScratchpadNotesRequest, db: Session = De
     """Generate an obituary from scratchpad notes, store in DB, and generate embeddings."""
     try:
         start_time = time.time()
-        prompt = build_user_prompt_for_obit_from_scratchpad_notes(request)
-
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": SYSTEM_GUIDELINES_SCRATCHPAD},
-                {"role": "user", "content": prompt}
-            ]
-        )
+        with span("scratchpad.build_prompt"):
+            prompt = build_user_prompt_for_obit_from_scratchpad_notes(request)
+
+        with span("scratchpad.completion"):
+            response = routed_chat_completion(
+                "scratchpad",
+                messages=[
+                    {"role": "system", "content": SYSTEM_GUIDELINES_SCRATCHPAD},
+                    {"role": "user", "content": prompt}
+                ],
+                length=request.obituary_length,
+                style=request.obituary_style,
+                hedge=True
+            )
 
         generated_text = response.choices[0].message.content.strip()
+        call = last_usage()
         
         # Store in Database
         obituary = Obituary(
-            input_data=json.dumps(request.dict()),
+            input_data=request.model_dump(mode="json"),
             generated_text=generated_text,
-            openai_score=np.random.uniform(70, 100),
-            teacher_score=np.random.uniform(60, 100),
-            final_score=None  # Can be updated later
+            openai_score=None,
+            teacher_score=None,
+            final_score=None,  # Scored in the background by the judge
+            obit_metadata={"usage": call.as_metadata()} if call else None
         )
-        db.add(obituary)
-        db.commit()
-        db.refresh(obituary)
+        with span("db.insert_obituary"):
+            db.add(obituary)
+            db.commit()
+            db.refresh(obituary)
+        judge_queue.submit(obituary.id, generated_text)
 
-        # Generate and store embeddings
-        embedding = get_embedding(generated_text)
-        obituary.embedding = embedding
-        db.commit()
+        # Generate and store embeddings; while the embeddings upstream is down,
+        # leave it empty for the backfill instead of failing a stored obituary
+        try:
+            with span("scratchpad.embedding", obituary_id=obituary.id):
+                store_embeddings(db, [obituary], priority=Priority.INTERACTIVE, hedge=True)
+        except CircuitOpenError as e:
+            log.warning(f"Skipped embedding for obituary ID {obituary.id}: {str(e)}")
 
         elapsed_time = time.time() - start_time
-        graphite_client.send_metric("api.scratchpad.generated_by_code.response_time", elapsed_time * 1000)
-        graphite_client.send_metric("api.scratchpad.generated_by_code.calls", 1)
+        with span("scratchpad.send_metrics"):
+            graphite_client.send_metric("api.scratchpad.generated_by_code.response_time", elapsed_time * 1000)
+            graphite_client.send_metric("api.scratchpad.generated_by_code.calls", 1)
 
         return {
             "prompt": prompt,
@@ -165,50 +292,44 @@ def generate_scratchpad_prompt(request: ScratchpadNotesRequest, db: Session = De
             "obituary_id": obituary.id
         }
 
+    except CircuitOpenError:
+        graphite_client.send_metric("api.scratchpad.errors", 1)
+        raise
     except Exception as e:
         log.error(f"Unexpected error: {str(e)}")
         graphite_client.send_metric("api.scratchpad.errors", 1)
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@router.post("/search_obituaries", response_model=list[ObituaryResponse])
-def search_obituaries(request: dict, db: Session = Depends(get_db)):
-    """Search for obituaries similar to the given query using pgvector."""
+@router.post("/search_obituaries", response_model=list[ObituaryResponse], response_class=OrjsonResponse)
+async def search_obituaries(request: SearchRequest, db: Session = Depends(get_db)):
+    """
+    Search for obituaries similar to the given query using pgvector, among
+    those matching the request's filters. While the embeddings upstream is
+    unavailable, falls back to full-text search and marks the response with
+    `X-Search-Mode: text`.
+    """
+    model = request.embedding_model or EMBEDDING_MODEL
+    headers = {}
     try:
-        query_text = request.get("query", "")
-        query_embedding = get_embedding(query_text)  # List of floats
-
-        # Convert to NumPy array, ensuring float32 format
-        query_embedding_np = np.array(query_embedding, dtype=np.float32)
-
-        # Construct SQL query correctly
-        sql = """
-        SELECT id, input_data, generated_text, openai_score, teacher_score, final_score, embedding
-        FROM obituaries
-        ORDER BY embedding <=> CAST(:embedding AS vector)
-        LIMIT 2;
-        """
-
-        # Execute query and retrieve results using `.mappings()` to return dictionaries
-        result = db.execute(
-            text(sql),
-            {"embedding": f"[{', '.join(map(str, query_embedding_np.tolist()))}]"}  # Ensure proper vector formatting
-        ).mappings().all()
-
-        return [
-            ObituaryResponse(
-                id=row["id"],
-                name=json.loads(row["input_data"]).get("name", "Unknown") if isinstance(row["input_data"], str) else row["input_data"].get("name", "Unknown"),
-                birth_year=json.loads(row["input_data"]).get("birth_year", 1900) if isinstance(row["input_data"], str) else row["input_data"].get("birth_year", 1900),
-                death_year=json.loads(row["input_data"]).get("death_year", 2000) if isinstance(row["input_data"], str) else row["input_data"].get("death_year", 2000),
-                career=json.loads(row["input_data"]).get("career", "Unknown") if isinstance(row["input_data"], str) else row["input_data"].get("career", "Unknown"),
-                achievements=json.loads(row["input_data"]).get("achievements", []) if isinstance(row["input_data"], str) else row["input_data"].get("achievements", []),
-                community_impact=json.loads(row["input_data"]).get("community_impact", []) if isinstance(row["input_data"], str) else row["input_data"].get("community_impact", []),
-                services=json.loads(row["input_data"]).get("services", []) if isinstance(row["input_data"], str) else row["input_data"].get("services", []),
-                gender_pronouns=json.loads(row["input_data"]).get("gender_pronouns") if isinstance(row["input_data"], str) else row["input_data"].get("gender_pronouns"),
-                generated_text=row["generated_text"] or "No obituary available"
-            )
-            for row in result
-        ]
+        try:
+            with span("search.embedding", model=model):
+                query_embedding = await run_in_threadpool(get_embedding, request.query, model=model,
+                                                          dims=request.embedding_dims)
+        except CircuitOpenError:
+            headers["X-Search-Mode"] = "text"
+            with span("search.text_query"):
+                result = await run_in_threadpool(text_search, db, request.query, request, limit=request.limit)
+        else:
+            with span("search.vector_query", asyncpg=ASYNCPG_READS):
+                if ASYNCPG_READS:
+                    result = await vector_reads.vector_search(query_embedding, request, limit=request.limit,
+                                                              model=model, dims=request.embedding_dims)
+                else:
+                    result = await run_in_threadpool(vector_search, db, query_embedding, request,
+                                                     limit=request.limit, model=model,
+                                                     dims=request.embedding_dims)
+
+        return OrjsonResponse([obituary_response(row) for row in result], headers=headers)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in search: {str(e)}")
@@ -250,10 +371,11 @@ def generate_sample_scratchpad_obit(
             Return only the JSON object with no extra text.
             """
 
-            gpt_response = client.chat.completions.create(
-                model="gpt-4",
+            gpt_response = routed_chat_completion(
+                "sample_input",
                 messages=[{"role": "system", "content": "You are an obituary data generator."},
-                          {"role": "user", "content": prompt}]
+                          {"role": "user", "content": prompt}],
+                priority=Priority.BACKGROUND
             )
 
             sample_input = json.loads(gpt_response.choices[0].message.content.strip())
@@ -278,10 +400,10 @@ def generate_sample_scratchpad_obit(
             if not obituary:
                 raise HTTPException(status_code=500, detail="Generated obituary not found in database.")
 
-            # Step 5: Generate embeddings for the obituary text
-            embedding = get_embedding(obituary.generated_text)
-            obituary.embedding = embedding
-            db.commit()
+            # Step 5: Generate embeddings for the obituary text, unless the
+            # scratchpad flow already stored them
+            if not breakers["embeddings"].is_open():
+                ensure_embeddings(db, [obituary], priority=Priority.INTERACTIVE)
 
             # Append to results list
             generated_results.append({
@@ -292,6 +414,8 @@ def generate_sample_scratchpad_obit(
 
         return {"generated_obituaries": generated_results}
 
+    except CircuitOpenError:
+        raise
     except Exception as e:
         log.error(f"Error generating sample scratchpad obituaries: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
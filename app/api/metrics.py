@@ -0,0 +1,9 @@
+from fastapi import APIRouter
+from app.core.metrics import metrics
+
+router = APIRouter()
+
+@router.get("/metrics")
+def get_metrics():
+    """Current in-process counters and gauges."""
+    return metrics.snapshot()
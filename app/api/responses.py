@@ -0,0 +1,14 @@
+import orjson
+from fastapi.responses import Response
+
+
+class OrjsonResponse(Response):
+    """
+    JSON rendered with orjson. Endpoints that already hold plain dicts return
+    it directly, which skips response-model validation and `jsonable_encoder`;
+    keep `response_model` on the route for the OpenAPI schema.
+    """
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
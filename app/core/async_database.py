@@ -0,0 +1,92 @@
+"""
+asyncpg connection pool for vector-heavy reads.
+
+The sync engine exchanges vectors as text: every embedding is printed as 1536
+decimal strings and parsed back into Python floats. Connections in this pool
+register a binary codec for pgvector's `vector` type, so vectors travel as
+raw float32 buffers and decode straight into NumPy arrays. JSON columns are
+decoded with orjson. NumPy is only imported once a vector is encoded or
+decoded, so it stays off the startup path.
+"""
+import asyncio
+import logging
+import os
+import struct
+from typing import TYPE_CHECKING
+
+import orjson
+from sqlalchemy.engine import make_url
+
+import app.core.config as config
+
+if TYPE_CHECKING:
+    import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Serve search, similar-to and export from this pool instead of the sync engine
+ASYNCPG_READS = os.getenv("ASYNCPG_READS", "1").lower() in ("1", "true", "yes")
+ASYNC_POOL_MIN_SIZE = int(os.getenv("DB_ASYNC_POOL_MIN_SIZE", "2"))
+ASYNC_POOL_MAX_SIZE = int(os.getenv("DB_ASYNC_POOL_MAX_SIZE", "10"))
+
+# pgvector's binary format: uint16 dimensions, uint16 unused, big-endian float32s
+VECTOR_HEADER = struct.Struct(">HH")
+
+_pool = None
+_pool_lock = asyncio.Lock()
+
+
+def encode_vector(value) -> bytes:
+    import numpy as np
+
+    values = np.asarray(value, dtype=">f4")
+    if values.ndim != 1:
+        raise ValueError(f"Expected a 1-D vector, got shape {values.shape}")
+    return VECTOR_HEADER.pack(len(values), 0) + values.tobytes()
+
+
+def decode_vector(data: bytes) -> "np.ndarray":
+    import numpy as np
+
+    dims, _ = VECTOR_HEADER.unpack_from(data)
+    # One vectorized byte swap into a native float32 array
+    return np.frombuffer(data, dtype=">f4", count=dims, offset=VECTOR_HEADER.size).astype(np.float32)
+
+
+async def init_connection(connection) -> None:
+    await connection.set_type_codec(
+        "vector", encoder=encode_vector, decoder=decode_vector, format="binary"
+    )
+    for name in ("json", "jsonb"):
+        await connection.set_type_codec(
+            name, encoder=lambda value: orjson.dumps(value).decode(), decoder=orjson.loads,
+            schema="pg_catalog",
+        )
+
+
+def asyncpg_dsn() -> str:
+    """DATABASE_URL without a SQLAlchemy driver suffix such as +psycopg2."""
+    return make_url(config.DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+async def get_async_pool():
+    """Create the pool on first use, from within the running event loop."""
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                import asyncpg
+
+                _pool = await asyncpg.create_pool(
+                    asyncpg_dsn(), min_size=ASYNC_POOL_MIN_SIZE, max_size=ASYNC_POOL_MAX_SIZE,
+                    init=init_connection,
+                )
+                log.info(f"Opened asyncpg pool with {_pool.get_size()} connections.")
+    return _pool
+
+
+async def close_async_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
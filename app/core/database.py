@@ -1,26 +1,78 @@
+import logging
+import os
+import threading
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from app.core.models import Base, Obituary
+from app.core.partitions import ensure_future_partitions
 import app.core.config as config
 
-# Create a database engine
-engine = create_engine(config.DATABASE_URL)
+log = logging.getLogger(__name__)
 
-# Create a session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Connections opened by warm_pool() at startup
+WARM_POOL_CONNECTIONS = int(os.getenv("DB_WARM_POOL_CONNECTIONS", "5"))
+
+# Create a session factory; it is bound to the engine on first use
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """Create the database engine on first use rather than at import."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(config.DATABASE_URL)
+                SessionLocal.configure(bind=_engine)
+    return _engine
+
+def __getattr__(name):
+    # Keeps `from app.core.database import engine` working without
+    # creating the engine at import time
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Function to create tables if they don’t exist
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
+    ensure_partitions()
+
+def ensure_partitions():
+    """Create the current and upcoming monthly partitions of obituaries."""
+    with get_engine().begin() as connection:
+        ensure_future_partitions(connection)
 
 # Function to get a new database session
 def get_db():
+    get_engine()
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
 
+def warm_pool(connections=WARM_POOL_CONNECTIONS):
+    """Open pool connections up front so the first requests don't pay for them."""
+    engine = get_engine()
+    opened = []
+    try:
+        for _ in range(min(connections, engine.pool.size())):
+            connection = engine.connect()
+            connection.execute(text("SELECT 1"))
+            opened.append(connection)
+    finally:
+        for connection in opened:
+            connection.close()
+    log.info(f"Warmed {len(opened)} database connections.")
+
+def dispose_engine():
+    """Close pooled connections, if the engine was ever created."""
+    if _engine is not None:
+        _engine.dispose()
+
 if __name__ == "__main__":
     init_db()
     print("Database tables created successfully.")
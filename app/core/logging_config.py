@@ -0,0 +1,137 @@
+"""
+Process-wide logging, configured once at startup by `configure_logging`.
+
+Loggers hand records to a QueueHandler, and a QueueListener thread does the
+formatting and stream I/O, so a slow or blocked stderr never stalls a
+request. If the queue fills up, records are dropped and counted in
+`logging.dropped`; callers never wait.
+
+High-volume loggers can be sampled. LOG_SAMPLE_RATES maps logger names to
+the fraction of their records below WARNING that are kept, e.g.
+"app.services.obituary_generator=0.01,app.traces=1". The most specific
+configured name applies. Warnings and errors are always kept.
+
+Prompts and other large payloads go through `prompt_digest` rather than
+being logged whole.
+"""
+import hashlib
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from typing import Dict, Optional
+
+from app.core.metrics import metric_name, metrics
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "%(asctime)s %(levelname)s %(name)s: %(message)s")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Characters of a prompt kept by prompt_digest
+PROMPT_PREVIEW_CHARS = int(os.getenv("LOG_PROMPT_PREVIEW_CHARS", "120"))
+
+# Loggers that come with their own handlers; routed through the queue as well
+SERVER_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+LOG_SAMPLE_RATES = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+
+
+def prompt_digest(text: str, preview: int = PROMPT_PREVIEW_CHARS) -> str:
+    """A short preview of `text` with its length and hash, to identify a prompt without logging it."""
+    if text is None:
+        return "<none>"
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+    head = text[:preview].replace("\n", " ")
+    ellipsis = "…" if len(text) > preview else ""
+    return f"{head!r}{ellipsis} ({len(text)} chars, sha256 {digest})"
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a configured fraction of each logger's records below WARNING."""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, Optional[float]] = {}
+
+    def rate_for(self, name: str) -> Optional[float]:
+        if name not in self._resolved:
+            rate, prefix = None, name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._resolved[name] = rate
+        return self._resolved[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate is None or random.random() < rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler that drops records, instead of blocking, when the queue is full."""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.incr(metric_name("logging", "dropped"))
+
+
+def configure_logging(level: str = LOG_LEVEL) -> None:
+    """Route all logging through one queue and listener thread. Safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    if LOG_SAMPLE_RATES:
+        queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATES))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    for name in SERVER_LOGGERS:
+        server_logger = logging.getLogger(name)
+        if server_logger.handlers:
+            server_logger.handlers = [queue_handler]
+            server_logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread; later records are written directly."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            if isinstance(handler, DroppingQueueHandler):
+                root.removeHandler(handler)
+        for output in _listener.handlers:
+            root.addHandler(output)
+        _listener = None
@@ -0,0 +1,48 @@
+import threading
+from collections import defaultdict
+from typing import Callable, Dict
+
+
+def metric_name(*parts) -> str:
+    """
+    Joins name segments with dots, Graphite style. Dots inside a segment
+    (e.g. "gpt-3.5-turbo") are replaced so they don't create extra levels.
+    """
+    return ".".join(str(part).replace(".", "_") for part in parts)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe, in-process counters and gauges. Components that already keep
+    their own state register a collector that is read at snapshot time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._collectors = []
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def register_collector(self, collector: Callable[[], Dict[str, float]]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            collectors = list(self._collectors)
+        for collector in collectors:
+            gauges.update(collector())
+        return {"counters": counters, "gauges": gauges}
+
+
+metrics = MetricsRegistry()
@@ -1,17 +1,124 @@
-from sqlalchemy import Column, Integer, String, JSON, Float
-from sqlalchemy.orm import declarative_base
+from sqlalchemy import Column, Computed, Index, Integer, BigInteger, String, JSON, Float, DateTime, func, literal_column
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import declarative_base, relationship
 from pgvector.sqlalchemy import Vector  # ✅ Import Vector from pgvector
 
 Base = declarative_base()
 
+def _year_from_input(key, date_key):
+    # Structured inputs carry the year; scratchpad inputs a free-form date
+    return (
+        f"CASE WHEN input_data ->> '{key}' ~ '^[0-9]{{1,4}}$' "
+        f"THEN (input_data ->> '{key}')::integer "
+        f"ELSE substring(input_data #>> '{{additional_fields,{date_key}}}' FROM '([0-9]{{4}})')::integer END"
+    )
+
+NAME_FROM_INPUT = (
+    "COALESCE(input_data ->> 'name', NULLIF(btrim("
+    "COALESCE(input_data #>> '{additional_fields,first_name}', '') || ' ' || "
+    "COALESCE(input_data #>> '{additional_fields,last_name}', '')), ''))"
+)
+
 class Obituary(Base):
     __tablename__ = "obituaries"
 
-    id = Column(Integer, primary_key=True, index=True)
-    input_data = Column(JSON, nullable=False)
+    # The primary key includes created_at, the partition key; id alone is
+    # still unique (from the sequence) and is the ORM identity
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), index=True)
+    # Bumped by a database trigger on every UPDATE
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
+    input_data = Column(JSONB, nullable=False)
     generated_text = Column(String, nullable=False)
     openai_score = Column(Float, nullable=True)
     teacher_score = Column(Float, nullable=True)
     final_score = Column(Float, nullable=True)
     embedding = Column(Vector(1536), nullable=True)  # ✅ Use pgvector's Vector type
     obit_metadata = Column(JSON, nullable=True)  # ✅ Rename metadata to obit_metadata
+
+    # Read-only columns Postgres extracts from input_data, for filtering and sorting
+    name = Column(String, Computed(NAME_FROM_INPUT, persisted=True), index=True)
+    birth_year = Column(Integer, Computed(_year_from_input("birth_year", "date_of_birth"), persisted=True), index=True)
+    death_year = Column(Integer, Computed(_year_from_input("death_year", "date_of_death"), persisted=True), index=True)
+    obituary_style = Column(String, Computed("input_data ->> 'obituary_style'", persisted=True), index=True)
+    obituary_length = Column(String, Computed("input_data ->> 'obituary_length'", persisted=True), index=True)
+
+    __table_args__ = (
+        # Case-insensitive name prefix filters (LIKE 'abc%')
+        Index("ix_obituaries_name_prefix", func.lower(name).label("name_lower"),
+              postgresql_ops={"name_lower": "text_pattern_ops"}),
+        # Approximate nearest-neighbour search by cosine distance
+        Index("ix_obituaries_embedding_hnsw", embedding, postgresql_using="hnsw",
+              postgresql_ops={"embedding": "vector_cosine_ops"}),
+        # Leaderboards: best scored obituaries, overall or by style
+        Index("ix_obituaries_style_final_score", obituary_style, final_score.desc(), id.desc(),
+              postgresql_where=final_score.isnot(None)),
+        Index("ix_obituaries_final_score", final_score.desc(), id.desc(),
+              postgresql_where=final_score.isnot(None)),
+        # Full-text fallback search; same expression as search.text_search
+        Index("ix_obituaries_text_search", func.to_tsvector(literal_column("'english'"), generated_text),
+              postgresql_using="gin"),
+        # Monthly partitions; see app/core/partitions.py
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    __mapper_args__ = {"primary_key": [id]}
+
+    embeddings = relationship("ObituaryEmbedding", back_populates="obituary",
+                              primaryjoin="foreign(ObituaryEmbedding.obituary_id) == Obituary.id",
+                              cascade="all, delete-orphan")
+
+class ObituaryEmbedding(Base):
+    """
+    An embedding of an obituary's text under one model and dimension count.
+    `content_hash` is the SHA-256 of the text that was embedded, so rows whose
+    text hasn't changed are skipped when re-embedding.
+    """
+    __tablename__ = "obituary_embeddings"
+
+    # No foreign key: one into a partitioned table would have to include created_at
+    obituary_id = Column(Integer, primary_key=True)
+    model = Column(String, primary_key=True)
+    dims = Column(Integer, primary_key=True)
+    content_hash = Column(String(64), nullable=False)
+    embedding = Column(Vector(), nullable=False)  # Dimension varies by model
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+
+    obituary = relationship("Obituary", back_populates="embeddings",
+                            primaryjoin="foreign(ObituaryEmbedding.obituary_id) == Obituary.id")
+
+class EmbeddingBackfill(Base):
+    """
+    Where the embedding backfill for one model and dimension count got to:
+    every obituary last updated before `checked_through` has been checked,
+    so the next run only reads rows updated since.
+    """
+    __tablename__ = "embedding_backfills"
+
+    model = Column(String, primary_key=True)
+    dims = Column(Integer, primary_key=True)
+    checked_through = Column(DateTime(timezone=True), nullable=False)
+
+class ObituaryRevision(Base):
+    """
+    One refinement of an obituary. The obituary row holds the latest text;
+    revision 0 keeps the text it had before its first refinement.
+    """
+    __tablename__ = "obituary_revisions"
+
+    # No foreign key, as for obituary_embeddings
+    obituary_id = Column(Integer, primary_key=True)
+    revision = Column(Integer, primary_key=True)
+    generated_text = Column(String, nullable=False)
+    # The additional fields that differed from the previous revision
+    changed_fields = Column(JSONB, nullable=False, server_default="{}")
+    obit_metadata = Column(JSONB, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+class IngestCheckpoint(Base):
+    """Progress of a bulk ingest source, committed with each loaded chunk."""
+    __tablename__ = "ingest_checkpoints"
+
+    source = Column(String, primary_key=True)
+    records_read = Column(BigInteger, nullable=False, default=0)
+    rows_loaded = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -0,0 +1,170 @@
+"""
+Monthly range partitions of `obituaries` on `created_at`.
+
+Each month lives in its own table, e.g. `obituaries_y2026m10`, with local
+copies of the parent's indexes, so queries bounded by `created_at` only touch
+the matching months. The app creates the next few months at startup, and
+`scripts.maintain_partitions` does the same on a schedule and detaches
+(archives) old months.
+
+Rows for a month without a partition land in the DEFAULT partition,
+`obituaries_default`, instead of failing the insert. Creating a month's
+partition moves its rows out of the default one, and the startup and
+scheduled runs also create partitions for any recent months found there.
+Rows older than PARTITION_BACKFILL_MONTHS, e.g. archival obituaries, stay in
+the default partition rather than each old month getting a table.
+"""
+import logging
+import os
+import re
+from datetime import date, datetime, timezone
+from typing import List
+
+from sqlalchemy import text
+
+log = logging.getLogger(__name__)
+
+PARENT_TABLE = "obituaries"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+# Months of partitions kept ready beyond the current one
+MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+# Months back that rows in the default partition still get a partition of their own
+BACKFILL_MONTHS = int(os.getenv("PARTITION_BACKFILL_MONTHS", "24"))
+
+PARTITION_NAME = re.compile(r"^obituaries_y(\d{4})m(\d{2})$")
+
+PARTITIONS_SQL = """
+SELECT child.relname
+FROM pg_inherits
+JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+WHERE parent.relname = :parent
+"""
+
+# Columns that can be copied between partitions, i.e. not generated
+STORED_COLUMNS_SQL = """
+SELECT attname
+FROM pg_attribute
+WHERE attrelid = CAST(:parent AS regclass) AND attnum > 0 AND NOT attisdropped AND attgenerated = ''
+ORDER BY attnum
+"""
+
+DEFAULT_MONTHS_SQL = f"""
+SELECT DISTINCT CAST(date_trunc('month', created_at AT TIME ZONE 'UTC') AS date)
+FROM {DEFAULT_PARTITION}
+WHERE created_at >= :since
+ORDER BY 1
+"""
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year}m{month.month:02d}"
+
+
+def partition_month(name: str):
+    match = PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def existing_partitions(connection) -> List[str]:
+    return sorted(connection.execute(text(PARTITIONS_SQL), {"parent": PARENT_TABLE}).scalars())
+
+
+def month_bounds(month: date) -> str:
+    # Bounds in UTC, whatever the session time zone
+    return (f"FROM ('{month.isoformat()} 00:00:00+00') "
+            f"TO ('{add_months(month, 1).isoformat()} 00:00:00+00')")
+
+
+def ensure_default_partition(connection) -> None:
+    connection.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+
+
+def default_months(connection, since: date) -> List[date]:
+    """Months from `since` on that have rows in the default partition."""
+    return list(connection.execute(text(DEFAULT_MONTHS_SQL), {"since": since}).scalars())
+
+
+def create_partition(connection, month: date) -> None:
+    """
+    Create `month`'s partition. Postgres refuses to create one while rows for
+    its range sit in the default partition, so any are moved into a new table
+    that is then attached. Run it in a transaction so the move is atomic.
+    """
+    name, bounds = partition_name(month), month_bounds(month)
+    in_range = (f"created_at >= '{month.isoformat()} 00:00:00+00' "
+                f"AND created_at < '{add_months(month, 1).isoformat()} 00:00:00+00'")
+    stray = connection.execute(text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range})")).scalar()
+    if not stray:
+        connection.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} FOR VALUES {bounds}"))
+        return
+    columns = ", ".join(connection.execute(text(STORED_COLUMNS_SQL), {"parent": PARENT_TABLE}).scalars())
+    connection.execute(text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING GENERATED)"))
+    moved = connection.execute(text(f"""
+        WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_range} RETURNING {columns})
+        INSERT INTO {name} ({columns}) SELECT {columns} FROM moved
+    """))
+    connection.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+    log.info(f"Moved {moved.rowcount} rows from {DEFAULT_PARTITION} to {name}.")
+
+
+def create_partitions(connection, start, end) -> List[str]:
+    """Create any missing monthly partitions from `start`'s month through `end`'s."""
+    existing = set(existing_partitions(connection))
+    created = []
+    month, last = month_start(start), month_start(end)
+    while month <= last:
+        name = partition_name(month)
+        if name not in existing:
+            create_partition(connection, month)
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def ensure_future_partitions(connection, months_ahead: int = MONTHS_AHEAD) -> List[str]:
+    """
+    Partitions for the current month and the next `months_ahead`, and for any
+    of the last BACKFILL_MONTHS months that have rows in the default partition.
+    """
+    ensure_default_partition(connection)
+    today = datetime.now(timezone.utc).date()
+    created = create_partitions(connection, today, add_months(month_start(today), months_ahead))
+    for month in default_months(connection, add_months(month_start(today), -BACKFILL_MONTHS)):
+        created += create_partitions(connection, month, month)
+    if created:
+        log.info(f"Created partitions {', '.join(created)}.")
+    return created
+
+
+def detach_partitions(connection, before, drop: bool = False) -> List[str]:
+    """
+    Detach partitions for months before `before`'s month. Detached months are
+    kept as standalone tables (an archive) unless `drop` is set. DETACH ...
+    CONCURRENTLY isn't allowed while the parent has a default partition, so
+    this takes a brief ACCESS EXCLUSIVE lock on `obituaries`; run it in a
+    transaction so all the detaches share it.
+    """
+    cutoff = month_start(before)
+    detached = []
+    for name in existing_partitions(connection):
+        month = partition_month(name)
+        if month is None or month >= cutoff:
+            continue
+        connection.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+        if drop:
+            # Neither side table has a foreign key to cascade from
+            for table in ("obituary_embeddings", "obituary_revisions"):
+                connection.execute(text(f"DELETE FROM {table} WHERE obituary_id IN (SELECT id FROM {name})"))
+            connection.execute(text(f"DROP TABLE {name}"))
+        detached.append(name)
+    return detached
@@ -0,0 +1,35 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+from app.services.prompt_builder import (
+    ObituaryLength,
+    ObituaryStyle,
+    AdditionalFields,
+)
+
+
+class PrewrittenObituaryRequest(BaseModel):
+    prewritten_obituary: str = Field(
+        ..., description="The obituary text to refine"
+    )
+    obituary_style: Optional[ObituaryStyle] = ObituaryStyle.TRADITIONAL
+    obituary_length: Optional[ObituaryLength] = ObituaryLength.LONG
+    additional_fields: Optional[AdditionalFields] = None
+
+
+class RefineRequest(BaseModel):
+    additional_fields: AdditionalFields = Field(
+        ..., description="Corrected details; only values that differ from the stored ones are sent"
+    )
+    should_stream: Optional[bool] = True
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "additional_fields": {
+                    "date_of_death": "2023-09-21",
+                    "city_of_death": "Boulder",
+                },
+                "should_stream": True,
+            }
+        }
@@ -0,0 +1,196 @@
+"""
+On-demand CPU and memory profiling of the running process.
+
+The CPU profiler samples every thread's stack with `sys._current_frames()`
+from a thread of its own, at a fixed interval for a bounded time. Nothing is
+instrumented, and the cost is one stack walk per thread per sample. Stacks
+are returned collapsed (one "frame;frame;frame count" line per distinct
+stack, the input format of flamegraph.pl and speedscope), or as a
+d3-flame-graph JSON tree.
+
+Memory profiling uses tracemalloc, which slows allocations while it runs,
+so it is off until started and should be stopped when done. Starting it
+takes a baseline snapshot. Later reports list the top allocation sites,
+either as they stand or as the difference from that baseline.
+
+Only one CPU profile or memory snapshot runs at a time.
+"""
+import os
+import sys
+import sysconfig
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+# Bounds on what a request may ask for
+MAX_PROFILE_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+MIN_INTERVAL_SECONDS = 0.001
+MAX_TRACEMALLOC_FRAMES = 25
+
+SITE_PACKAGES = sysconfig.get_paths()["purelib"]
+STDLIB = sysconfig.get_paths()["stdlib"]
+
+# Leaf frames of threads that are waiting, not working
+IDLE_FUNCTIONS = {
+    ("threading.py", "wait"),
+    ("threading.py", "Condition.wait"),
+    ("selectors.py", "select"),
+    ("selectors.py", "EpollSelector.select"),
+    ("queue.py", "get"),
+    ("queue.py", "Queue.get"),
+    ("socket.py", "accept"),
+    ("socket.py", "socket.accept"),
+    ("thread.py", "_worker"),
+}
+
+_cpu_lock = threading.Lock()
+_memory_lock = threading.Lock()
+_baseline: Optional[tracemalloc.Snapshot] = None
+
+
+class ProfilerBusy(Exception):
+    """Another profile is already running."""
+
+
+def short_path(filename: str) -> str:
+    """Paths relative to site-packages, the stdlib or the working directory."""
+    for root in (SITE_PACKAGES, STDLIB, os.getcwd()):
+        if filename.startswith(root + os.sep):
+            return filename[len(root) + 1:]
+    return filename
+
+
+def function_name(code) -> str:
+    # co_qualname (3.11+) includes the class, e.g. "Queue.get"
+    return getattr(code, "co_qualname", code.co_name)
+
+
+def sample_stacks(seconds: float, interval: float, include_idle: bool = False) -> Counter:
+    """Counts of each distinct stack, as a tuple from the thread name down to the leaf."""
+    seconds = min(max(seconds, 0.0), MAX_PROFILE_SECONDS)
+    interval = max(interval, MIN_INTERVAL_SECONDS)
+    if not _cpu_lock.acquire(blocking=False):
+        raise ProfilerBusy("A CPU profile is already running.")
+    try:
+        me = threading.get_ident()
+        labels = {}  # code object -> "path:function", computed once each
+        counts = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if not include_idle and (os.path.basename(frame.f_code.co_filename),
+                                         function_name(frame.f_code)) in IDLE_FUNCTIONS:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = f"{short_path(code.co_filename)}:{function_name(code)}"
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                counts[tuple(reversed(stack))] += 1
+            time.sleep(interval)
+        return counts
+    finally:
+        _cpu_lock.release()
+
+
+def collapsed(counts: Counter) -> str:
+    """Brendan Gregg's collapsed format, heaviest stacks first."""
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in counts.most_common())
+
+
+def flamegraph_tree(counts: Counter) -> Dict[str, Any]:
+    """A d3-flame-graph tree: {"name", "value", "children"} nodes."""
+    root = {"name": "all", "value": 0, "children": {}}
+    for stack, count in counts.items():
+        root["value"] += count
+        node = root
+        for label in stack:
+            node = node["children"].setdefault(label, {"name": label, "value": 0, "children": {}})
+            node["value"] += count
+
+    def listify(node):
+        return {"name": node["name"], "value": node["value"],
+                "children": [listify(child) for child in node["children"].values()]}
+
+    return listify(root)
+
+
+def start_memory_tracing(frames: int = 10) -> Dict[str, Any]:
+    """Start tracemalloc, if it isn't running, and take the baseline snapshot."""
+    global _baseline
+    with _memory_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(min(max(frames, 1), MAX_TRACEMALLOC_FRAMES))
+        _baseline = _snapshot()
+        return memory_status()
+
+
+def stop_memory_tracing() -> Dict[str, Any]:
+    global _baseline
+    with _memory_lock:
+        _baseline = None
+        tracemalloc.stop()
+        return memory_status()
+
+
+def memory_status() -> Dict[str, Any]:
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "tracing": tracemalloc.is_tracing(),
+        "frames": tracemalloc.get_traceback_limit(),
+        "traced_kb": round(current / 1024, 1),
+        "peak_kb": round(peak / 1024, 1),
+        "overhead_kb": round(tracemalloc.get_tracemalloc_memory() / 1024, 1),
+    }
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ))
+
+
+def top_allocations(limit: int = 20, group_by: str = "lineno", diff: bool = False) -> List[Dict[str, Any]]:
+    """
+    The `limit` largest allocation sites now, or, with `diff`, the sites
+    that grew the most since the baseline. Raises RuntimeError if tracemalloc
+    isn't running.
+    """
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("Memory tracing is not running; POST /admin/profile/memory/start first.")
+    if not _memory_lock.acquire(blocking=False):
+        raise ProfilerBusy("A memory snapshot is already being taken.")
+    try:
+        snapshot = _snapshot()
+        if diff and _baseline is not None:
+            stats = snapshot.compare_to(_baseline, group_by)
+            stats.sort(key=lambda stat: stat.size_diff, reverse=True)
+        else:
+            stats = snapshot.statistics(group_by)
+    finally:
+        _memory_lock.release()
+
+    sites = []
+    for stat in stats[:limit]:
+        frames = [f"{short_path(frame.filename)}:{frame.lineno}" for frame in stat.traceback]
+        site = {
+            "site": frames[0] if group_by != "traceback" else frames,
+            "size_kb": round(stat.size / 1024, 1),
+            "count": stat.count,
+        }
+        if hasattr(stat, "size_diff"):
+            site["size_diff_kb"] = round(stat.size_diff / 1024, 1)
+            site["count_diff"] = stat.count_diff
+        sites.append(site)
+    return sites
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from datetime import datetime
+from pydantic import BaseModel, Field
 from typing import Optional, List
-from app.services.prompt_builder import Gender  # Ensure Gender Enum is imported
+from app.services.prompt_builder import Gender, ObituaryLength, ObituaryStyle  # Ensure Gender Enum is imported
 
 class ServiceInfo(BaseModel):
     service_type: str
@@ -20,3 +21,29 @@ class ObituaryCreate(BaseModel):
 class ObituaryResponse(ObituaryCreate):
     id: int
     generated_text: str
+    created_at: Optional[datetime] = None
+
+class RankedObituaryResponse(ObituaryResponse):
+    openai_score: Optional[float] = None
+    teacher_score: Optional[float] = None
+    final_score: Optional[float] = None
+
+class ObituaryFilters(BaseModel):
+    """Filters applied in SQL to listings and, as pre-filters, to search."""
+    name_prefix: Optional[str] = Field(None, min_length=1, description="Case-insensitive name prefix")
+    death_year_min: Optional[int] = None
+    death_year_max: Optional[int] = None
+    obituary_style: Optional[ObituaryStyle] = None
+    obituary_length: Optional[ObituaryLength] = None
+    min_openai_score: Optional[float] = None
+    min_teacher_score: Optional[float] = None
+    min_final_score: Optional[float] = None
+    created_after: Optional[datetime] = Field(None, description="Only obituaries created at or after this time")
+    created_before: Optional[datetime] = Field(None, description="Only obituaries created before this time")
+    exclude_duplicates: bool = Field(False, description="Skip obituaries marked as near-duplicates of an earlier one")
+
+class SearchRequest(ObituaryFilters):
+    query: str = ""
+    limit: int = Field(2, ge=1, le=100)
+    embedding_model: Optional[str] = Field(None, description="Embedding model to search; the default model when omitted")
+    embedding_dims: Optional[int] = Field(None, ge=1, description="Embedding size; the model's native size when omitted")
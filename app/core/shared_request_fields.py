@@ -1,5 +1,27 @@
+from functools import lru_cache
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Any, Callable, List, Mapping, Optional, Tuple, Type
+
+# A field table is an ordered sequence of (label, attribute) pairs
+FieldTable = Tuple[Tuple[str, str], ...]
+FieldRenderer = Callable[[Mapping[str, Any]], List[str]]
+
+# Configuration for additional fields
+ADDITIONAL_FIELDS_CONFIG: FieldTable = (
+    ("Salutation", "salutation"),
+    ("First Name", "first_name"),
+    ("Middle Name", "middle_name"),
+    ("Last Name", "last_name"),
+    ("Nickname", "nickname"),
+    ("Maiden Name", "maiden_name"),
+    ("Suffix", "suffix"),
+    ("Date of Birth", "date_of_birth"),
+    ("Date of Death", "date_of_death"),
+    ("City of Death", "city_of_death"),
+    ("Region of Death", "region_of_death"),
+    ("Country of Death", "country_of_death"),
+    ("Place of Birth", "place_of_birth"),
+)
 
 
 def prepare_additional_fields(additional_fields):
@@ -9,33 +31,58 @@ def prepare_additional_fields(additional_fields):
     if not additional_fields:
         return ""
 
-    # Configuration for additional fields
-    additional_fields_config = [
-        ("Salutation", "salutation"),
-        ("First Name", "first_name"),
-        ("Middle Name", "middle_name"),
-        ("Last Name", "last_name"),
-        ("Nickname", "nickname"),
-        ("Maiden Name", "maiden_name"),
-        ("Suffix", "suffix"),
-        ("Date of Birth", "date_of_birth"),
-        ("Date of Death", "date_of_death"),
-        ("City of Death", "city_of_death"),
-        ("Region of Death", "region_of_death"),
-        ("Country of Death", "country_of_death"),
-        ("Place of Birth", "place_of_birth"),
-    ]
-
-    additional_fields_list = []
-
-    # Helper function to populate fields
-    add_fields_from_config(
-        additional_fields_config, additional_fields, additional_fields_list
+    additional_fields_list = render_model_fields(
+        ADDITIONAL_FIELDS_CONFIG, additional_fields
     )
 
     return "\n".join(additional_fields_list) if additional_fields_list else ""
 
 
+@lru_cache(maxsize=None)
+def compile_field_renderer(
+    config: FieldTable, model: Optional[Type[BaseModel]] = None
+) -> FieldRenderer:
+    """
+    Compiles a field table into a renderer over dumped model values.
+
+    When a model class is given, attributes it does not declare are dropped
+    at compile time, so each render only looks up fields that can exist.
+    Renderers are cached per (table, model) pair.
+    """
+    if model is not None:
+        declared = model.model_fields
+        config = tuple(
+            (label, attribute)
+            for label, attribute in config
+            if attribute in declared
+        )
+
+    def render(values: Mapping[str, Any]) -> List[str]:
+        return [
+            f"{label}: {value}"
+            for label, attribute in config
+            if (value := values.get(attribute))
+        ]
+
+    return render
+
+
+def render_model_fields(
+    config: FieldTable,
+    source: BaseModel,
+    values: Optional[Mapping[str, Any]] = None,
+) -> List[str]:
+    """
+    Renders a field table against a pydantic model. Pass `values` to reuse an
+    existing `model_dump(exclude_none=True)` of the source when several tables
+    render from the same model; otherwise the model's own field values are
+    read directly, which is cheaper than a dump for a single flat table.
+    """
+    if values is None:
+        values = vars(source)
+    return compile_field_renderer(tuple(config), type(source))(values)
+
+
 def append_field_to_list(
     label: str, value: Optional[str], fields_list: List[str]
 ) -> None:
@@ -47,15 +94,13 @@ def append_field_to_list(
 
 
 def add_fields_from_config(
-    config: List[tuple], source: BaseModel, target: List[str]
+    config: FieldTable, source: BaseModel, target: List[str]
 ) -> None:
     """
-    Adds fields from a configuration to a target list based on the source 
+    Adds fields from a configuration to a target list based on the source
     attributes.
     """
-    for label, attribute in config:
-        value = getattr(source, attribute, None)
-        append_field_to_list(label, value, target)
+    target.extend(render_model_fields(config, source))
 
 
 def build_section(title: str, content: str) -> str:
@@ -65,12 +110,11 @@ def build_section(title: str, content: str) -> str:
     return f"--- {title} ---\n{content}\n\n" if content else ""
 
 
-def prepare_section(title, fields, source_data):
+def prepare_section(title, fields, source_data, values=None):
     """
     Populates sections based on the provided fields and source data
     """
-    section_data = []
-    add_fields_from_config(fields, source_data, section_data)
+    section_data = render_model_fields(fields, source_data, values)
     return (
         build_section(title, "\n".join(section_data))
         if section_data
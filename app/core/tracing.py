@@ -0,0 +1,255 @@
+"""
+Lightweight request tracing.
+
+TracingMiddleware gives every request an id (a valid incoming X-Request-ID
+is kept) and a root span. Code on the request path wraps its stages in
+`span("name")`, which nests under whatever span is current. Outside a
+request, `span` does nothing. The current span is a context variable, so it
+follows requests into the threadpool that runs sync endpoints.
+
+Sampling is decided when the request finishes. Traces slower than
+TRACE_SLOW_MS, and those that failed, are always kept. The rest are kept at
+TRACE_SAMPLE_RATE. Kept traces go onto a queue. An exporter thread turns
+them into OTLP/JSON-shaped `resourceSpans` documents, one log line each, so
+formatting and logging I/O stay off the request path.
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from app.core.metrics import metric_name, metrics
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))
+# Traces waiting for the exporter; more are dropped rather than blocking requests
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "1000"))
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "obituary-api")
+
+REQUEST_ID_HEADER = "x-request-id"
+REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+log = logging.getLogger(__name__)
+
+# Span status codes from the OTLP spec
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+
+def new_id(nbytes: int) -> str:
+    return random.getrandbits(nbytes * 8).to_bytes(nbytes, "big").hex()
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+
+
+class Trace:
+    """The spans of one request. Spans may be appended from several threads."""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.trace_id = new_id(16)
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, parent: Optional[Span], attributes: Dict[str, Any]) -> Span:
+        span = Span(self, name, parent.span_id if parent else None, attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace.request_id if span else None
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Record a child span of the current one; a no-op outside a traced request."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.trace.start_span(name, parent, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        child.end()
+        _current_span.reset(token)
+
+
+def otlp_value(value) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_span(span: Span) -> Dict[str, Any]:
+    document = {
+        "traceId": span.trace.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 2 if span.parent_id is None else 1,  # SERVER for the root, INTERNAL below it
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns or span.start_ns),
+        "attributes": [{"key": key, "value": otlp_value(value)} for key, value in span.attributes.items()],
+        "status": {"code": STATUS_ERROR, "message": span.error} if span.error else {"code": STATUS_UNSET},
+    }
+    if span.parent_id:
+        document["parentSpanId"] = span.parent_id
+    return document
+
+
+def otlp_document(trace: Trace) -> Dict[str, Any]:
+    """One trace in the OTLP/JSON export shape."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{
+            "scope": {"name": __name__},
+            "spans": [otlp_span(span) for span in trace.spans],
+        }],
+    }]}
+
+
+class TraceExporter:
+    """Formats and logs kept traces on a daemon thread, started on first use."""
+
+    def __init__(self, maxsize: int = TRACE_QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger("app.traces")
+
+    def submit(self, trace: Trace) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            metrics.incr(metric_name("tracing", "dropped"))
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            trace = self._queue.get()
+            if trace is None:
+                break
+            try:
+                self.logger.info(json.dumps(otlp_document(trace), separators=(",", ":")))
+            except Exception as e:
+                log.warning(f"Failed to export trace {trace.trace_id}: {e}")
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Export whatever is queued, then stop the thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+
+exporter = TraceExporter()
+
+
+def should_keep(duration_ms: float, failed: bool) -> bool:
+    return failed or duration_ms >= TRACE_SLOW_MS or random.random() < TRACE_SAMPLE_RATE
+
+
+def request_id_from(headers) -> str:
+    for name, value in headers:
+        if name == REQUEST_ID_HEADER.encode():
+            request_id = value.decode("latin-1")
+            if REQUEST_ID.match(request_id):
+                return request_id
+    return new_id(8)
+
+
+class TracingMiddleware:
+    """ASGI middleware: a request id and a root span for every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(request_id_from(scope["headers"]))
+        root = trace.start_span(f"{scope['method']} {scope['path']}", None, {
+            "http.method": scope["method"],
+            "http.target": scope["path"],
+            "request.id": trace.request_id,
+        })
+        token = _current_span.set(root)
+        status = 500
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = dict(message, headers=list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.encode(), trace.request_id.encode()),
+                ])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        except BaseException as e:
+            root.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            root.end()
+            _current_span.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                # The matched template, e.g. /obituaries/{obituary_id}/similar
+                root.name = f"{scope['method']} {route.path}"
+                root.set(**{"http.route": route.path})
+            root.set(**{"http.status_code": status})
+            duration_ms = (root.end_ns - root.start_ns) / 1e6
+            if should_keep(duration_ms, failed=status >= 500 or root.error is not None):
+                exporter.submit(trace)
+                metrics.incr(metric_name("tracing", "kept"))
+            else:
+                metrics.incr(metric_name("tracing", "sampled_out"))
@@ -0,0 +1,273 @@
+"""
+Offline generation through request files in the OpenAI Batch API format.
+
+Each line of a requests file is one chat completion:
+
+    {"custom_id": "...", "method": "POST", "url": "/v1/chat/completions", "body": {...}}
+
+A backend takes the file, runs it and hands back an output file of result
+lines: {"custom_id", "response": {"status_code", "body"}, "error"}.
+OpenAIBatchBackend submits to the Batch API, which costs half of interactive
+calls and has its own rate limits. LocalBatchBackend runs the same file
+through `chat_completion` on a worker pool at BACKGROUND priority. It is
+useful without Batch API access, and in development.
+
+Prompts and models are the ones the interactive endpoints use for the same
+input, from the prompt builders and the model router's primary model.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from app.core.schemas import ObituaryCreate
+from app.core.scratchpad_notes_request import ScratchpadNotesRequest
+from app.services.model_router import model_router
+from app.services.obituary_generator import SYSTEM_PROMPT as STRUCTURED_SYSTEM_PROMPT
+from app.services.openai_client import chat_completion, get_client
+from app.services.prompt_builder import (
+    SYSTEM_GUIDELINES_SCRATCHPAD,
+    build_user_prompt_for_obit_from_scratchpad_notes,
+    build_user_prompt_for_obit_from_structured_data,
+)
+from app.services.rate_limiter import Priority
+
+CHAT_URL = "/v1/chat/completions"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchStatus(NamedTuple):
+    status: str
+    completed: int = 0
+    failed: int = 0
+    total: int = 0
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+
+def read_jsonl(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_jsonl(path: str, records: Iterable[dict]) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+            count += 1
+    return count
+
+
+def chat_request(custom_id: str, model: str, messages: List[dict], **params) -> dict:
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": CHAT_URL,
+        "body": {"model": model, "messages": messages, **params},
+    }
+
+
+def obituary_input(input_data: dict):
+    """The request model for a stored or new input; raises pydantic's ValidationError if invalid."""
+    if "unstructured_notes" in input_data:
+        return ScratchpadNotesRequest(**input_data)
+    return ObituaryCreate(**input_data)
+
+
+def generation_request(custom_id: str, data) -> dict:
+    """The batch line for one obituary input, as built by `obituary_input`."""
+    if isinstance(data, ScratchpadNotesRequest):
+        endpoint, system = "scratchpad", SYSTEM_GUIDELINES_SCRATCHPAD
+        prompt = build_user_prompt_for_obit_from_scratchpad_notes(data)
+        length, style = data.obituary_length, data.obituary_style
+    else:
+        endpoint, system = "structured", STRUCTURED_SYSTEM_PROMPT
+        prompt = build_user_prompt_for_obit_from_structured_data(data)
+        length = style = None
+    # Latency doesn't matter here, so always the route's primary model
+    route = model_router.route_for(endpoint, length, style)
+    messages = [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+    return chat_request(custom_id, route.model, messages, **route.params)
+
+
+def result_line(custom_id: str, body: Optional[dict] = None, error: Optional[dict] = None) -> dict:
+    """An output line in the Batch API's format."""
+    return {
+        "id": f"batch_req_{uuid.uuid4().hex}",
+        "custom_id": custom_id,
+        "response": {"status_code": 200, "request_id": None, "body": body} if body is not None else None,
+        "error": error,
+    }
+
+
+def completion_text(line: dict) -> Optional[Tuple[str, str]]:
+    """(text, model) from a successful output line, otherwise None."""
+    response = line.get("response") or {}
+    if response.get("status_code") != 200 or line.get("error"):
+        return None
+    body = response["body"]
+    # Content is null when e.g. the content filter stopped the completion;
+    # an empty text is no more use than a missing one
+    text = (body["choices"][0]["message"].get("content") or "").strip()
+    if not text:
+        return None
+    return text, body.get("model")
+
+
+class BatchBackend:
+    """Runs a requests file; results are read back in the Batch API output format."""
+
+    name = "base"
+
+    def submit(self, requests_path: str) -> str:
+        raise NotImplementedError
+
+    def status(self, batch_id: str) -> BatchStatus:
+        raise NotImplementedError
+
+    def download(self, batch_id: str, output_path: str) -> None:
+        raise NotImplementedError
+
+
+class OpenAIBatchBackend(BatchBackend):
+    name = "openai"
+
+    def __init__(self, completion_window: str = "24h"):
+        self.completion_window = completion_window
+
+    def submit(self, requests_path: str) -> str:
+        client = get_client()
+        with open(requests_path, "rb") as f:
+            uploaded = client.files.create(file=f, purpose="batch")
+        batch = client.batches.create(
+            input_file_id=uploaded.id, endpoint=CHAT_URL, completion_window=self.completion_window,
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> BatchStatus:
+        batch = get_client().batches.retrieve(batch_id)
+        counts = batch.request_counts
+        if counts is None:
+            return BatchStatus(batch.status)
+        return BatchStatus(batch.status, counts.completed, counts.failed, counts.total)
+
+    def download(self, batch_id: str, output_path: str) -> None:
+        client = get_client()
+        batch = client.batches.retrieve(batch_id)
+        with open(output_path, "wb") as out:
+            # Failed requests are in a separate error file, in the same line format
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    content = client.files.content(file_id).content
+                    out.write(content if content.endswith(b"\n") else content + b"\n")
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    Runs requests files in this process with a pool of `workers` threads.
+    Results are appended to a file as they finish. A batch left unfinished
+    by an earlier process resumes, skipping requests that already have a
+    result, when its status is next checked.
+    """
+
+    name = "local"
+
+    def __init__(self, work_dir: str, workers: int = 8):
+        self.work_dir = work_dir
+        self.workers = workers
+        self._threads: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, batch_id: str, suffix: str) -> str:
+        return os.path.join(self.work_dir, f"{batch_id}.{suffix}")
+
+    def submit(self, requests_path: str) -> str:
+        batch_id = f"local_batch_{uuid.uuid4().hex[:16]}"
+        shutil.copyfile(requests_path, self._path(batch_id, "input.jsonl"))
+        self._start(batch_id)
+        return batch_id
+
+    def _start(self, batch_id: str) -> None:
+        with self._lock:
+            thread = self._threads.get(batch_id)
+            if thread is None or not thread.is_alive():
+                thread = self._threads[batch_id] = threading.Thread(
+                    target=self._run, args=(batch_id,), name=f"batch-{batch_id}", daemon=True,
+                )
+                thread.start()
+
+    def _run(self, batch_id: str) -> None:
+        output_path = self._path(batch_id, "output.jsonl")
+        finished = ({line["custom_id"] for line in read_jsonl(output_path)}
+                    if os.path.exists(output_path) else set())
+        pending = [request for request in read_jsonl(self._path(batch_id, "input.jsonl"))
+                   if request["custom_id"] not in finished]
+
+        with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(self.workers) as pool:
+            for future in as_completed([pool.submit(self._execute, request) for request in pending]):
+                out.write(json.dumps(future.result()) + "\n")
+                out.flush()
+        with open(self._path(batch_id, "done"), "w") as f:
+            f.write(str(time.time()))
+
+    @staticmethod
+    def _execute(request: dict) -> dict:
+        body = dict(request["body"])
+        try:
+            response = chat_completion(body.pop("model"), body.pop("messages"),
+                                       priority=Priority.BACKGROUND, endpoint="batch", **body)
+        except Exception as e:
+            return result_line(request["custom_id"], error={"code": type(e).__name__, "message": str(e)})
+        return result_line(request["custom_id"], body=response.model_dump(mode="json"))
+
+    def status(self, batch_id: str) -> BatchStatus:
+        input_path = self._path(batch_id, "input.jsonl")
+        if not os.path.exists(input_path):
+            return BatchStatus("failed")
+        total = sum(1 for _ in read_jsonl(input_path))
+        output_path = self._path(batch_id, "output.jsonl")
+        completed = failed = 0
+        if os.path.exists(output_path):
+            for line in read_jsonl(output_path):
+                if completion_text(line) is None:
+                    failed += 1
+                else:
+                    completed += 1
+        if os.path.exists(self._path(batch_id, "done")):
+            return BatchStatus("completed", completed, failed, total)
+        self._start(batch_id)
+        return BatchStatus("in_progress", completed, failed, total)
+
+    def download(self, batch_id: str, output_path: str) -> None:
+        shutil.copyfile(self._path(batch_id, "output.jsonl"), output_path)
+
+
+def get_backend(name: str, work_dir: str, workers: int = 8) -> BatchBackend:
+    if name == OpenAIBatchBackend.name:
+        return OpenAIBatchBackend()
+    if name == LocalBatchBackend.name:
+        return LocalBatchBackend(work_dir, workers)
+    raise ValueError(f"Unknown batch backend: {name}")
+
+
+def poll(backend: BatchBackend, batch_id: str, interval: float = 60,
+         timeout: Optional[float] = None,
+         on_progress: Optional[Callable[[BatchStatus], None]] = None) -> BatchStatus:
+    """Check the batch every `interval` seconds until it finishes or `timeout` passes."""
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    while True:
+        status = backend.status(batch_id)
+        if on_progress:
+            on_progress(status)
+        if status.done or (deadline is not None and time.monotonic() >= deadline):
+            return status
+        time.sleep(interval)
@@ -0,0 +1,131 @@
+"""
+Circuit breakers for upstream operations. After a run of upstream failures
+(timeouts, connection errors, 5xx) the circuit opens and calls fail fast with
+CircuitOpenError instead of tying up a worker thread on a dead upstream. Once
+the recovery timeout passes, a single probe call is let through (half-open);
+its outcome closes the circuit or reopens it.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from app.core.metrics import metric_name, metrics
+
+FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+RECOVERY_SECONDS = float(os.getenv("CIRCUIT_RECOVERY_SECONDS", "30"))
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    Errors that say the upstream itself is unhealthy. Anything else (bad
+    request, rate limiting) means it answered, so it counts as healthy.
+    """
+    import openai
+
+    return isinstance(error, (
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    ))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Upstream '{name}' is unavailable; retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD,
+                 recovery_seconds: float = RECOVERY_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str) -> None:
+        """Lock held."""
+        if state != self.state:
+            self.state = state
+            metrics.incr(metric_name("circuit", self.name, state))
+
+    def before_call(self) -> None:
+        """Admit the call or raise CircuitOpenError."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            remaining = self.opened_at + self.recovery_seconds - time.monotonic()
+            if self.state == OPEN and remaining <= 0:
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            raise CircuitOpenError(self.name, max(remaining, 1.0))
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            self._transition(CLOSED)
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    @contextmanager
+    def guard(self):
+        """Run the enclosed upstream call under this breaker."""
+        self.before_call()
+        try:
+            yield
+        except Exception as e:
+            if is_upstream_failure(e):
+                self.on_failure()
+            else:
+                # The upstream answered, just not with a success
+                self.on_success()
+            raise
+        except BaseException:
+            # Cancelled or interrupted before the upstream answered
+            with self._lock:
+                self._probe_in_flight = False
+            raise
+        self.on_success()
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == OPEN and time.monotonic() < self.opened_at + self.recovery_seconds
+
+
+breakers: Dict[str, CircuitBreaker] = {
+    "chat": CircuitBreaker("chat"),
+    "embeddings": CircuitBreaker("embeddings"),
+}
+
+
+def breaker_snapshot() -> Dict[str, float]:
+    return {
+        metric_name("circuit", name, "state"): STATE_VALUES[breaker.state]
+        for name, breaker in breakers.items()
+    }
+
+
+metrics.register_collector(breaker_snapshot)
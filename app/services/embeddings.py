@@ -1,20 +1,179 @@
-from sqlalchemy.orm import Session
-from app.core.models import Obituary
-import openai
+"""
+Obituary embeddings, versioned by model and dimension count.
 
-def generate_obituary_embedding(obituary_id: int, db: Session):
+Each embedding is stored in `obituary_embeddings` with the SHA-256 of the text
+it was made from, so re-embedding only calls the API for obituaries that are
+new or whose text changed since the last run. The backfill also records when
+each complete run started (`embedding_backfills`) and next time only reads
+obituaries updated since, so database work scales with churn as well.
+Embeddings from the default
+model are also written to `Obituary.embedding`, which the default search
+path and its HNSW index use.
+"""
+import hashlib
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import and_, func, or_, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, load_only
+
+from app.core.models import EmbeddingBackfill, Obituary, ObituaryEmbedding
+from app.core.tracing import span
+from app.services.openai_client import EMBEDDING_MODEL, create_embedding
+from app.services.rate_limiter import Priority
+
+DEFAULT_DIMENSIONS = Obituary.embedding.type.dim
+# Output size of each model when no `dimensions` is requested
+NATIVE_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+# Texts per embeddings request
+BATCH_SIZE = 100
+# Stale obituaries loaded per page by the backfill
+BACKFILL_PAGE_ROWS = 1000
+
+# A row committed after the backfill starts can't carry an updated_at earlier
+# than the oldest transaction open at that moment, which may include this one
+BACKFILL_START_SQL = text("""
+SELECT LEAST(now(), min(xact_start)) FROM pg_stat_activity
+WHERE datname = current_database() AND xact_start IS NOT NULL
+""")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def resolve_dims(model: str, dims: Optional[int] = None) -> int:
+    return dims or NATIVE_DIMENSIONS.get(model, DEFAULT_DIMENSIONS)
+
+
+def is_default(model: str, dims: int) -> bool:
+    return model == EMBEDDING_MODEL and dims == DEFAULT_DIMENSIONS
+
+
+def embed_texts(texts: List[str], model: str = EMBEDDING_MODEL, dims: Optional[int] = None,
+                priority: Priority = Priority.BACKGROUND, hedge: bool = False,
+                endpoint: str = "embeddings") -> List[List[float]]:
+    """Embed `texts` in one request; `dims` is sent only when it differs from the model's native size."""
+    dims = resolve_dims(model, dims)
+    params = {} if NATIVE_DIMENSIONS.get(model) == dims else {"dimensions": dims}
+    response = create_embedding(texts, model=model, priority=priority, hedge=hedge, endpoint=endpoint, **params)
+    return [item.embedding for item in response.data]
+
+
+def embedding_record(text: str, vector, model: str = EMBEDDING_MODEL,
+                     dims: Optional[int] = None) -> ObituaryEmbedding:
+    """A new side-table row, e.g. for `Obituary(embeddings=[...])`."""
+    return ObituaryEmbedding(model=model, dims=resolve_dims(model, dims),
+                             content_hash=content_hash(text), embedding=vector)
+
+
+def _filter_stale(query, model: str, dims: int):
+    text_hash = func.encode(func.sha256(func.convert_to(Obituary.generated_text, "UTF8")), "hex")
+    return query.outerjoin(ObituaryEmbedding, and_(
+        ObituaryEmbedding.obituary_id == Obituary.id,
+        ObituaryEmbedding.model == model,
+        ObituaryEmbedding.dims == dims,
+    )).filter(or_(ObituaryEmbedding.obituary_id.is_(None), ObituaryEmbedding.content_hash != text_hash))
+
+
+def stale_obituaries(db: Session, model: str = EMBEDDING_MODEL, dims: Optional[int] = None,
+                     since: Optional[datetime] = None):
+    """
+    Obituaries with no embedding for (model, dims), or whose text no longer
+    matches the stored hash. The hash is compared in SQL, so unchanged rows
+    are never loaded. With `since`, only obituaries updated from then on are
+    checked, read through the updated_at index.
+    """
+    query = db.query(Obituary).options(load_only(Obituary.id, Obituary.generated_text))
+    if since is not None:
+        query = query.filter(Obituary.updated_at >= since)
+    return _filter_stale(query, model, resolve_dims(model, dims)).order_by(Obituary.id)
+
+
+def store_embeddings(db: Session, obituaries: List[Obituary], model: str = EMBEDDING_MODEL,
+                     dims: Optional[int] = None, priority: Priority = Priority.BACKGROUND,
+                     hedge: bool = False) -> int:
+    """Embed and upsert `obituaries` in batches, committing each; returns the count embedded."""
+    dims = resolve_dims(model, dims)
+    # Read up front: each commit below expires the loaded attributes
+    pending = [(obit, obit.id, obit.generated_text) for obit in obituaries]
+    for start in range(0, len(pending), BATCH_SIZE):
+        batch = pending[start:start + BATCH_SIZE]
+        vectors = embed_texts([text for _, _, text in batch], model, dims, priority, hedge)
+        rows = [
+            {"obituary_id": obituary_id, "model": model, "dims": dims,
+             "content_hash": content_hash(text), "embedding": vector}
+            for (_, obituary_id, text), vector in zip(batch, vectors)
+        ]
+        statement = insert(ObituaryEmbedding).values(rows)
+        with span("db.store_embeddings", rows=len(rows)):
+            db.execute(statement.on_conflict_do_update(
+                index_elements=[ObituaryEmbedding.obituary_id, ObituaryEmbedding.model, ObituaryEmbedding.dims],
+                set_={
+                    "content_hash": statement.excluded.content_hash,
+                    "embedding": statement.excluded.embedding,
+                    "updated_at": func.now(),
+                },
+            ))
+            if is_default(model, dims):
+                for (obit, _, _), vector in zip(batch, vectors):
+                    obit.embedding = vector
+            db.commit()
+    return len(obituaries)
+
+
+def backfill_embeddings(db: Session, model: str = EMBEDDING_MODEL, dims: Optional[int] = None,
+                        priority: Priority = Priority.BACKGROUND, page_rows: int = BACKFILL_PAGE_ROWS) -> int:
+    """
+    Embed every stale obituary for (model, dims), a page at a time; returns
+    the count embedded. Only obituaries updated since the last complete run
+    started are checked. This run's start is recorded once every page is
+    done, so a failed run is simply checked again next time.
+    """
+    dims = resolve_dims(model, dims)
+    started = db.execute(BACKFILL_START_SQL).scalar()
+    previous = db.get(EmbeddingBackfill, (model, dims))
+    since = previous.checked_through if previous else None
+
+    last_id, embedded = 0, 0
+    while True:
+        page = stale_obituaries(db, model, dims, since).filter(Obituary.id > last_id).limit(page_rows).all()
+        if not page:
+            break
+        last_id = page[-1].id
+        embedded += store_embeddings(db, page, model, dims, priority)
+
+    statement = insert(EmbeddingBackfill).values(model=model, dims=dims, checked_through=started)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[EmbeddingBackfill.model, EmbeddingBackfill.dims],
+        set_={"checked_through": statement.excluded.checked_through},
+    ))
+    db.commit()
+    return embedded
+
+
+def ensure_embeddings(db: Session, obituaries: List[Obituary], model: str = EMBEDDING_MODEL,
+                      dims: Optional[int] = None, priority: Priority = Priority.BACKGROUND,
+                      hedge: bool = False) -> int:
+    """Embed those of `obituaries` that are missing or stale; returns the count embedded."""
+    query = db.query(Obituary.id).filter(Obituary.id.in_([obit.id for obit in obituaries]))
+    stale_ids = {obituary_id for (obituary_id,) in _filter_stale(query, model, resolve_dims(model, dims))}
+    stale = [obit for obit in obituaries if obit.id in stale_ids]
+    return store_embeddings(db, stale, model, dims, priority, hedge)
+
+
+def generate_obituary_embedding(obituary_id: int, db: Session, model: str = EMBEDDING_MODEL,
+                                dims: Optional[int] = None):
     obituary = db.query(Obituary).filter(Obituary.id == obituary_id).first()
     if not obituary:
         return {"error": "Obituary not found"}
-    
-    # Call OpenAI API to generate embeddings
-    response = openai.Embedding.create(
-        input=obituary.text,  # Assuming obituary has a text field
-        model="text-embedding-ada-002"
-    )
-    embedding = response["data"][0]["embedding"]
-    
-    obituary.embedding = embedding
-    db.commit()
-    
+
+    if not ensure_embeddings(db, [obituary], model, dims):
+        return {"message": "Embedding is up to date", "obituary_id": obituary_id}
+
     return {"message": "Embedding generated successfully", "obituary_id": obituary_id}
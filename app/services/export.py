@@ -0,0 +1,70 @@
+"""
+NDJSON export of obituaries, streamed from a server-side cursor so memory
+stays at one batch of rows however many match.
+"""
+import base64
+from typing import Iterator
+
+import orjson
+from sqlalchemy import select
+
+from app.core.database import get_engine
+from app.core.models import Obituary
+from app.core.schemas import ObituaryFilters
+from app.services.search import filter_conditions
+
+# Rows fetched from the cursor, and written, per chunk
+EXPORT_BATCH_ROWS = 1000
+
+EXPORT_COLUMNS = (
+    Obituary.id,
+    Obituary.created_at,
+    Obituary.name,
+    Obituary.birth_year,
+    Obituary.death_year,
+    Obituary.obituary_style,
+    Obituary.obituary_length,
+    Obituary.input_data,
+    Obituary.generated_text,
+    Obituary.openai_score,
+    Obituary.teacher_score,
+    Obituary.final_score,
+    Obituary.obit_metadata,
+)
+
+
+def encode_embedding(embedding):
+    """Base64 of the vector as little-endian float32, 6 KB for 1536 dims."""
+    if embedding is None:
+        return None
+    # Only loaded when embeddings are exported
+    import numpy as np
+
+    return base64.b64encode(np.asarray(embedding, dtype="<f4").tobytes()).decode("ascii")
+
+
+def export_query(filters: ObituaryFilters, include_embeddings: bool = False):
+    columns = EXPORT_COLUMNS + ((Obituary.embedding,) if include_embeddings else ())
+    return select(*columns).where(*filter_conditions(filters)).order_by(Obituary.id)
+
+
+def ndjson_chunk(rows, include_embeddings: bool = False) -> bytes:
+    lines = []
+    for row in rows:
+        record = dict(row)
+        if include_embeddings:
+            record["embedding"] = encode_embedding(record["embedding"])
+        lines.append(orjson.dumps(record))
+        lines.append(b"\n")
+    return b"".join(lines)
+
+
+def export_ndjson(filters: ObituaryFilters, include_embeddings: bool = False,
+                  batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[bytes]:
+    """Yield NDJSON chunks of `batch_rows` obituaries each."""
+    query = export_query(filters, include_embeddings)
+    # A connection of its own: the stream outlives the request's session
+    with get_engine().connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=batch_rows).execute(query)
+        for rows in result.mappings().partitions():
+            yield ndjson_chunk(rows, include_embeddings)
@@ -0,0 +1,160 @@
+"""
+Request hedging for upstream calls: if a call hasn't returned by a recent
+latency percentile, a duplicate is started and the first to finish wins.
+Hedged calls run on a dedicated event loop thread so the loser can actually
+be cancelled, which a blocking client call on a worker thread cannot.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.metrics import metric_name, metrics
+
+HEDGING_ENABLED = os.getenv("OPENAI_HEDGING", "0").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = float(os.getenv("OPENAI_HEDGE_PERCENTILE", "95"))
+# Extra calls allowed, as a fraction of primary calls
+HEDGE_MAX_RATIO = float(os.getenv("OPENAI_HEDGE_MAX_RATIO", "0.05"))
+# No hedging until this many latencies have been observed for a call type
+HEDGE_MIN_SAMPLES = int(os.getenv("OPENAI_HEDGE_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = 200
+
+
+class LatencyTracker:
+    """Recent call latencies for one call type."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(int(len(samples) * p / 100), len(samples) - 1)
+        return samples[index]
+
+
+class HedgeBudget:
+    """
+    Credits for extra calls: each primary call earns `ratio` of a credit and
+    each hedge spends one, so hedges stay within `ratio` of traffic. Unused
+    credit is capped so a quiet period can't fund a later storm of hedges.
+    """
+
+    def __init__(self, ratio: float, max_credits: float = 5.0):
+        self.ratio = ratio
+        self.max_credits = max_credits
+        self.credits = 0.0
+        self._lock = threading.Lock()
+
+    def earn(self) -> None:
+        with self._lock:
+            self.credits = min(self.credits + self.ratio, self.max_credits)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.credits >= 1.0:
+                self.credits -= 1.0
+                return True
+            return False
+
+
+class HedgingPolicy:
+    def __init__(self, percentile: float = HEDGE_PERCENTILE, max_ratio: float = HEDGE_MAX_RATIO,
+                 min_samples: int = HEDGE_MIN_SAMPLES):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.budget = HedgeBudget(max_ratio)
+        # Keyed by (operation, model)
+        self._trackers: Dict[Tuple[str, ...], LatencyTracker] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def _tracker(self, key) -> LatencyTracker:
+        with self._lock:
+            return self._trackers.setdefault(key, LatencyTracker())
+
+    def hedge_delay(self, key) -> Optional[float]:
+        """Seconds to wait before hedging, or None if there isn't enough history."""
+        tracker = self._tracker(key)
+        if len(tracker) < self.min_samples:
+            return None
+        return tracker.percentile(self.percentile)
+
+    async def _timed(self, key, make_call: Callable[[], Awaitable]):
+        started = time.monotonic()
+        result = await make_call()
+        self._tracker(key).record(time.monotonic() - started)
+        return result
+
+    async def run(self, key, make_call: Callable[[], Awaitable]):
+        """
+        Await `make_call()`, hedging with a second `make_call()` if the first
+        is slower than the tracked percentile. Errors are not hedged: if every
+        attempt fails, the primary's exception is raised.
+        """
+        prefix = metric_name("openai", *key)
+        metrics.incr(f"{prefix}.primary_calls")
+        self.budget.earn()
+
+        primary = asyncio.ensure_future(self._timed(key, make_call))
+        attempts = [primary]
+        try:
+            delay = self.hedge_delay(key)
+            if delay is not None:
+                done, _ = await asyncio.wait(attempts, timeout=delay)
+                if not done and self.budget.try_spend():
+                    metrics.incr(f"{prefix}.hedges_sent")
+                    attempts.append(asyncio.ensure_future(self._timed(key, make_call)))
+
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempt is not primary:
+                            metrics.incr(f"{prefix}.hedges_won")
+                        return attempt.result()
+            return primary.result()
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="openai-hedging", daemon=True).start()
+            return self._loop
+
+    def run_sync(self, key, make_call: Callable[[], Awaitable]):
+        """Blocking wrapper around `run` for threadpool callers."""
+        future = asyncio.run_coroutine_threadsafe(self.run(key, make_call), self._background_loop())
+        return future.result()
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            trackers = dict(self._trackers)
+        gauges = {metric_name("openai", "hedge_credits"): self.budget.credits}
+        for key, tracker in trackers.items():
+            prefix = metric_name("openai", *key)
+            for p in (50, 95, 99):
+                latency = tracker.percentile(p)
+                if latency is not None:
+                    gauges[f"{prefix}.latency_p{p}_ms"] = latency * 1000
+        return gauges
+
+
+hedging = HedgingPolicy()
+metrics.register_collector(hedging.snapshot)
@@ -0,0 +1,122 @@
+"""
+Process-wide HTTP transport for upstream API clients.
+
+All sync OpenAI clients share one keep-alive `httpx.Client`, so TLS sessions
+and sockets are reused across call sites instead of each module holding its
+own pool. Async clients get an `httpx.AsyncClient` with the same settings,
+one per event loop, since async connections can't cross loops. HTTP/2 is
+used when the optional `h2` package is installed.
+
+New connections and TLS handshakes are counted through httpcore's trace
+hook, so connection reuse shows up on /metrics.
+"""
+import importlib.util
+import os
+import threading
+from typing import Dict
+
+import httpx
+
+from app.core.metrics import metric_name, metrics
+
+# The read timeout has to outlast a long non-streaming completion or judge
+# batch, which can take minutes
+TIMEOUT = httpx.Timeout(
+    connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5")),
+    read=float(os.getenv("OPENAI_READ_TIMEOUT", "600")),
+    write=float(os.getenv("OPENAI_WRITE_TIMEOUT", "30")),
+    pool=float(os.getenv("OPENAI_POOL_TIMEOUT", "10")),
+)
+# Passed per request for calls that answer quickly (embeddings, model list),
+# so a stalled connection fails fast instead of holding a worker
+SHORT_TIMEOUT = httpx.Timeout(
+    connect=TIMEOUT.connect,
+    read=float(os.getenv("OPENAI_SHORT_READ_TIMEOUT", "30")),
+    write=TIMEOUT.write,
+    pool=TIMEOUT.pool,
+)
+LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20")),
+    keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60")),
+)
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_counts: Dict[str, int] = {"requests": 0, "connections_opened": 0, "tls_handshakes": 0}
+_counts_lock = threading.Lock()
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _counts_lock:
+        _counts[name] += 1
+
+
+def _trace(event_name: str, info: dict) -> None:
+    if event_name == "connection.connect_tcp.complete":
+        _count("connections_opened")
+    elif event_name == "connection.start_tls.complete":
+        _count("tls_handshakes")
+
+
+async def _trace_async(event_name: str, info: dict) -> None:
+    _trace(event_name, info)
+
+
+def _on_request(request: httpx.Request) -> None:
+    _count("requests")
+    request.extensions["trace"] = _trace
+
+
+async def _on_request_async(request: httpx.Request) -> None:
+    _count("requests")
+    request.extensions["trace"] = _trace_async
+
+
+def get_http_client() -> httpx.Client:
+    """The shared sync client, created on first use."""
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = httpx.Client(
+                    timeout=TIMEOUT,
+                    limits=LIMITS,
+                    http2=HTTP2_AVAILABLE,
+                    event_hooks={"request": [_on_request]},
+                )
+    return _http_client
+
+
+def new_async_http_client() -> httpx.AsyncClient:
+    """An async client with the shared settings; use one per event loop."""
+    return httpx.AsyncClient(
+        timeout=TIMEOUT,
+        limits=LIMITS,
+        http2=HTTP2_AVAILABLE,
+        event_hooks={"request": [_on_request_async]},
+    )
+
+
+def close_http_client() -> None:
+    global _http_client
+    with _http_client_lock:
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
+
+
+def transport_snapshot() -> Dict[str, float]:
+    with _counts_lock:
+        counts = dict(_counts)
+    gauges = {metric_name("http", "upstream", name): value for name, value in counts.items()}
+    if counts["requests"]:
+        reused = 1 - counts["connections_opened"] / counts["requests"]
+        gauges[metric_name("http", "upstream", "connection_reuse_ratio")] = max(reused, 0.0)
+    gauges[metric_name("http", "upstream", "http2")] = float(HTTP2_AVAILABLE)
+    return gauges
+
+
+metrics.register_collector(transport_snapshot)
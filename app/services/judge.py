@@ -0,0 +1,278 @@
+"""
+LLM-as-judge scoring of generated obituaries.
+
+One judge call scores many obituaries. Texts are packed into a request until
+JUDGE_BATCH_TOKENS (estimated) or JUDGE_BATCH_MAX_ITEMS is reached. The judge
+answers with a JSON object holding, for each id, an `openai_score` (overall
+quality as an obituary) and a `teacher_score` (writing quality as a teacher
+would grade it), both 0-100. `final_score` is their weighted blend, with
+weights from SCORE_WEIGHTS, e.g. "openai=0.6,teacher=0.4". Scores are written
+back in one UPDATE per judge call.
+
+Generation endpoints call `judge_queue.submit()` after storing a row. A
+background thread drains the queue, waiting up to JUDGE_MAX_WAIT_SECONDS to
+fill a batch, so scoring never adds latency to a request. Obituaries the
+judge skipped, or that were lost on shutdown, keep NULL scores, and
+`scripts.score_obituaries` backfills them.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel, ValidationError, field_validator
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.metrics import metric_name, metrics
+from app.services.model_router import routed_chat_completion
+from app.services.openai_client import estimate_tokens
+from app.services.rate_limiter import Priority
+
+JUDGE_BATCH_TOKENS = int(os.getenv("JUDGE_BATCH_TOKENS", "12000"))
+JUDGE_BATCH_MAX_ITEMS = int(os.getenv("JUDGE_BATCH_MAX_ITEMS", "20"))
+JUDGE_MAX_WAIT_SECONDS = float(os.getenv("JUDGE_MAX_WAIT_SECONDS", "5"))
+JUDGE_QUEUE_SIZE = int(os.getenv("JUDGE_QUEUE_SIZE", "10000"))
+# Longer texts are cut to this many characters for judging
+JUDGE_MAX_TEXT_CHARS = int(os.getenv("JUDGE_MAX_TEXT_CHARS", "8000"))
+# Completion tokens reserved per scored item; an entry like
+# {"id": 123456, "openai_score": 85, "teacher_score": 78} is about 25 tokens
+# before the model adds whitespace and newlines
+TOKENS_PER_SCORE = 60
+
+log = logging.getLogger(__name__)
+
+JUDGE_SYSTEM_PROMPT = (
+    "You are an experienced obituary editor and writing teacher grading obituaries.\n"
+    "You will receive a JSON array of obituaries, each with an \"id\" and a \"text\".\n"
+    "Score every obituary independently on two 0-100 scales:\n"
+    "- openai_score: how well it works as an obituary: accurate-sounding, respectful, "
+    "complete (life, family, legacy, services), and appropriate in tone.\n"
+    "- teacher_score: writing quality as a teacher would grade it: grammar, clarity, "
+    "structure, flow and word choice.\n"
+    "Respond with only a JSON object of the form "
+    "{\"scores\": [{\"id\": <id>, \"openai_score\": <0-100>, \"teacher_score\": <0-100>}]}, "
+    "with one entry for every id you received."
+)
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    weights = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight)
+    unknown = set(weights) - {"openai", "teacher"}
+    if unknown or not any(weights.values()):
+        raise ValueError(f"Invalid SCORE_WEIGHTS: {value}")
+    return weights
+
+
+SCORE_WEIGHTS = parse_weights(os.getenv("SCORE_WEIGHTS", "openai=0.5,teacher=0.5"))
+
+
+class JudgeScore(BaseModel):
+    id: int
+    openai_score: float
+    teacher_score: float
+
+    @field_validator("openai_score", "teacher_score")
+    @classmethod
+    def clamp(cls, value: float) -> float:
+        return min(max(value, 0.0), 100.0)
+
+
+class JudgeResponse(BaseModel):
+    scores: List[JudgeScore]
+
+
+def final_score(openai_score: Optional[float], teacher_score: Optional[float],
+                weights: Dict[str, float] = SCORE_WEIGHTS) -> Optional[float]:
+    """Weighted mean of the scores present; None if neither is."""
+    parts = [(weights.get("openai", 0.0), openai_score), (weights.get("teacher", 0.0), teacher_score)]
+    parts = [(weight, score) for weight, score in parts if score is not None and weight]
+    if not parts:
+        return None
+    return sum(weight * score for weight, score in parts) / sum(weight for weight, _ in parts)
+
+
+def item_tokens(text_: str) -> int:
+    return estimate_tokens(text_[:JUDGE_MAX_TEXT_CHARS]) + TOKENS_PER_SCORE
+
+
+def pack(items: Iterable[Tuple[int, str]], budget: int = JUDGE_BATCH_TOKENS,
+         max_items: int = JUDGE_BATCH_MAX_ITEMS) -> Iterator[List[Tuple[int, str]]]:
+    """Group (id, text) pairs into batches within the token budget; an oversized text goes alone."""
+    batch, used = [], 0
+    for item in items:
+        tokens = item_tokens(item[1])
+        if batch and (used + tokens > budget or len(batch) >= max_items):
+            yield batch
+            batch, used = [], 0
+        batch.append(item)
+        used += tokens
+    if batch:
+        yield batch
+
+
+def judge_batch(items: List[Tuple[int, str]], priority: Priority = Priority.BACKGROUND) -> Dict[int, JudgeScore]:
+    """
+    One judge call for (id, text) pairs; scores by id, omitting any the judge
+    skipped or garbled. A response cut off at max_tokens is retried as two
+    halves rather than thrown away.
+    """
+    payload = [{"id": obituary_id, "text": (body or "")[:JUDGE_MAX_TEXT_CHARS]} for obituary_id, body in items]
+    response = routed_chat_completion(
+        "judge",
+        messages=[
+            {"role": "system", "content": JUDGE_SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps(payload)},
+        ],
+        priority=priority,
+        max_tokens=TOKENS_PER_SCORE * len(items) + 50,
+    )
+    if response.choices[0].finish_reason == "length" and len(items) > 1:
+        metrics.incr(metric_name("judge", "truncated_responses"))
+        half = len(items) // 2
+        return {**judge_batch(items[:half], priority), **judge_batch(items[half:], priority)}
+    try:
+        result = JudgeResponse.model_validate_json(response.choices[0].message.content)
+    except ValidationError as e:
+        metrics.incr(metric_name("judge", "invalid_responses"))
+        log.warning(f"Discarded judge response for {len(items)} obituaries: {e.error_count()} errors")
+        return {}
+    wanted = {obituary_id for obituary_id, _ in items}
+    scores = {score.id: score for score in result.scores if score.id in wanted}
+    metrics.incr(metric_name("judge", "scored"), len(scores))
+    metrics.incr(metric_name("judge", "skipped"), len(wanted) - len(scores))
+    return scores
+
+
+WRITE_SQL = text("""
+UPDATE obituaries AS o
+SET openai_score = s.openai_score,
+    teacher_score = s.teacher_score,
+    final_score = s.final_score
+FROM unnest(CAST(:ids AS integer[]), CAST(:openai AS double precision[]),
+            CAST(:teacher AS double precision[]), CAST(:final AS double precision[]))
+     AS s(id, openai_score, teacher_score, final_score)
+WHERE o.id = s.id
+""")
+
+
+def write_scores(db: Session, scores: Dict[int, JudgeScore]) -> int:
+    """Write scores and final_score in one UPDATE and commit; returns rows written."""
+    if not scores:
+        return 0
+    rows = list(scores.values())
+    db.execute(WRITE_SQL, {
+        "ids": [row.id for row in rows],
+        "openai": [row.openai_score for row in rows],
+        "teacher": [row.teacher_score for row in rows],
+        "final": [final_score(row.openai_score, row.teacher_score) for row in rows],
+    })
+    db.commit()
+    return len(rows)
+
+
+def score_obituaries(db: Session, items: Iterable[Tuple[int, str]],
+                     priority: Priority = Priority.BACKGROUND) -> Dict[int, JudgeScore]:
+    """Judge (id, text) pairs in token-budgeted batches, writing each batch's scores as it returns."""
+    scored = {}
+    for batch in pack(items):
+        scores = judge_batch(batch, priority)
+        write_scores(db, scores)
+        scored.update(scores)
+    return scored
+
+
+class JudgeQueue:
+    """
+    Scores obituaries off the request path. Submitted (id, text) pairs are
+    batched by token budget on a daemon thread, started on first use.
+    """
+
+    def __init__(self, maxsize: int = JUDGE_QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def submit(self, obituary_id: int, generated_text: str) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait((obituary_id, generated_text))
+        except queue.Full:
+            # Left unscored for scripts.score_obituaries
+            metrics.incr(metric_name("judge", "dropped"))
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="judge-queue", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self, first: Tuple[int, str]) -> Tuple[List[Tuple[int, str]], Optional[Tuple[int, str]]]:
+        """
+        Gather items after `first` until the budget is used or the wait runs
+        out. Returns the batch and any item that didn't fit, which starts the
+        next one.
+        """
+        batch, used = [first], item_tokens(first[1])
+        deadline = time.monotonic() + JUDGE_MAX_WAIT_SECONDS
+        while len(batch) < JUDGE_BATCH_MAX_ITEMS:
+            # When stopping, take only what is already queued
+            remaining = 0 if self._stopping.is_set() else deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                break
+            tokens = item_tokens(item[1])
+            if used + tokens > JUDGE_BATCH_TOKENS:
+                return batch, item
+            batch.append(item)
+            used += tokens
+        return batch, None
+
+    def _run(self) -> None:
+        from app.core.database import SessionLocal, get_engine
+
+        # SessionLocal is only bound once the engine exists
+        get_engine()
+        carry = None
+        while True:
+            if carry is None:
+                if self._stopping.is_set() and self._queue.empty():
+                    break
+                carry = self._queue.get()
+                if carry is None:
+                    continue
+            batch, carry = self._next_batch(carry)
+            db = SessionLocal()
+            try:
+                write_scores(db, judge_batch(batch))
+            except Exception as e:
+                metrics.incr(metric_name("judge", "failures"))
+                log.warning(f"Scoring {len(batch)} obituaries failed: {e}")
+            finally:
+                db.close()
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """Score what is already queued, within `timeout`, then stop."""
+        if self._thread is not None:
+            self._stopping.set()
+            try:
+                # Wakes the thread if it is waiting on an empty queue
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+            self._thread.join(timeout)
+            self._thread = None
+
+
+judge_queue = JudgeQueue()
@@ -0,0 +1,169 @@
+"""
+Picks the chat model and request parameters for each generation call from a
+routing table keyed on endpoint, obituary length and style.
+
+Each route may name a faster `fallback_model` and a latency SLO. The router
+keeps an EWMA of latency per route and model; while the primary model's EWMA
+is above the SLO, traffic shifts to the fallback, with a small share still
+probing the primary so the route recovers once it is healthy again.
+
+The default table below can be replaced with a JSON list of routes in the
+file named by MODEL_ROUTES_FILE.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from pydantic import BaseModel
+
+from app.core.metrics import metric_name, metrics
+from app.services.openai_client import chat_completion
+
+EWMA_ALPHA = 0.2
+# Recover once the primary's EWMA drops below this share of the SLO
+RECOVERY_RATIO = 0.8
+# While degraded, one in this many calls still goes to the primary
+PROBE_EVERY = 10
+
+
+class Route(BaseModel):
+    endpoint: str = "*"
+    length: str = "*"
+    style: str = "*"
+    model: str
+    fallback_model: Optional[str] = None
+    slo_ms: Optional[float] = None
+    params: Dict[str, Any] = {}
+
+    def matches(self, endpoint: str, length: str, style: str) -> bool:
+        return all(
+            pattern in ("*", value)
+            for pattern, value in (
+                (self.endpoint, endpoint),
+                (self.length, length),
+                (self.style, style),
+            )
+        )
+
+    @property
+    def key(self) -> str:
+        """Metric-safe route name, e.g. "scratchpad_short_any"."""
+        return "_".join(
+            "any" if part == "*" else part
+            for part in (self.endpoint, self.length, self.style)
+        )
+
+
+class RouteChoice(NamedTuple):
+    route: Route
+    model: str
+    params: Dict[str, Any]
+
+
+# First match wins, so list specific routes before broader ones. Routes
+# already on gpt-3.5-turbo have no faster model to fall back to, so no SLO
+DEFAULT_ROUTES: List[Dict[str, Any]] = [
+    {"endpoint": "scratchpad", "length": "short", "model": "gpt-3.5-turbo",
+     "params": {"max_tokens": 200}},
+    {"endpoint": "scratchpad", "length": "medium", "model": "gpt-3.5-turbo",
+     "params": {"max_tokens": 800}},
+    {"endpoint": "scratchpad", "model": "gpt-3.5-turbo"},
+    {"endpoint": "generate_obituary", "model": "gpt-3.5-turbo"},
+    {"endpoint": "structured", "model": "gpt-4-turbo", "fallback_model": "gpt-3.5-turbo",
+     "slo_ms": 30000},
+    {"endpoint": "sample_input", "model": "gpt-4", "fallback_model": "gpt-4-turbo"},
+    {"endpoint": "sample_obituary", "model": "gpt-4-turbo", "params": {"temperature": 0.7}},
+    {"endpoint": "refine", "model": "gpt-3.5-turbo", "params": {"temperature": 0.3}},
+    {"endpoint": "judge", "model": "gpt-4-turbo",
+     "params": {"temperature": 0, "response_format": {"type": "json_object"}}},
+    {"model": "gpt-3.5-turbo"},
+]
+
+
+def _value(option) -> str:
+    if option is None:
+        return "*"
+    return getattr(option, "value", option)
+
+
+class ModelRouter:
+    def __init__(self, routes: List[Route]):
+        self.routes = routes
+        self._ewma: Dict[tuple, float] = {}
+        self._degraded: Dict[str, bool] = {}
+        self._calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def route_for(self, endpoint: str, length=None, style=None) -> Route:
+        length, style = _value(length), _value(style)
+        for route in self.routes:
+            if route.matches(endpoint, length, style):
+                return route
+        raise LookupError(f"No model route for endpoint={endpoint} length={length} style={style}")
+
+    def select(self, endpoint: str, length=None, style=None) -> RouteChoice:
+        route = self.route_for(endpoint, length, style)
+        model = route.model
+        if route.fallback_model:
+            with self._lock:
+                calls = self._calls[route.key] = self._calls.get(route.key, 0) + 1
+                if self._degraded.get(route.key) and calls % PROBE_EVERY:
+                    model = route.fallback_model
+        return RouteChoice(route, model, dict(route.params))
+
+    def record(self, choice: RouteChoice, seconds: float) -> None:
+        """Feed a successful call's latency back into the route's EWMA."""
+        route = choice.route
+        key = (route.key, choice.model)
+        latency_ms = seconds * 1000
+        with self._lock:
+            previous = self._ewma.get(key)
+            ewma = latency_ms if previous is None else EWMA_ALPHA * latency_ms + (1 - EWMA_ALPHA) * previous
+            self._ewma[key] = ewma
+
+            # An SLO only acts through the fallback; without one there is nothing to shift to
+            if route.slo_ms is None or route.fallback_model is None or choice.model != route.model:
+                return
+            degraded = self._degraded.get(route.key, False)
+            if not degraded and ewma > route.slo_ms:
+                self._degraded[route.key] = True
+                metrics.incr(metric_name("router", route.key, "degraded"))
+            elif degraded and ewma < route.slo_ms * RECOVERY_RATIO:
+                self._degraded[route.key] = False
+                metrics.incr(metric_name("router", route.key, "recovered"))
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            gauges = {
+                f"{metric_name('router', route_key, model)}.latency_ewma_ms": ewma
+                for (route_key, model), ewma in self._ewma.items()
+            }
+            gauges.update({
+                f"{metric_name('router', route_key)}.using_fallback": float(degraded)
+                for route_key, degraded in self._degraded.items()
+            })
+        return gauges
+
+
+def load_routes() -> List[Route]:
+    path = os.getenv("MODEL_ROUTES_FILE")
+    if path:
+        with open(path) as f:
+            return [Route(**entry) for entry in json.load(f)]
+    return [Route(**entry) for entry in DEFAULT_ROUTES]
+
+
+model_router = ModelRouter(load_routes())
+metrics.register_collector(model_router.snapshot)
+
+
+def routed_chat_completion(endpoint: str, messages: List[dict], length=None, style=None, **kwargs):
+    """`chat_completion` with the model and parameters chosen by the router."""
+    choice = model_router.select(endpoint, length, style)
+    started = time.monotonic()
+    response = chat_completion(model=choice.model, messages=messages, endpoint=endpoint,
+                               **{**choice.params, **kwargs})
+    model_router.record(choice, time.monotonic() - started)
+    return response
@@ -1,17 +1,17 @@
 import logging
 from sqlalchemy.orm import Session
+from app.core.logging_config import prompt_digest
 from app.core.models import Obituary
 from app.core.schemas import ObituaryCreate, ObituaryResponse
+from app.services.judge import judge_queue
 from app.services.prompt_builder import build_user_prompt_for_obit_from_structured_data as generate_prompt
-from openai import OpenAI
+from app.services.model_router import routed_chat_completion
+from app.services.usage import last_usage
 
-# Initialize OpenAI client
-client = OpenAI()
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = "You are a helpful obituary writer."
+
 def generate_obituary(input_data: dict, db: Session) -> ObituaryResponse:
     """Generate an obituary using GPT and store it in the database."""
 
@@ -21,20 +21,21 @@ def generate_obituary(input_data: dict, db: Session) -> ObituaryResponse:
     # Generate the obituary text using the prompt builder
     prompt = generate_prompt(obit_data)
     
-    # ✅ Log the generated prompt before sending it to OpenAI
-    logger.info(f"Generated Prompt: {prompt}")
+    logger.debug("Generated prompt %s", prompt_digest(prompt))
 
     # Call OpenAI API to generate obituary text
-    response = client.chat.completions.create(
-        model="gpt-4-turbo",
+    response = routed_chat_completion(
+        "structured",
         messages=[
-            {"role": "system", "content": "You are a helpful obituary writer."},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": prompt},
-        ]
+        ],
+        hedge=True
     )
 
     # Extract generated text from OpenAI response
     generated_text = response.choices[0].message.content.strip()
+    call = last_usage()
 
     # ✅ Store full input_data as JSON in the database
     obituary = Obituary(
@@ -42,12 +43,14 @@ def generate_obituary(input_data: dict, db: Session) -> ObituaryResponse:
         generated_text=generated_text,
         openai_score=None,
         teacher_score=None,
-        final_score=None
+        final_score=None,
+        obit_metadata={"usage": call.as_metadata()} if call else None
     )
 
     db.add(obituary)
     db.commit()
     db.refresh(obituary)
+    judge_queue.submit(obituary.id, generated_text)
 
     # ✅ Extract fields from `input_data` to match `ObituaryResponse` schema
     return ObituaryResponse(
@@ -60,5 +63,6 @@ def generate_obituary(input_data: dict, db: Session) -> ObituaryResponse:
         community_impact=input_data.get("community_impact", []),
         services=input_data.get("services", []),
         gender_pronouns=input_data.get("gender_pronouns"),
-        generated_text=generated_text
+        generated_text=generated_text,
+        created_at=obituary.created_at
     )
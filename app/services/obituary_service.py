@@ -1,13 +1,9 @@
 from sqlalchemy.orm import Session
 from app.core.models import Obituary
 from app.core.schemas import ObituaryCreate, ObituaryResponse
-import openai
-import json
-import numpy as np
-import app.core.config as config
-
-# Initialize OpenAI client
-client = openai.OpenAI(api_key=config.OPENAI_API_KEY)
+from app.services.judge import judge_queue
+from app.services.model_router import routed_chat_completion
+from app.services.usage import last_usage
 
 def generate_obituary_service(obit_data: dict, db: Session) -> ObituaryResponse:
     """Generates an obituary using OpenAI and stores it in the database."""
@@ -24,25 +20,28 @@ def generate_obituary_service(obit_data: dict, db: Session) -> ObituaryResponse:
     """
 
     # Call OpenAI's API to generate the obituary text
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
+    response = routed_chat_completion(
+        "generate_obituary",
         messages=[{"role": "system", "content": "You are an obituary writer."},
                   {"role": "user", "content": prompt}]
     )
 
     generated_text = response.choices[0].message.content.strip()
+    call = last_usage()
 
     # Store in database
     obituary = Obituary(
-        input_data=json.dumps(obit_data),
+        input_data=obit_data,
         generated_text=generated_text,
-        openai_score=np.random.uniform(70, 100),  # Placeholder for scoring logic
+        openai_score=None,  # Scored in the background by the judge
         teacher_score=None,
-        final_score=None
+        final_score=None,
+        obit_metadata={"usage": call.as_metadata()} if call else None
     )
     db.add(obituary)
     db.commit()
     db.refresh(obituary)
+    judge_queue.submit(obituary.id, generated_text)
 
     return ObituaryResponse(
         id=obituary.id,
@@ -54,5 +53,6 @@ def generate_obituary_service(obit_data: dict, db: Session) -> ObituaryResponse:
         community_impact=obit_data.get("community_impact", []),
         services=obit_data.get("services", []),
         gender_pronouns=obit_data.get("gender_pronouns"),
-        generated_text=generated_text
+        generated_text=generated_text,
+        created_at=obituary.created_at
     )
@@ -0,0 +1,331 @@
+"""
+Shared entry point for every outbound OpenAI call. Chat completions and
+embeddings go through the process-wide rate limiter, which also handles 429
+backoff, so the SDK's own retries are disabled. Transient failures (connection
+errors, timeouts, 408, 409 and 5xx) are retried here instead, with jittered
+backoff outside the limiter slot. Each operation is guarded by
+a circuit breaker that raises CircuitOpenError while the upstream is down.
+
+The `openai` package is slow to import, so it and the clients are only loaded
+on first use (or by `warm_up()` at startup). All clients share the keep-alive
+transport settings from `app.services.http_client`.
+"""
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, List, Optional, Union
+
+import app.core.config as config
+from app.core.metrics import metric_name, metrics
+from app.core.tracing import span
+from app.services.circuit_breaker import breakers
+from app.services.hedging import HEDGING_ENABLED, hedging
+from app.services.rate_limiter import Priority, limiter
+from app.services.usage import record_usage
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+MAX_RATE_LIMIT_RETRIES = 5
+# The SDK's own defaults, from before its retries were turned off
+MAX_TRANSIENT_RETRIES = 2
+TRANSIENT_BACKOFF_SECONDS = 0.5
+MAX_TRANSIENT_BACKOFF_SECONDS = 8.0
+# Assumed completion size when the caller doesn't set max_tokens
+DEFAULT_COMPLETION_TOKENS = 1000
+
+if TYPE_CHECKING:
+    import openai
+
+log = logging.getLogger(__name__)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _get_client(name: str):
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                import openai
+                from app.services import http_client
+
+                if name == "sync":
+                    client_class, transport = openai.OpenAI, http_client.get_http_client()
+                else:
+                    client_class, transport = openai.AsyncOpenAI, http_client.new_async_http_client()
+                client = _clients[name] = client_class(
+                    api_key=config.OPENAI_API_KEY,
+                    max_retries=0,
+                    # The SDK applies its own default per request unless told otherwise
+                    timeout=http_client.TIMEOUT,
+                    http_client=transport,
+                )
+    return client
+
+
+def get_client() -> "openai.OpenAI":
+    return _get_client("sync")
+
+
+def get_async_client() -> "openai.AsyncOpenAI":
+    return _get_client("async")
+
+
+def get_hedging_client() -> "openai.AsyncOpenAI":
+    """Used only on the hedging loop thread; async clients are bound to one event loop."""
+    return _get_client("hedging")
+
+
+def close_clients() -> None:
+    """Close the sync client together with the shared transport."""
+    if _clients.pop("sync", None) is not None:
+        from app.services import http_client
+
+        http_client.close_http_client()
+
+
+def short_timeout():
+    """The per-request timeout for calls that answer quickly, e.g. embeddings."""
+    from app.services import http_client
+
+    return http_client.SHORT_TIMEOUT
+
+
+def warm_up() -> None:
+    """Build the client and open its connection to the API ahead of the first request."""
+    get_client().models.list(timeout=short_timeout())
+    log.info("Warmed OpenAI client connection.")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used for budgeting."""
+    return len(text) // 4 + 1
+
+
+def estimate_chat_tokens(messages: List[dict], max_tokens: Optional[int]) -> int:
+    prompt_tokens = sum(estimate_tokens(message.get("content") or "") for message in messages)
+    return prompt_tokens + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+def estimate_embedding_tokens(input: Union[str, List[str]]) -> int:
+    texts = [input] if isinstance(input, str) else input
+    return sum(estimate_tokens(text) for text in texts)
+
+
+def retry_after_seconds(error: "openai.RateLimitError") -> Optional[float]:
+    """Read the server's requested delay from a 429, if it sent one."""
+    headers = error.response.headers if error.response is not None else {}
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+        try:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            # Unparseable; the caller falls back to its own backoff
+            return None
+        if retry_at is not None:
+            return max(retry_at.timestamp() - time.time(), 0.0)
+    return None
+
+
+def is_transient(error: BaseException) -> bool:
+    """Failures worth retrying as is: the call may well succeed a moment later."""
+    import openai
+
+    if isinstance(error, (openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in (408, 409)
+
+
+def transient_backoff(retry: int) -> float:
+    """Full-jitter exponential delay before transient retry number `retry` (from 1)."""
+    ceiling = min(TRANSIENT_BACKOFF_SECONDS * 2 ** (retry - 1), MAX_TRANSIENT_BACKOFF_SECONDS)
+    return random.uniform(0, ceiling)
+
+
+def _transient_retry(error: BaseException, model: str, retries: int) -> Optional[float]:
+    """The backoff before retrying `error`, or None if it should be raised."""
+    if retries >= MAX_TRANSIENT_RETRIES or not is_transient(error):
+        return None
+    metrics.incr(metric_name("openai", model, "transient_retries"))
+    return transient_backoff(retries + 1)
+
+
+def usage_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+def _call(create, model: str, tokens: int, priority: Priority, **kwargs):
+    import openai
+
+    rate_limits = retries = 0
+    while True:
+        delay = 0.0
+        with limiter.acquire(model, tokens, priority) as lease:
+            try:
+                response = create(model=model, **kwargs)
+            except openai.RateLimitError as e:
+                lease.rate_limited(retry_after_seconds(e))
+                rate_limits += 1
+                if rate_limits > MAX_RATE_LIMIT_RETRIES:
+                    raise
+            except Exception as e:
+                delay = _transient_retry(e, model, retries)
+                if delay is None:
+                    raise
+                retries += 1
+            else:
+                lease.settle(usage_tokens(response))
+                return response
+        # Outside the lease, so the slot isn't held while waiting
+        time.sleep(delay)
+
+
+async def _call_async(create, model: str, tokens: int, priority: Priority, **kwargs):
+    import openai
+
+    rate_limits = retries = 0
+    while True:
+        delay = 0.0
+        async with limiter.acquire_async(model, tokens, priority) as lease:
+            try:
+                response = await create(model=model, **kwargs)
+            except openai.RateLimitError as e:
+                lease.rate_limited(retry_after_seconds(e))
+                rate_limits += 1
+                if rate_limits > MAX_RATE_LIMIT_RETRIES:
+                    raise
+            except Exception as e:
+                delay = _transient_retry(e, model, retries)
+                if delay is None:
+                    raise
+                retries += 1
+            else:
+                lease.settle(usage_tokens(response))
+                return response
+        await asyncio.sleep(delay)
+
+
+def chat_completion(model: str, messages: List[dict], priority: Priority = Priority.INTERACTIVE,
+                    hedge: bool = False, endpoint: str = "other", **params):
+    """
+    Rate-limited `chat.completions.create`. With `hedge=True` and hedging
+    enabled, a slow call is raced against a duplicate. Usage is recorded
+    against `endpoint`.
+    """
+    tokens = estimate_chat_tokens(messages, params.get("max_tokens"))
+    started = time.monotonic()
+    with span("openai.chat", model=model, estimated_tokens=tokens) as current, breakers["chat"].guard():
+        if hedge and HEDGING_ENABLED:
+            response = hedging.run_sync(("chat", model), lambda: _call_async(
+                get_hedging_client().chat.completions.create, model, tokens, priority, messages=messages, **params
+            ))
+        else:
+            response = _call(get_client().chat.completions.create, model, tokens, priority,
+                             messages=messages, **params)
+        call = record_usage(endpoint, model, response.usage, time.monotonic() - started)
+        if current and call:
+            current.set(prompt_tokens=call.prompt_tokens, completion_tokens=call.completion_tokens,
+                        cached_tokens=call.cached_tokens, total_tokens=call.total_tokens)
+        return response
+
+
+def create_embedding(input: Union[str, List[str]], model: str = EMBEDDING_MODEL,
+                     priority: Priority = Priority.INTERACTIVE, hedge: bool = False,
+                     endpoint: str = "embeddings", **params):
+    """Rate-limited `embeddings.create`, optionally hedged like `chat_completion`."""
+    params.setdefault("timeout", short_timeout())
+    tokens = estimate_embedding_tokens(input)
+    started = time.monotonic()
+    with span("openai.embeddings", model=model, estimated_tokens=tokens), breakers["embeddings"].guard():
+        if hedge and HEDGING_ENABLED:
+            response = hedging.run_sync(("embeddings", model), lambda: _call_async(
+                get_hedging_client().embeddings.create, model, tokens, priority, input=input, **params
+            ))
+        else:
+            response = _call(get_client().embeddings.create, model, tokens, priority, input=input, **params)
+        record_usage(endpoint, model, response.usage, time.monotonic() - started)
+        return response
+
+
+async def chat_completion_async(model: str, messages: List[dict],
+                                priority: Priority = Priority.INTERACTIVE, endpoint: str = "other", **params):
+    tokens = estimate_chat_tokens(messages, params.get("max_tokens"))
+    started = time.monotonic()
+    with breakers["chat"].guard():
+        response = await _call_async(get_async_client().chat.completions.create, model, tokens, priority,
+                                     messages=messages, **params)
+    record_usage(endpoint, model, response.usage, time.monotonic() - started)
+    return response
+
+
+async def chat_completion_stream_async(model: str, messages: List[dict],
+                                       priority: Priority = Priority.INTERACTIVE, endpoint: str = "other",
+                                       **params):
+    """
+    Streaming `chat.completions.create`, yielding chunks as they arrive. The
+    rate-limit lease is held until the stream ends and settled with the usage
+    the API reports in the last chunk.
+    """
+    import openai
+
+    tokens = estimate_chat_tokens(messages, params.get("max_tokens"))
+    started = time.monotonic()
+    rate_limits = retries = 0
+    with breakers["chat"].guard():
+        while True:
+            delay = 0.0
+            async with limiter.acquire_async(model, tokens, priority) as lease:
+                try:
+                    stream = await get_async_client().chat.completions.create(
+                        model=model, messages=messages, stream=True,
+                        stream_options={"include_usage": True}, **params,
+                    )
+                except openai.RateLimitError as e:
+                    lease.rate_limited(retry_after_seconds(e))
+                    rate_limits += 1
+                    if rate_limits > MAX_RATE_LIMIT_RETRIES:
+                        raise
+                except Exception as e:
+                    # Only before the first chunk; a stream cut off midway isn't retried
+                    delay = _transient_retry(e, model, retries)
+                    if delay is None:
+                        raise
+                    retries += 1
+                else:
+                    usage = None
+                    async with stream:
+                        async for chunk in stream:
+                            if chunk.usage is not None:
+                                usage = chunk.usage
+                            yield chunk
+                    lease.settle(usage.total_tokens if usage is not None else None)
+                    record_usage(endpoint, model, usage, time.monotonic() - started)
+                    return
+            await asyncio.sleep(delay)
+
+
+async def create_embedding_async(input: Union[str, List[str]], model: str = EMBEDDING_MODEL,
+                                 priority: Priority = Priority.INTERACTIVE, endpoint: str = "embeddings",
+                                 **params):
+    params.setdefault("timeout", short_timeout())
+    tokens = estimate_embedding_tokens(input)
+    started = time.monotonic()
+    with breakers["embeddings"].guard():
+        response = await _call_async(get_async_client().embeddings.create, model, tokens, priority,
+                                     input=input, **params)
+    record_usage(endpoint, model, response.usage, time.monotonic() - started)
+    return response
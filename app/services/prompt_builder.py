@@ -6,9 +6,9 @@ from enum import Enum
 from pydantic import BaseModel
 from app.core.shared_request_fields import (
     prepare_additional_fields,
-    add_fields_from_config,
     build_section,
     prepare_section,
+    render_model_fields,
 )
 
 log = logging.getLogger(__name__)
@@ -394,6 +394,55 @@ LENGTH_GUIDELINES: Dict[ObituaryLength, str] = {
     ),
 }
 
+# Field tables for structured data sections, as (label, attribute) pairs
+DECEDENT_FIELDS = (
+    ("First Name", "first_name"),
+    ("Middle Name", "middle_name"),
+    ("Last Name", "last_name"),
+    ("Nickname", "nickname"),
+    ("Salutation", "salutation"),
+    ("Suffix", "suffix"),
+    ("Maiden Name", "maiden_name"),
+    ("Age", "age"),
+)
+
+DEATH_FIELDS = (
+    ("Date of Death", "date_of_death"),
+    ("City of Death", "city_of_death"),
+    ("Region of Death", "region_of_death"),
+    ("Country of Death", "country_of_death"),
+)
+
+BIRTH_FIELDS = (
+    ("Date of Birth", "date_of_birth"),
+    ("City of Birth", "city_of_birth"),
+    ("Region of Birth", "region_of_birth"),
+    ("Country of Birth", "country_of_birth"),
+)
+
+ADDITIONAL_INFORMATION_FIELDS = (
+    ("Education", "education"),
+    ("Career", "career"),
+    ("Surviving Family", "surviving_family"),
+    ("Predeceased Family", "predeceased_family"),
+    ("Hobbies", "hobbies"),
+    ("Military Service", "military_service"),
+    ("Places of Worship", "places_of_worship"),
+    ("Other Information", "other_information"),
+)
+
+SERVICE_FIELDS = (
+    ("Service Date", "service_date"),
+    ("Start Time", "service_start_time"),
+    ("End Time", "service_end_time"),
+    ("Venue Name", "venue_name"),
+    ("Venue Address", "venue_address"),
+    ("Venue City", "venue_city"),
+    ("Venue Region", "venue_region"),
+    ("Venue Postal Code", "venue_postal_code"),
+    ("Additional Notes", "service_notes"),
+)
+
 STOP_PHRASE = "[Final Output Begins Here]"
 # endregion
 
@@ -468,73 +517,31 @@ def build_user_prompt_for_obit_from_structured_data(data):
     Builds a prompt for generating an obituary based on the provided structured data.
     """
 
-    # Configurations for sections
-    decedent_fields = [
-        ("First Name", "first_name"),
-        ("Middle Name", "middle_name"),
-        ("Last Name", "last_name"),
-        ("Nickname", "nickname"),
-        ("Salutation", "salutation"),
-        ("Suffix", "suffix"),
-        ("Maiden Name", "maiden_name"),
-        ("Age", "age"),
-    ]
-
-    death_fields = [
-        ("Date of Death", "date_of_death"),
-        ("City of Death", "city_of_death"),
-        ("Region of Death", "region_of_death"),
-        ("Country of Death", "country_of_death"),
-    ]
-
-    birth_fields = [
-        ("Date of Birth", "date_of_birth"),
-        ("City of Birth", "city_of_birth"),
-        ("Region of Birth", "region_of_birth"),
-        ("Country of Birth", "country_of_birth"),
-    ]
-
-    additional_fields = [
-        ("Education", "education"),
-        ("Career", "career"),
-        ("Surviving Family", "surviving_family"),
-        ("Predeceased Family", "predeceased_family"),
-        ("Hobbies", "hobbies"),
-        ("Military Service", "military_service"),
-        ("Places of Worship", "places_of_worship"),
-        ("Other Information", "other_information"),
-    ]
-
-    service_fields = [
-        ("Service Date", "service_date"),
-        ("Start Time", "service_start_time"),
-        ("End Time", "service_end_time"),
-        ("Venue Name", "venue_name"),
-        ("Venue Address", "venue_address"),
-        ("Venue City", "venue_city"),
-        ("Venue Region", "venue_region"),
-        ("Venue Postal Code", "venue_postal_code"),
-        ("Additional Notes", "service_notes"),
-    ]
+    # Dump once; every section renders from the same values
+    values = data.model_dump(exclude_none=True)
 
     # Build sections
-    decedent_section = prepare_section("Decedent Information", decedent_fields, data)
-    death_section = prepare_section("Death Information", death_fields, data)
-    birth_section = prepare_section("Birth Information", birth_fields, data)
+    decedent_section = prepare_section(
+        "Decedent Information", DECEDENT_FIELDS, data, values
+    )
+    death_section = prepare_section("Death Information", DEATH_FIELDS, data, values)
+    birth_section = prepare_section("Birth Information", BIRTH_FIELDS, data, values)
     additional_section = prepare_section(
-        "Additional Information", additional_fields, data
+        "Additional Information", ADDITIONAL_INFORMATION_FIELDS, data, values
     )
 
     # Process service information
     service_information = []
     if data.services:
-        for service in data.services:
+        for service, service_values in zip(data.services, values["services"]):
             service_details = []
             if service.service_type:
                 formatted_type = service.service_type.value.replace("_", " ")
                 formatted_type = formatted_type.title()
                 service_details.append(f"Service Type: {formatted_type}")
-            add_fields_from_config(service_fields, service, service_details)
+            service_details.extend(
+                render_model_fields(SERVICE_FIELDS, service, service_values)
+            )
             service_information.append("\n".join(service_details))
 
     service_section = build_section(
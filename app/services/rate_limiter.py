@@ -0,0 +1,265 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+from typing import Dict, Optional, Tuple
+
+from app.core.metrics import metric_name, metrics
+
+
+class Priority(IntEnum):
+    """Lower values are served first."""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+# (requests per minute, tokens per minute) per model; override with the
+# OPENAI_RATE_LIMITS environment variable, e.g. '{"gpt-4": [500, 10000]}'
+DEFAULT_RATE_LIMITS: Dict[str, Tuple[int, int]] = {
+    "gpt-3.5-turbo": (3500, 160000),
+    "gpt-4": (500, 10000),
+    "gpt-4-turbo": (500, 30000),
+    "text-embedding-ada-002": (3000, 1000000),
+}
+FALLBACK_RATE_LIMIT = (500, 30000)
+
+MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+# Share of each bucket that background traffic may not dip into
+BACKGROUND_RESERVE = float(os.getenv("OPENAI_BACKGROUND_RESERVE", "0.1"))
+MAX_BACKOFF_SECONDS = 30.0
+POLL_SECONDS = 0.05
+
+
+class TokenBucket:
+    """Continuously refilling bucket. Not locked; callers hold the limiter lock."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, floor: float = 0.0) -> float:
+        """Seconds until `amount` can be taken while leaving `floor` behind."""
+        # Requests larger than the whole bucket go through once it is full
+        amount = min(amount, self.capacity - floor)
+        missing = amount + floor - self.level
+        return max(missing / self.rate, 0.0)
+
+    def take(self, amount: float) -> None:
+        # May go negative when actual usage exceeds the estimate
+        self.level -= amount
+
+
+class ModelBudget:
+    """Request/token buckets and an AIMD concurrency window for one model."""
+
+    def __init__(self, model: str, requests_per_minute: int, tokens_per_minute: int):
+        self.model = model
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency_limit = float(MAX_CONCURRENCY)
+        self.in_flight = 0
+        self.waiting = {priority: 0 for priority in Priority}
+        self.paused_until = 0.0
+        self.consecutive_rate_limits = 0
+        self.last_decrease = 0.0
+
+    def wait_time(self, tokens: float, priority: Priority, now: float) -> float:
+        """Seconds to wait before a call may start; 0 means go now."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if any(self.waiting[p] for p in Priority if p < priority):
+            return POLL_SECONDS
+        if self.in_flight >= int(self.concurrency_limit):
+            return POLL_SECONDS
+
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        reserve = BACKGROUND_RESERVE if priority > Priority.INTERACTIVE else 0.0
+        return max(
+            self.requests.wait_time(1, reserve * self.requests.capacity),
+            self.tokens.wait_time(tokens, reserve * self.tokens.capacity),
+        )
+
+    def on_success(self) -> None:
+        # Additive increase: roughly +1 slot per window of successful calls
+        self.consecutive_rate_limits = 0
+        self.concurrency_limit = min(
+            float(MAX_CONCURRENCY), self.concurrency_limit + 1.0 / self.concurrency_limit
+        )
+
+    def on_rate_limited(self, retry_after: Optional[float], now: float) -> None:
+        self.consecutive_rate_limits += 1
+        # Multiplicative decrease, at most once per second so a burst of 429s
+        # from calls already in flight doesn't collapse the window to 1
+        if now - self.last_decrease >= 1.0:
+            self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+            self.last_decrease = now
+        if retry_after is None:
+            backoff = min(0.5 * 2 ** self.consecutive_rate_limits, MAX_BACKOFF_SECONDS)
+            retry_after = backoff * random.uniform(0.5, 1.0)
+        self.paused_until = max(self.paused_until, now + retry_after)
+
+    def snapshot(self, now: float) -> Dict[str, float]:
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return {
+            "requests_available": self.requests.level,
+            "requests_per_minute": self.requests.capacity,
+            "tokens_available": self.tokens.level,
+            "tokens_per_minute": self.tokens.capacity,
+            "concurrency_limit": self.concurrency_limit,
+            "in_flight": self.in_flight,
+            "waiting_interactive": self.waiting[Priority.INTERACTIVE],
+            "waiting_background": self.waiting[Priority.BACKGROUND],
+            "paused_seconds": max(self.paused_until - now, 0.0),
+        }
+
+
+class Lease:
+    """A granted call slot. Settle it with the real usage once the call returns."""
+
+    def __init__(self, limiter: "RateLimiter", budget: ModelBudget, tokens: float):
+        self._limiter = limiter
+        self._budget = budget
+        self._tokens = tokens
+        self._succeeded = False
+
+    def settle(self, actual_tokens: Optional[int]) -> None:
+        """
+        Mark the call successful and correct the token bucket by the
+        difference from the estimate.
+        """
+        self._succeeded = True
+        if actual_tokens is None:
+            return
+        with self._limiter._lock:
+            self._budget.tokens.take(actual_tokens - self._tokens)
+        self._tokens = actual_tokens
+
+    def rate_limited(self, retry_after: Optional[float] = None) -> None:
+        """Report a 429 for this call; later calls back off accordingly."""
+        with self._limiter._lock:
+            self._budget.on_rate_limited(retry_after, time.monotonic())
+        metrics.incr(metric_name("openai", self._budget.model, "rate_limited"))
+
+    def _release(self) -> None:
+        with self._limiter._condition:
+            self._budget.in_flight -= 1
+            # Only a settled call widens the window; timeouts and 5xx don't
+            if self._succeeded:
+                self._budget.on_success()
+            self._limiter._condition.notify_all()
+
+
+class RateLimiter:
+    """
+    Process-wide limiter for outbound OpenAI calls. Each model has request and
+    token buckets plus an AIMD concurrency window; interactive callers are
+    always admitted ahead of waiting background work.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[int, int]]] = None):
+        self._limits = dict(limits or DEFAULT_RATE_LIMITS)
+        self._budgets: Dict[str, ModelBudget] = {}
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+
+    def _budget(self, model: str) -> ModelBudget:
+        budget = self._budgets.get(model)
+        if budget is None:
+            rpm, tpm = self._limits.get(model, FALLBACK_RATE_LIMIT)
+            budget = self._budgets[model] = ModelBudget(model, rpm, tpm)
+        return budget
+
+    def _try_reserve(self, budget: ModelBudget, tokens: float, priority: Priority) -> float:
+        """Take the slot and budget if available; otherwise return the wait. Lock held."""
+        wait = budget.wait_time(tokens, priority, time.monotonic())
+        if wait <= 0:
+            budget.requests.take(1)
+            budget.tokens.take(tokens)
+            budget.in_flight += 1
+        return wait
+
+    @contextmanager
+    def acquire(self, model: str, tokens: float, priority: Priority = Priority.INTERACTIVE):
+        """Block until a call to `model` costing about `tokens` may start."""
+        started = time.monotonic()
+        with self._condition:
+            budget = self._budget(model)
+            budget.waiting[priority] += 1
+            try:
+                while (wait := self._try_reserve(budget, tokens, priority)) > 0:
+                    self._condition.wait(timeout=wait)
+            finally:
+                budget.waiting[priority] -= 1
+                self._condition.notify_all()
+        self._record_wait(model, priority, started)
+
+        lease = Lease(self, budget, tokens)
+        try:
+            yield lease
+        finally:
+            lease._release()
+
+    @asynccontextmanager
+    async def acquire_async(self, model: str, tokens: float, priority: Priority = Priority.INTERACTIVE):
+        """Async counterpart of `acquire`; waits without blocking the event loop."""
+        started = time.monotonic()
+        with self._lock:
+            budget = self._budget(model)
+            budget.waiting[priority] += 1
+        try:
+            while True:
+                with self._lock:
+                    wait = self._try_reserve(budget, tokens, priority)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            with self._condition:
+                budget.waiting[priority] -= 1
+                self._condition.notify_all()
+        self._record_wait(model, priority, started)
+
+        lease = Lease(self, budget, tokens)
+        try:
+            yield lease
+        finally:
+            lease._release()
+
+    def _record_wait(self, model: str, priority: Priority, started: float) -> None:
+        prefix = metric_name("openai", model, priority.name.lower())
+        metrics.incr(f"{prefix}.calls")
+        metrics.incr(f"{prefix}.wait_seconds", time.monotonic() - started)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Current budget usage per model, as flat metric names."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                metric_name("openai", model, key): value
+                for model, budget in self._budgets.items()
+                for key, value in budget.snapshot(now).items()
+            }
+
+
+def load_rate_limits() -> Dict[str, Tuple[int, int]]:
+    limits = dict(DEFAULT_RATE_LIMITS)
+    overrides = os.getenv("OPENAI_RATE_LIMITS")
+    if overrides:
+        limits.update({model: tuple(values) for model, values in json.loads(overrides).items()})
+    return limits
+
+
+limiter = RateLimiter(load_rate_limits())
+metrics.register_collector(limiter.snapshot)
@@ -0,0 +1,182 @@
+"""
+Refinement of a stored obituary after a detail changes.
+
+Instead of regenerating from the original input, the model gets the current
+text and only the additional fields whose values changed, through the
+prewritten-obituary prompt. The prompt is about the size of the text itself,
+and the output is capped near the text's length, so a correction to a long
+obituary costs a fraction of generating it again.
+
+Each refinement is stored as a revision in `obituary_revisions`, and the
+obituary row takes the new text and merged fields. Its scores are cleared and
+it is queued for the judge; its embedding is picked up by the backfill.
+"""
+import time
+from typing import Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.metrics import metric_name, metrics
+from app.core.models import Obituary, ObituaryRevision
+from app.core.prewritten_obituary_request import PrewrittenObituaryRequest
+from app.services.judge import judge_queue
+from app.services.model_router import model_router
+from app.services.openai_client import chat_completion_stream_async, estimate_tokens
+from app.services.prompt_builder import (
+    SYSTEM_GUIDELINES_PREWRITTEN_OBITUARY,
+    AdditionalFields,
+    build_user_prompt_for_obit_from_prewritten_obituary,
+)
+from app.services.usage import last_usage
+
+# A correction shouldn't change the length much; output is capped at this
+# multiple of the current text's tokens
+MAX_GROWTH = 1.25
+MIN_COMPLETION_TOKENS = 200
+# Ends a streamed refinement that couldn't be stored; the status is already sent by then
+STREAM_ERROR_MARKER = "[refinement not stored]"
+
+
+class RefinementIncomplete(Exception):
+    """The model didn't finish the text (cut off, filtered or empty), so nothing was stored."""
+
+    def __init__(self, finish_reason: Optional[str]):
+        self.finish_reason = finish_reason
+        ending = "returned no text" if finish_reason == "stop" else f"stopped with finish_reason={finish_reason!r}"
+        super().__init__(f"The model {ending}; nothing was stored.")
+
+
+def load_obituary(db: Session, obituary_id: int):
+    query = select(
+        Obituary.id,
+        Obituary.generated_text,
+        Obituary.input_data,
+        Obituary.obituary_style,
+        Obituary.obituary_length,
+    ).where(Obituary.id == obituary_id)
+    return db.execute(query).mappings().first()
+
+
+def changed_fields(input_data: dict, requested: AdditionalFields) -> Dict:
+    """The requested additional fields whose values differ from the stored ones."""
+    stored = input_data.get("additional_fields") or {}
+    return {
+        name: value
+        for name, value in requested.model_dump(mode="json", exclude_unset=True).items()
+        if stored.get(name) != value
+    }
+
+
+def refine_messages(generated_text: str, changed: Dict):
+    data = PrewrittenObituaryRequest(
+        prewritten_obituary=generated_text,
+        additional_fields=AdditionalFields(**changed),
+    )
+    return [
+        {"role": "system", "content": SYSTEM_GUIDELINES_PREWRITTEN_OBITUARY},
+        {"role": "user", "content": build_user_prompt_for_obit_from_prewritten_obituary(data)},
+    ]
+
+
+def store_revision(db: Session, obituary_id: int, generated_text: str, changed: Dict, metadata: Dict) -> int:
+    """Record a revision and make it the obituary's text; returns its number."""
+    # Locked so concurrent refinements number their revisions in turn
+    obituary = db.query(Obituary).filter(Obituary.id == obituary_id).with_for_update().one()
+    latest = db.execute(
+        select(func.max(ObituaryRevision.revision)).where(ObituaryRevision.obituary_id == obituary_id)
+    ).scalar()
+    if latest is None:
+        db.add(ObituaryRevision(obituary_id=obituary_id, revision=0,
+                                generated_text=obituary.generated_text, changed_fields={}))
+        latest = 0
+    revision = latest + 1
+    db.add(ObituaryRevision(obituary_id=obituary_id, revision=revision, generated_text=generated_text,
+                            changed_fields=changed, obit_metadata=metadata))
+
+    input_data = dict(obituary.input_data)
+    input_data["additional_fields"] = {**(input_data.get("additional_fields") or {}), **changed}
+    obituary.input_data = input_data
+    obituary.generated_text = generated_text
+    obituary.openai_score = obituary.teacher_score = obituary.final_score = None
+    db.commit()
+
+    judge_queue.submit(obituary_id, generated_text)
+    return revision
+
+
+class Refinement:
+    """
+    One refinement call. `chunks()` streams the new text and, once the model
+    finishes, stores the revision and sets `revision` and `text`. Only a
+    non-empty text the model ended with "stop" is stored; anything else
+    raises RefinementIncomplete after the last chunk.
+    """
+
+    def __init__(self, obituary, changed: Dict):
+        self.obituary = obituary
+        self.changed = changed
+        self.revision: Optional[int] = None
+        self.text: Optional[str] = None
+
+    async def chunks(self):
+        from app.core.database import SessionLocal, get_engine
+
+        obituary = self.obituary
+        choice = model_router.select("refine", obituary["obituary_length"], obituary["obituary_style"])
+        max_tokens = max(int(estimate_tokens(obituary["generated_text"]) * MAX_GROWTH), MIN_COMPLETION_TOKENS)
+        params = {**choice.params, "max_tokens": max_tokens}
+
+        started = time.monotonic()
+        parts, model, finish_reason = [], choice.model, None
+        # If the client disconnects, the stream is cancelled here and nothing is stored
+        async for chunk in chat_completion_stream_async(
+            choice.model, refine_messages(obituary["generated_text"], self.changed), endpoint="refine", **params
+        ):
+            model = chunk.model or model
+            if chunk.choices and chunk.choices[0].finish_reason:
+                finish_reason = chunk.choices[0].finish_reason
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        elapsed = time.monotonic() - started
+        model_router.record(choice, elapsed)
+
+        self.text = "".join(parts).strip()
+        # A text cut off at max_tokens or by the content filter must not
+        # replace the stored one
+        if finish_reason != "stop" or not self.text:
+            metrics.incr(metric_name("refine", "incomplete"))
+            raise RefinementIncomplete(finish_reason)
+        call = last_usage()
+        metadata = {"source": "refine", "model": model, "latency_ms": round(elapsed * 1000),
+                    "usage": call.as_metadata() if call else None}
+
+        def store():
+            get_engine()
+            db = SessionLocal()
+            try:
+                return store_revision(db, obituary["id"], self.text, self.changed, metadata)
+            finally:
+                db.close()
+
+        self.revision = await run_in_threadpool(store)
+        metrics.incr(metric_name("refine", "revisions"))
+
+    async def stream(self):
+        """`chunks()` for a streaming response, ending with STREAM_ERROR_MARKER if nothing was stored."""
+        try:
+            async for chunk in self.chunks():
+                yield chunk
+        except RefinementIncomplete as e:
+            yield f"\n\n{STREAM_ERROR_MARKER} {e}\n"
+
+
+def list_revisions(db: Session, obituary_id: int):
+    query = (
+        select(ObituaryRevision)
+        .where(ObituaryRevision.obituary_id == obituary_id)
+        .order_by(ObituaryRevision.revision)
+    )
+    return db.execute(query).scalars().all()
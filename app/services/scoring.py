@@ -1,14 +1,24 @@
 from sqlalchemy.orm import Session
 from app.core.models import Obituary
+from app.services.judge import judge_batch, write_scores
+from app.services.rate_limiter import Priority
 
 def evaluate_obituary(obituary_id: int, db: Session):
     obituary = db.query(Obituary).filter(Obituary.id == obituary_id).first()
     if not obituary:
         return {"error": "Obituary not found"}
 
-    # Placeholder for obituary evaluation logic
-    score = 85.0  # Example score (replace with real ML logic)
-    obituary.final_score = score
-    db.commit()
+    # Scores this one now instead of waiting for the background queue
+    scores = judge_batch([(obituary.id, obituary.generated_text)], priority=Priority.INTERACTIVE)
+    if obituary.id not in scores:
+        return {"error": "Obituary could not be scored", "obituary_id": obituary_id}
+    write_scores(db, scores)
+    db.refresh(obituary)
 
-    return {"message": "Obituary evaluated", "score": score, "obituary_id": obituary_id}
+    return {
+        "message": "Obituary evaluated",
+        "score": obituary.final_score,
+        "openai_score": obituary.openai_score,
+        "teacher_score": obituary.teacher_score,
+        "obituary_id": obituary_id,
+    }
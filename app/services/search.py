@@ -0,0 +1,189 @@
+"""
+Filtered listing and search over obituaries. Filters become SQL conditions
+on the columns extracted from input_data, the score columns and created_at,
+so Postgres narrows the rows (and partitions) instead of the API loading the
+table.
+
+For vector search the filters are pre-filters on the HNSW scan. pgvector's
+iterative index scans (0.8+) keep scanning the index until `limit` rows pass
+the filters, instead of returning however few of the first ef_search
+candidates happened to match.
+"""
+import os
+from typing import List
+
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import and_, cast, func, select, text
+from sqlalchemy.orm import Session
+
+from app.core.models import Obituary, ObituaryEmbedding
+from app.core.schemas import ObituaryFilters
+from app.services.embeddings import is_default, resolve_dims
+from app.services.openai_client import EMBEDDING_MODEL
+
+# "strict_order", "relaxed_order", or "off" for pgvector before 0.8
+ITERATIVE_SCAN = os.getenv("HNSW_ITERATIVE_SCAN", "strict_order")
+if ITERATIVE_SCAN not in ("strict_order", "relaxed_order", "off"):
+    raise ValueError(f"Invalid HNSW_ITERATIVE_SCAN: {ITERATIVE_SCAN}")
+# pgvector's default; raised per query when more results are asked for
+DEFAULT_EF_SEARCH = 40
+
+RESULT_COLUMNS = (
+    Obituary.id,
+    Obituary.created_at,
+    Obituary.input_data,
+    Obituary.name,
+    Obituary.birth_year,
+    Obituary.death_year,
+    Obituary.generated_text,
+    Obituary.openai_score,
+    Obituary.teacher_score,
+    Obituary.final_score,
+)
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def filter_conditions(filters: ObituaryFilters) -> List:
+    conditions = []
+    if filters.name_prefix:
+        # Matches the lower(name) text_pattern_ops index
+        conditions.append(func.lower(Obituary.name).like(escape_like(filters.name_prefix.lower()) + "%"))
+    if filters.death_year_min is not None:
+        conditions.append(Obituary.death_year >= filters.death_year_min)
+    if filters.death_year_max is not None:
+        conditions.append(Obituary.death_year <= filters.death_year_max)
+    if filters.obituary_style is not None:
+        conditions.append(Obituary.obituary_style == filters.obituary_style.value)
+    if filters.obituary_length is not None:
+        conditions.append(Obituary.obituary_length == filters.obituary_length.value)
+    if filters.min_openai_score is not None:
+        conditions.append(Obituary.openai_score >= filters.min_openai_score)
+    if filters.min_teacher_score is not None:
+        conditions.append(Obituary.teacher_score >= filters.min_teacher_score)
+    if filters.min_final_score is not None:
+        conditions.append(Obituary.final_score >= filters.min_final_score)
+    # Bounds on the partition key, so only the matching months are scanned
+    if filters.created_after is not None:
+        conditions.append(Obituary.created_at >= filters.created_after)
+    if filters.created_before is not None:
+        conditions.append(Obituary.created_at < filters.created_before)
+    if filters.exclude_duplicates:
+        # Set by scripts/find_duplicate_obituaries.py
+        conditions.append(Obituary.obit_metadata["duplicate_of"].as_string().is_(None))
+    return conditions
+
+
+def search_settings(limit: int, filtered: bool) -> List[str]:
+    """SET LOCAL statements to run in the search's transaction before the query."""
+    statements = []
+    if limit > DEFAULT_EF_SEARCH:
+        statements.append(f"SET LOCAL hnsw.ef_search = {int(limit)}")
+    if filtered and ITERATIVE_SCAN != "off":
+        statements.append(f"SET LOCAL hnsw.iterative_scan = {ITERATIVE_SCAN}")
+    return statements
+
+
+def vector_search_query(embedding, filters: ObituaryFilters, limit: int = 2,
+                        model: str = EMBEDDING_MODEL, dims=None, exclude_id=None):
+    """(settings, query) for the `limit` nearest obituaries that pass `filters`."""
+    dims = resolve_dims(model, dims)
+    conditions = filter_conditions(filters)
+    if exclude_id is not None:
+        conditions.append(Obituary.id != exclude_id)
+    filtered = bool(conditions)
+
+    if is_default(model, dims):
+        # Rows not embedded yet would come back with a NULL distance. The
+        # HNSW index skips NULLs already, so this doesn't count as a filter
+        conditions.append(Obituary.embedding.is_not(None))
+        distance = Obituary.embedding.cosine_distance(embedding).label("distance")
+        query = select(*RESULT_COLUMNS, distance)
+    else:
+        # Cast to a fixed size so a per-model partial HNSW index can serve it
+        stored = cast(ObituaryEmbedding.embedding, Vector(dims))
+        distance = stored.cosine_distance(embedding).label("distance")
+        query = select(*RESULT_COLUMNS, distance).join(ObituaryEmbedding, and_(
+            ObituaryEmbedding.obituary_id == Obituary.id,
+            ObituaryEmbedding.model == model,
+            ObituaryEmbedding.dims == dims,
+        ))
+    query = query.where(*conditions).order_by(distance).limit(limit)
+    return search_settings(limit, filtered), query
+
+
+def by_distance(rows):
+    # relaxed_order may return rows slightly out of order
+    return sorted(rows, key=lambda row: row["distance"])
+
+
+def source_embedding_query(obituary_id: int):
+    return select(Obituary.embedding).where(Obituary.id == obituary_id)
+
+
+def vector_search(db: Session, embedding, filters: ObituaryFilters, limit: int = 2,
+                  model: str = EMBEDDING_MODEL, dims=None, exclude_id=None):
+    """
+    The `limit` nearest obituaries by cosine distance that pass `filters`.
+    Embeddings from models other than the default are read from
+    `obituary_embeddings`.
+    """
+    settings, query = vector_search_query(embedding, filters, limit, model, dims, exclude_id)
+    # SET LOCAL lasts until the request's transaction ends
+    for statement in settings:
+        db.execute(text(statement))
+    return by_distance(db.execute(query).mappings().all())
+
+
+def similar_obituaries(db: Session, obituary_id: int, filters: ObituaryFilters, limit: int = 10):
+    """
+    The obituaries nearest to `obituary_id`'s own embedding, or None when it
+    doesn't exist or has no embedding yet.
+    """
+    embedding = db.execute(source_embedding_query(obituary_id)).scalar()
+    if embedding is None:
+        return None
+    return vector_search(db, embedding, filters, limit, exclude_id=obituary_id)
+
+
+def text_search(db: Session, query_text: str, filters: ObituaryFilters, limit: int = 2):
+    """Full-text fallback for search that needs no embedding call."""
+    # Served by ix_obituaries_text_search, which indexes this exact expression
+    document = func.to_tsvector("english", Obituary.generated_text)
+    tsquery = func.plainto_tsquery("english", query_text)
+    query = (
+        select(*RESULT_COLUMNS)
+        .where(document.op("@@")(tsquery), *filter_conditions(filters))
+        .order_by(func.ts_rank(document, tsquery).desc())
+        .limit(limit)
+    )
+    return db.execute(query).mappings().all()
+
+
+def top_obituaries(db: Session, filters: ObituaryFilters, limit: int = 20):
+    """
+    The best scored obituaries matching `filters`, by final_score. Walks the
+    partial (style, final_score DESC) indexes and stops after `limit` rows,
+    so the cost doesn't grow with the table. Other filters are checked
+    against the rows the index yields.
+    """
+    query = (
+        select(*RESULT_COLUMNS)
+        .where(Obituary.final_score.isnot(None), *filter_conditions(filters))
+        .order_by(Obituary.final_score.desc(), Obituary.id.desc())
+        .limit(limit)
+    )
+    return db.execute(query).mappings().all()
+
+
+def list_obituaries(db: Session, filters: ObituaryFilters, limit=None, offset: int = 0):
+    query = (
+        select(*RESULT_COLUMNS)
+        .where(*filter_conditions(filters))
+        .order_by(Obituary.id)
+        .offset(offset)
+        .limit(limit)
+    )
+    return db.execute(query).mappings().all()
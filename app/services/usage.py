@@ -0,0 +1,195 @@
+"""
+Token and cost accounting for upstream OpenAI calls.
+
+Every chat and embedding call made through `app.services.openai_client` is
+recorded with the endpoint that made it (the model router's endpoint names,
+"embeddings", "search", ...): prompt, completion and cached prompt tokens,
+latency and model. Totals are counters under `usage.<endpoint>.<model>` on
+`GET /metrics`. Gauges report, over the last USAGE_WINDOW_SECONDS, the
+throughput in tokens per second, the generation speed in completion tokens
+per second of call time, and each endpoint's estimated spend.
+
+Spend is estimated from MODEL_PRICES (USD per million tokens), which
+USAGE_PRICES can extend or override with JSON, e.g.
+'{"gpt-4o": [2.5, 1.25, 10]}' for input, cached input and output. When an
+endpoint's spend over the window crosses its budget in USAGE_BUDGETS, e.g.
+"scratchpad=5,judge=2", a warning is logged and `usage.<endpoint>.budget_alerts`
+is counted. It fires again only after the spend has dropped back under the
+budget.
+
+`last_usage()` returns the latest call made in the current request or task,
+for storing in the `obit_metadata` of the row it produced.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, Dict, NamedTuple, Optional, Tuple
+
+from app.core.metrics import metric_name, metrics
+
+USAGE_WINDOW_SECONDS = float(os.getenv("USAGE_WINDOW_SECONDS", "3600"))
+
+# USD per million tokens: input, cached input, output. Matched on the longest
+# prefix, so dated snapshots ("gpt-4o-2024-08-06") price as their family
+MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50),
+    "gpt-4": (30.00, 30.00, 60.00),
+    "gpt-4-turbo": (10.00, 10.00, 30.00),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "text-embedding-ada-002": (0.10, 0.10, 0.0),
+    "text-embedding-3-small": (0.02, 0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.13, 0.0),
+}
+MODEL_PRICES.update({model: tuple(price) for model, price in json.loads(os.getenv("USAGE_PRICES", "{}")).items()})
+
+
+def parse_budgets(value: str) -> Dict[str, float]:
+    budgets = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        endpoint, _, budget = item.partition("=")
+        budgets[endpoint.strip()] = float(budget)
+    return budgets
+
+
+USAGE_BUDGETS = parse_budgets(os.getenv("USAGE_BUDGETS", ""))
+
+log = logging.getLogger(__name__)
+
+
+def price_for(model: str) -> Optional[Tuple[float, float, float]]:
+    matches = [name for name in MODEL_PRICES if model == name or model.startswith(name + "-")]
+    return MODEL_PRICES[max(matches, key=len)] if matches else None
+
+
+class CallUsage(NamedTuple):
+    endpoint: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    latency_ms: float
+    # None for models without a price
+    cost_usd: Optional[float]
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def as_metadata(self) -> dict:
+        return {
+            "endpoint": self.endpoint,
+            "model": self.model,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "latency_ms": round(self.latency_ms),
+            "cost_usd": self.cost_usd,
+        }
+
+
+def call_usage(endpoint: str, model: str, usage, seconds: float) -> CallUsage:
+    """A CallUsage from a response's `usage`; chat and embedding usage both fit."""
+    prompt = getattr(usage, "prompt_tokens", None) or 0
+    completion = getattr(usage, "completion_tokens", None) or 0
+    cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None) or 0
+    price = price_for(model)
+    cost = None
+    if price is not None:
+        input_price, cached_price, output_price = price
+        cost = ((prompt - cached) * input_price + cached * cached_price + completion * output_price) / 1_000_000
+    return CallUsage(endpoint, model, prompt, completion, cached, seconds * 1000, cost)
+
+
+_last_usage: ContextVar[Optional[CallUsage]] = ContextVar("last_usage", default=None)
+
+
+def last_usage() -> Optional[CallUsage]:
+    return _last_usage.get()
+
+
+class UsageTracker:
+    """Usage counters, plus a rolling window of calls per endpoint for the gauges and budgets."""
+
+    def __init__(self, window_seconds: float = USAGE_WINDOW_SECONDS, budgets: Optional[Dict[str, float]] = None):
+        self.window_seconds = window_seconds
+        self.budgets = USAGE_BUDGETS if budgets is None else budgets
+        self._lock = threading.Lock()
+        # Per endpoint: (time, call) in arrival order
+        self._calls: Dict[str, Deque[Tuple[float, CallUsage]]] = {}
+        self._spend: Dict[str, float] = {}
+        self._over_budget: Dict[str, bool] = {}
+
+    def _prune(self, endpoint: str, now: float) -> None:
+        calls = self._calls[endpoint]
+        while calls and calls[0][0] < now - self.window_seconds:
+            _, call = calls.popleft()
+            self._spend[endpoint] -= call.cost_usd or 0.0
+        if not calls:
+            # Resets float drift from the running sum
+            self._spend[endpoint] = 0.0
+
+    def record(self, call: CallUsage) -> None:
+        _last_usage.set(call)
+        prefix = ("usage", call.endpoint, call.model)
+        metrics.incr(metric_name(*prefix, "calls"))
+        metrics.incr(metric_name(*prefix, "prompt_tokens"), call.prompt_tokens)
+        metrics.incr(metric_name(*prefix, "completion_tokens"), call.completion_tokens)
+        metrics.incr(metric_name(*prefix, "cached_tokens"), call.cached_tokens)
+        metrics.incr(metric_name(*prefix, "latency_ms"), call.latency_ms)
+        if call.cost_usd is not None:
+            metrics.incr(metric_name(*prefix, "cost_usd"), call.cost_usd)
+        else:
+            metrics.incr(metric_name("usage", "unpriced_calls"))
+
+        now = time.monotonic()
+        with self._lock:
+            self._calls.setdefault(call.endpoint, deque()).append((now, call))
+            self._spend[call.endpoint] = self._spend.get(call.endpoint, 0.0) + (call.cost_usd or 0.0)
+            self._prune(call.endpoint, now)
+            spend = self._spend[call.endpoint]
+            budget = self.budgets.get(call.endpoint)
+            over = budget is not None and spend >= budget
+            alert = over and not self._over_budget.get(call.endpoint, False)
+            self._over_budget[call.endpoint] = over
+        if alert:
+            metrics.incr(metric_name("usage", call.endpoint, "budget_alerts"))
+            log.warning(f"Spend on {call.endpoint} reached ${spend:.2f} in the last "
+                        f"{self.window_seconds:.0f}s, over its ${budget:.2f} budget")
+
+    def snapshot(self) -> Dict[str, float]:
+        now = time.monotonic()
+        gauges = {}
+        with self._lock:
+            for endpoint in list(self._calls):
+                self._prune(endpoint, now)
+                gauges[metric_name("usage", endpoint, "window_spend_usd")] = self._spend[endpoint]
+                per_model: Dict[str, Tuple[int, int, float]] = {}
+                for _, call in self._calls[endpoint]:
+                    tokens, completion, seconds = per_model.get(call.model, (0, 0, 0.0))
+                    per_model[call.model] = (tokens + call.total_tokens, completion + call.completion_tokens,
+                                             seconds + call.latency_ms / 1000)
+                for model, (tokens, completion, seconds) in per_model.items():
+                    gauges[metric_name("usage", endpoint, model, "tokens_per_second")] = tokens / self.window_seconds
+                    if completion and seconds:
+                        gauges[metric_name("usage", endpoint, model, "completion_tokens_per_second")] = (
+                            completion / seconds
+                        )
+        return gauges
+
+
+usage_tracker = UsageTracker()
+metrics.register_collector(usage_tracker.snapshot)
+
+
+def record_usage(endpoint: str, model: str, usage, seconds: float) -> Optional[CallUsage]:
+    """Record one upstream call; responses without usage are skipped."""
+    if usage is None:
+        return None
+    call = call_usage(endpoint, model, usage, seconds)
+    usage_tracker.record(call)
+    return call
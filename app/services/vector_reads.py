@@ -0,0 +1,64 @@
+"""
+Search, similar-to and export over the asyncpg pool, where vectors travel in
+pgvector's binary format (see app.core.async_database). The queries are the
+same SQLAlchemy statements the sync path in app.services.search runs,
+compiled for asyncpg's $n placeholders, so filters and ordering can't drift
+between the two.
+"""
+from typing import AsyncIterator, List, Tuple
+
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
+
+from app.core.async_database import get_async_pool
+from app.core.schemas import ObituaryFilters
+from app.services.export import EXPORT_BATCH_ROWS, export_query, ndjson_chunk
+from app.services.openai_client import EMBEDDING_MODEL
+from app.services.search import by_distance, source_embedding_query, vector_search_query
+
+_dialect = asyncpg_dialect()
+
+
+def compile_query(query) -> Tuple[str, List]:
+    """SQL and positional arguments for asyncpg. Values are left unprocessed for its codecs."""
+    compiled = query.compile(dialect=_dialect)
+    return compiled.string, [compiled.params[name] for name in compiled.positiontup]
+
+
+async def vector_search(embedding, filters: ObituaryFilters, limit: int = 2,
+                        model: str = EMBEDDING_MODEL, dims=None, exclude_id=None):
+    """Like `search.vector_search`, with the query vector sent as binary."""
+    settings, query = vector_search_query(embedding, filters, limit, model, dims, exclude_id)
+    sql, args = compile_query(query)
+    pool = await get_async_pool()
+    async with pool.acquire() as connection:
+        async with connection.transaction(readonly=True):
+            for statement in settings:
+                await connection.execute(statement)
+            rows = await connection.fetch(sql, *args)
+    return by_distance(rows)
+
+
+async def similar_obituaries(obituary_id: int, filters: ObituaryFilters, limit: int = 10):
+    """Like `search.similar_obituaries`; the stored embedding is read and sent back as binary."""
+    sql, args = compile_query(source_embedding_query(obituary_id))
+    pool = await get_async_pool()
+    embedding = await pool.fetchval(sql, *args)
+    if embedding is None:
+        return None
+    return await vector_search(embedding, filters, limit, exclude_id=obituary_id)
+
+
+async def export_ndjson(filters: ObituaryFilters, include_embeddings: bool = False,
+                        batch_rows: int = EXPORT_BATCH_ROWS) -> AsyncIterator[bytes]:
+    """Like `export.export_ndjson`, fetching `batch_rows` at a time from a server-side cursor."""
+    sql, args = compile_query(export_query(filters, include_embeddings))
+    pool = await get_async_pool()
+    async with pool.acquire() as connection:
+        # Cursors only live inside a transaction
+        async with connection.transaction(readonly=True):
+            cursor = await connection.cursor(sql, *args)
+            while True:
+                rows = await cursor.fetch(batch_rows)
+                if not rows:
+                    break
+                yield ndjson_chunk(rows, include_embeddings)
@@ -1,15 +1,74 @@
 import sys
 import os
+import math
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 import uvicorn
-from fastapi import FastAPI
-from app.api import endpoints, embeddings, scoring
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.api import admin, endpoints, embeddings, scoring, metrics
+from app.core.async_database import ASYNCPG_READS, close_async_pool, get_async_pool
+from app.core.database import dispose_engine, ensure_partitions, warm_pool
+from app.core.logging_config import configure_logging, shutdown_logging
+from app.core.tracing import TracingMiddleware, exporter as trace_exporter
+from app.services import openai_client
+from app.services.judge import judge_queue
+from app.services.circuit_breaker import CircuitOpenError
 
-app = FastAPI()
+log = logging.getLogger(__name__)
+
+STARTUP_WARM_UP = os.getenv("STARTUP_WARM_UP", "1").lower() in ("1", "true", "yes")
+
+async def warm_up():
+    """
+    Pre-open database connections (sync and asyncpg) and the OpenAI TLS
+    session, and create upcoming obituary partitions, in parallel.
+    """
+    steps = [
+        asyncio.to_thread(warm_pool),
+        asyncio.to_thread(ensure_partitions),
+        asyncio.to_thread(openai_client.warm_up),
+    ]
+    if ASYNCPG_READS:
+        steps.append(get_async_pool())
+    results = await asyncio.gather(*steps, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            log.warning(f"Startup warm-up step failed: {result}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    if STARTUP_WARM_UP:
+        await warm_up()
+    yield
+    # Scores what is queued while the clients and pool are still open
+    await asyncio.to_thread(judge_queue.shutdown)
+    openai_client.close_clients()
+    await close_async_pool()
+    dispose_engine()
+    trace_exporter.shutdown()
+    shutdown_logging()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(TracingMiddleware)
+
+@app.exception_handler(CircuitOpenError)
+def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    """Upstream outages fail fast with a retryable status."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
 
 # Include API routers
 app.include_router(endpoints.router)
 app.include_router(embeddings.router)
 app.include_router(scoring.router)
+app.include_router(metrics.router)
+app.include_router(admin.router)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,268 @@
+"""
+Generate obituaries in bulk through a batch backend instead of interactive calls.
+
+Each run lives in a work directory and goes through three steps:
+
+    prepare  write requests.jsonl, in the OpenAI Batch API format, from new
+             inputs (--inputs) or from existing obituaries to regenerate
+             (--regenerate)
+    submit   hand the file to a backend: "openai" (the Batch API) or
+             "local" (a worker pool in this process)
+    collect  poll until the batch finishes, then write every result with one
+             COPY into a staging table and a merge into `obituaries`
+
+    python -m scripts.batch_generate prepare batches/restyle --regenerate --style poetic
+    python -m scripts.batch_generate submit batches/restyle --backend openai
+    python -m scripts.batch_generate collect batches/restyle --poll-seconds 300
+
+`run` does all three in one go. New inputs are inserted as new rows.
+Regenerated obituaries get the new text, and their scores are cleared
+because they described the old text. Embeddings of changed text are then
+stale and are picked up by `scripts.generate_embeddings`.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+
+from pydantic import ValidationError
+from sqlalchemy import select
+
+from app.core.database import engine
+from app.core.models import Obituary
+from app.core.schemas import ObituaryFilters
+from app.services.batch import (
+    BatchBackend,
+    completion_text,
+    generation_request,
+    get_backend,
+    obituary_input,
+    poll,
+    read_jsonl,
+    write_jsonl,
+)
+from app.services.search import filter_conditions
+
+REQUESTS_FILE = "requests.jsonl"
+# custom_id -> the obituary to update, or the input to insert
+MANIFEST_FILE = "manifest.jsonl"
+STATE_FILE = "batch.json"
+OUTPUT_FILE = "output.jsonl"
+
+STAGING_DDL = """
+CREATE TEMP TABLE batch_results (
+    obituary_id integer,
+    input_data jsonb,
+    generated_text text NOT NULL,
+    obit_metadata jsonb NOT NULL
+) ON COMMIT DROP
+"""
+
+# csv.writer writes None and '' alike as an empty field, which COPY reads as
+# NULL; generated_text is never NULL, so it is always read as a string
+COPY_SQL = ("COPY batch_results (obituary_id, input_data, generated_text, obit_metadata) "
+            "FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (generated_text))")
+
+UPDATE_SQL = """
+UPDATE obituaries AS o
+SET generated_text = r.generated_text,
+    openai_score = NULL,
+    teacher_score = NULL,
+    final_score = NULL,
+    obit_metadata = (COALESCE(o.obit_metadata::jsonb, '{}'::jsonb) || r.obit_metadata)::json
+FROM batch_results AS r
+WHERE r.obituary_id IS NOT NULL AND o.id = r.obituary_id
+"""
+
+INSERT_SQL = """
+INSERT INTO obituaries (input_data, generated_text, obit_metadata)
+SELECT input_data, generated_text, obit_metadata::json
+FROM batch_results
+WHERE obituary_id IS NULL
+"""
+
+
+def read_state(work_dir):
+    path = os.path.join(work_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_state(work_dir, state):
+    with open(os.path.join(work_dir, STATE_FILE), "w") as f:
+        json.dump(state, f, indent=2)
+
+
+def input_records(path):
+    """(custom_id, obituary_id, input_data) for each line of an inputs file; new rows have no id."""
+    for number, record in enumerate(read_jsonl(path), start=1):
+        yield f"input-{number}", None, record.get("input_data", record)
+
+
+def regenerate_records(filters, ids=None, limit=None, batch_rows=1000):
+    """(custom_id, obituary_id, input_data) for stored obituaries matching `filters`."""
+    query = select(Obituary.id, Obituary.input_data).where(*filter_conditions(filters)).order_by(Obituary.id)
+    if ids:
+        query = query.where(Obituary.id.in_(ids))
+    if limit:
+        query = query.limit(limit)
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=batch_rows).execute(query)
+        for obituary_id, input_data in result:
+            yield f"obituary-{obituary_id}", obituary_id, input_data
+
+
+def prepare(work_dir, records):
+    os.makedirs(work_dir, exist_ok=True)
+    if read_state(work_dir).get("batch_id"):
+        sys.exit(f"{work_dir} already holds a submitted batch; use a new directory.")
+
+    requests, manifest, rejected = [], [], 0
+    for custom_id, obituary_id, input_data in records:
+        try:
+            data = obituary_input(input_data)
+        except (ValidationError, TypeError) as e:
+            rejected += 1
+            print(f"Skipping {custom_id}: {e}", file=sys.stderr)
+            continue
+        requests.append(generation_request(custom_id, data))
+        # New rows store the validated input, as the endpoints do
+        manifest.append({"custom_id": custom_id, "obituary_id": obituary_id,
+                         "input_data": data.model_dump(mode="json") if obituary_id is None else None})
+
+    write_jsonl(os.path.join(work_dir, REQUESTS_FILE), requests)
+    write_jsonl(os.path.join(work_dir, MANIFEST_FILE), manifest)
+    write_state(work_dir, {"requests": len(requests)})
+    print(f"Prepared {len(requests):,} requests in {work_dir} ({rejected:,} rejected).")
+
+
+def submit(work_dir, backend: BatchBackend):
+    state = read_state(work_dir)
+    if state.get("batch_id"):
+        sys.exit(f"Already submitted as {state['batch_id']}.")
+    if not state.get("requests"):
+        sys.exit("Nothing to submit; run prepare first.")
+    batch_id = backend.submit(os.path.join(work_dir, REQUESTS_FILE))
+    write_state(work_dir, {**state, "backend": backend.name, "batch_id": batch_id})
+    print(f"Submitted {state['requests']:,} requests as {batch_id}.")
+
+
+def copy_rows(cursor, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(COPY_SQL, buffer)
+
+
+def write_results(work_dir, batch_id):
+    """COPY successful results into staging and merge them in one transaction; returns (updated, inserted, failed)."""
+    manifest = {entry["custom_id"]: entry for entry in read_jsonl(os.path.join(work_dir, MANIFEST_FILE))}
+    rows, failed = [], 0
+    for line in read_jsonl(os.path.join(work_dir, OUTPUT_FILE)):
+        entry = manifest.get(line["custom_id"])
+        result = completion_text(line)
+        if entry is None or result is None:
+            failed += 1
+            continue
+        text, model = result
+        metadata = {"source": "batch", "batch_id": batch_id, "batch_custom_id": line["custom_id"], "model": model}
+        rows.append((
+            entry["obituary_id"],
+            json.dumps(entry["input_data"]) if entry["obituary_id"] is None else None,
+            text,
+            json.dumps(metadata),
+        ))
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(STAGING_DDL)
+        copy_rows(cursor, rows)
+        cursor.execute(UPDATE_SQL)
+        updated = cursor.rowcount
+        cursor.execute(INSERT_SQL)
+        inserted = cursor.rowcount
+        connection.commit()
+    finally:
+        connection.close()
+    return updated, inserted, failed
+
+
+def collect(work_dir, backend: BatchBackend, poll_seconds=60, timeout=None):
+    state = read_state(work_dir)
+    batch_id = state.get("batch_id")
+    if not batch_id:
+        sys.exit("No batch submitted from this directory.")
+    if state.get("written"):
+        sys.exit(f"Results of {batch_id} were already written.")
+
+    def report(status):
+        print(f"\r{status.status}: {status.completed:,} completed, {status.failed:,} failed "
+              f"of {status.total:,}", end="", file=sys.stderr, flush=True)
+
+    status = poll(backend, batch_id, poll_seconds, timeout, report)
+    print(file=sys.stderr)
+    if not status.done:
+        sys.exit(f"{batch_id} is still {status.status}; run collect again later.")
+    if status.status != "completed":
+        sys.exit(f"{batch_id} ended as {status.status}.")
+
+    backend.download(batch_id, os.path.join(work_dir, OUTPUT_FILE))
+    updated, inserted, failed = write_results(work_dir, batch_id)
+    write_state(work_dir, {**state, "written": True})
+    print(f"Updated {updated:,} and inserted {inserted:,} obituaries; {failed:,} requests failed.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate obituaries through a batch backend.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_command(name, help, source=False, backend=False, polling=False):
+        command = subparsers.add_parser(name, help=help)
+        command.add_argument("work_dir", help="directory holding this batch's files")
+        if source:
+            group = command.add_mutually_exclusive_group(required=True)
+            group.add_argument("--inputs", help="JSONL of obituary inputs to generate as new rows")
+            group.add_argument("--regenerate", action="store_true",
+                               help="regenerate stored obituaries matching the filters below")
+            command.add_argument("--ids", type=int, nargs="+", help="only these obituary ids")
+            command.add_argument("--style", help="only obituaries in this style")
+            command.add_argument("--length", help="only obituaries of this length")
+            command.add_argument("--limit", type=int, help="at most this many obituaries")
+        if backend:
+            command.add_argument("--backend", choices=("openai", "local"), default=None,
+                                 help="where to run the batch (default: the one it was submitted to, else openai)")
+            command.add_argument("--workers", type=int, default=8, help="worker threads for the local backend")
+        if polling:
+            command.add_argument("--poll-seconds", type=float, default=60, help="time between status checks")
+            command.add_argument("--timeout", type=float, default=None,
+                                 help="give up waiting after this many seconds")
+
+    add_command("prepare", "build the requests file", source=True)
+    add_command("submit", "submit the requests file", backend=True)
+    add_command("collect", "wait for results and write them", backend=True, polling=True)
+    add_command("run", "prepare, submit and collect", source=True, backend=True, polling=True)
+    args = parser.parse_args(argv)
+
+    if args.command in ("prepare", "run"):
+        if args.inputs:
+            records = input_records(args.inputs)
+        else:
+            filters = ObituaryFilters(obituary_style=args.style, obituary_length=args.length)
+            records = regenerate_records(filters, args.ids, args.limit)
+        prepare(args.work_dir, records)
+    if args.command in ("submit", "collect", "run"):
+        name = args.backend or read_state(args.work_dir).get("backend") or "openai"
+        backend = get_backend(name, args.work_dir, args.workers)
+        if args.command in ("submit", "run"):
+            submit(args.work_dir, backend)
+        if args.command in ("collect", "run"):
+            collect(args.work_dir, backend, args.poll_seconds, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
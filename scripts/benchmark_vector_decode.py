@@ -0,0 +1,115 @@
+"""
+Compare the per-row cost of reading embeddings through the sync psycopg2
+engine, where pgvector sends text, with the asyncpg pool, where it sends
+binary float32.
+
+Against the database, both paths fetch the same rows and the timings include
+the round trip. --synthetic skips the database and times only the decode
+step, on random vectors formatted the way Postgres sends them:
+
+    python -m scripts.benchmark_vector_decode --rows 5000
+    python -m scripts.benchmark_vector_decode --synthetic --rows 5000
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+from sqlalchemy import select
+
+from app.core.async_database import decode_vector, encode_vector
+from app.core.models import Obituary
+
+DIMENSIONS = Obituary.embedding.type.dim
+
+
+def report(label, seconds, rows):
+    per_row = seconds / rows * 1e6 if rows else 0.0
+    print(f"{label:<28} {rows:>8,} rows {seconds:>8.3f}s {per_row:>10.1f} µs/row")
+
+
+def text_decode(value):
+    # What the sync path does per row: pgvector's SQLAlchemy type parses the
+    # text into a list of floats, and callers convert that to NumPy
+    return np.asarray([float(v) for v in value[1:-1].split(",")], dtype=np.float32)
+
+
+def synthetic(rows, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((rows, DIMENSIONS)).astype(np.float32)
+    # float4 output is the shortest string that round-trips, like repr(np.float32)
+    texts = ["[" + ",".join(str(v) for v in vector.tolist()) + "]" for vector in vectors]
+    binaries = [encode_vector(vector) for vector in vectors]
+
+    started = time.perf_counter()
+    decoded_text = [text_decode(value) for value in texts]
+    report("text (psycopg2 path)", time.perf_counter() - started, rows)
+
+    started = time.perf_counter()
+    decoded_binary = [decode_vector(value) for value in binaries]
+    report("binary (asyncpg path)", time.perf_counter() - started, rows)
+
+    assert all(np.allclose(a, b) for a, b in zip(decoded_text, decoded_binary))
+    print(f"text {sum(map(len, texts)) / rows:,.0f} bytes/row, "
+          f"binary {sum(map(len, binaries)) / rows:,.0f} bytes/row")
+
+
+def query(rows):
+    return (select(Obituary.id, Obituary.embedding)
+            .where(Obituary.embedding.is_not(None))
+            .order_by(Obituary.id)
+            .limit(rows))
+
+
+def fetch_psycopg2(rows):
+    from app.core.database import get_engine
+
+    with get_engine().connect() as connection:
+        started = time.perf_counter()
+        result = connection.execute(query(rows)).all()
+        vectors = [np.asarray(embedding, dtype=np.float32) for _, embedding in result]
+        return time.perf_counter() - started, len(vectors)
+
+
+async def fetch_asyncpg(rows):
+    from app.core.async_database import close_async_pool, get_async_pool
+    from app.services.vector_reads import compile_query
+
+    sql, args = compile_query(query(rows))
+    pool = await get_async_pool()
+    try:
+        async with pool.acquire() as connection:
+            started = time.perf_counter()
+            result = await connection.fetch(sql, *args)
+            return time.perf_counter() - started, len(result)
+    finally:
+        await close_async_pool()
+
+
+def database(rows, repeat):
+    # The first round warms caches for both paths; the best round is reported
+    best_text, best_binary = None, None
+    for _ in range(repeat):
+        seconds, fetched = fetch_psycopg2(rows)
+        best_text = min(best_text or seconds, seconds)
+        seconds, fetched_binary = asyncio.run(fetch_asyncpg(rows))
+        best_binary = min(best_binary or seconds, seconds)
+    report("text (psycopg2 path)", best_text, fetched)
+    report("binary (asyncpg path)", best_binary, fetched_binary)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark text vs binary pgvector decoding.")
+    parser.add_argument("--rows", type=int, default=5000, help="embeddings to read")
+    parser.add_argument("--repeat", type=int, default=3, help="rounds against the database; the best is kept")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="time decoding of random vectors without a database")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        synthetic(args.rows)
+    else:
+        database(args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Find near-duplicate obituaries by the cosine similarity of their embeddings.
+
+Embeddings are streamed from a server-side cursor, L2-normalized and spooled
+to a float32 memmap on disk, so memory holds only a couple of blocks however
+large the table is. Pairs at or above the threshold are found with blocked
+matrix products and grouped with union-find. Each cluster is then written to
+`obit_metadata`: every member gets "duplicate_cluster" (the lowest id in the
+cluster), and every member except that first one also gets "duplicate_of".
+Search can then skip them with the `exclude_duplicates` filter.
+
+    python -m scripts.find_duplicate_obituaries --threshold 0.97
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from pgvector.psycopg2 import register_vector
+
+from app.core.database import engine
+from app.core.models import Obituary
+
+DIMENSIONS = Obituary.embedding.type.dim
+
+COUNT_SQL = "SELECT count(*) FROM obituaries WHERE embedding IS NOT NULL"
+
+STREAM_SQL = """
+SELECT id, embedding FROM obituaries
+WHERE embedding IS NOT NULL
+ORDER BY id
+LIMIT %s
+"""
+
+# Clusters from earlier runs are replaced, not merged
+CLEAR_SQL = """
+UPDATE obituaries
+SET obit_metadata = (obit_metadata::jsonb - 'duplicate_cluster' - 'duplicate_of')::json
+WHERE obit_metadata::jsonb ?| array['duplicate_cluster', 'duplicate_of']
+"""
+
+WRITE_SQL = """
+UPDATE obituaries AS o
+SET obit_metadata = (
+    COALESCE(o.obit_metadata::jsonb, '{}'::jsonb)
+    || jsonb_build_object('duplicate_cluster', d.cluster)
+    || CASE WHEN d.id <> d.cluster THEN jsonb_build_object('duplicate_of', d.cluster) ELSE '{}'::jsonb END
+)::json
+FROM unnest(%s::integer[], %s::integer[]) AS d(id, cluster)
+WHERE o.id = d.id
+"""
+
+
+class UnionFind:
+    """Disjoint sets over 0..n-1; each set's root is its smallest member."""
+
+    def __init__(self, n):
+        self.parent = np.arange(n, dtype=np.int64)
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]  # Path halving
+            i = parent[i]
+        return i
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    def roots(self):
+        return np.fromiter((self.find(i) for i in range(len(self.parent))),
+                           dtype=np.int64, count=len(self.parent))
+
+
+def normalize(block):
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return block / norms
+
+
+def spool_embeddings(connection, path, fetch_size):
+    """Stream embeddings into a normalized float32 memmap; returns (ids, vectors)."""
+    cursor = connection.cursor()
+    cursor.execute(COUNT_SQL)
+    (count,) = cursor.fetchone()
+    cursor.close()
+
+    ids = np.empty(count, dtype=np.int64)
+    vectors = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(count, DIMENSIONS))
+    if not count:
+        return ids, vectors
+
+    # Named cursor: rows arrive from the server fetch_size at a time
+    cursor = connection.cursor(name="duplicate_scan")
+    cursor.itersize = fetch_size
+    cursor.execute(STREAM_SQL, (count,))
+    loaded = 0
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        end = loaded + len(rows)
+        ids[loaded:end] = [row[0] for row in rows]
+        vectors[loaded:end] = normalize(np.stack([row[1] for row in rows]).astype(np.float32, copy=False))
+        loaded = end
+    cursor.close()
+    connection.commit()
+    vectors.flush()
+    # Rows deleted between the count and the scan leave the tail unused
+    return ids[:loaded], vectors[:loaded]
+
+
+def similar_pairs(vectors, threshold, block_size):
+    """Yield index pairs (i < j) whose cosine similarity is at least `threshold`."""
+    n = len(vectors)
+    for start in range(0, n, block_size):
+        left = np.asarray(vectors[start:start + block_size])
+        for other in range(start, n, block_size):
+            right = left if other == start else np.asarray(vectors[other:other + block_size])
+            matches = left @ right.T >= threshold
+            if other == start:
+                # Each pair once, and no self-matches
+                matches = np.triu(matches, k=1)
+            rows, cols = np.nonzero(matches)
+            if len(rows):
+                yield rows + start, cols + other
+
+
+def write_clusters(connection, ids, roots, batch_size=10000):
+    """Record clusters of two or more in obit_metadata; returns rows written."""
+    sizes = np.bincount(roots, minlength=len(roots))
+    members = np.nonzero(sizes[roots] > 1)[0]
+    member_ids = ids[members].tolist()
+    cluster_ids = ids[roots[members]].tolist()
+
+    cursor = connection.cursor()
+    cursor.execute(CLEAR_SQL)
+    for start in range(0, len(member_ids), batch_size):
+        cursor.execute(WRITE_SQL, (member_ids[start:start + batch_size], cluster_ids[start:start + batch_size]))
+    connection.commit()
+    cursor.close()
+    return len(member_ids)
+
+
+def find_duplicates(threshold=0.97, block_size=4096, fetch_size=10000, workdir=None, dry_run=False):
+    if not 0 < threshold <= 1:
+        raise ValueError(f"threshold must be in (0, 1], got {threshold}")
+    started = time.monotonic()
+    connection = engine.raw_connection()
+    try:
+        register_vector(connection.dbapi_connection)
+        with tempfile.TemporaryDirectory(dir=workdir) as spool_dir:
+            ids, vectors = spool_embeddings(connection, os.path.join(spool_dir, "embeddings.npy"), fetch_size)
+            print(f"Spooled {len(ids):,} embeddings in {time.monotonic() - started:.1f}s.", file=sys.stderr)
+
+            union_find = UnionFind(len(ids))
+            pairs = 0
+            for rows, cols in similar_pairs(vectors, threshold, block_size):
+                pairs += len(rows)
+                for a, b in zip(rows.tolist(), cols.tolist()):
+                    union_find.union(a, b)
+            del vectors
+
+        roots = union_find.roots()
+        duplicates = int(np.count_nonzero(roots != np.arange(len(roots))))
+        print(f"Found {pairs:,} similar pairs; {duplicates:,} obituaries duplicate an earlier one.")
+
+        if not dry_run:
+            written = write_clusters(connection, ids, roots)
+            print(f"Wrote cluster ids for {written:,} obituaries.")
+    finally:
+        connection.close()
+    print(f"Finished in {time.monotonic() - started:.1f}s.", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cluster near-duplicate obituaries by embedding similarity.")
+    parser.add_argument("--threshold", type=float, default=0.97,
+                        help="minimum cosine similarity for two obituaries to count as duplicates")
+    parser.add_argument("--block-size", type=int, default=4096,
+                        help="vectors per side of each similarity block")
+    parser.add_argument("--fetch-size", type=int, default=10000,
+                        help="rows per server-side cursor fetch")
+    parser.add_argument("--workdir", default=None,
+                        help="directory for the temporary embedding spool (default: system temp)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="report duplicates without writing obit_metadata")
+    args = parser.parse_args(argv)
+
+    find_duplicates(args.threshold, args.block_size, args.fetch_size, args.workdir, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
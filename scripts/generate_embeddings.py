@@ -1,40 +1,25 @@
-import openai
-import app.core.config as config  # Import the config file
+import argparse
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.core.models import Obituary
-import numpy as np
+from app.services.embeddings import backfill_embeddings
+from app.services.openai_client import EMBEDDING_MODEL
+from app.services.rate_limiter import Priority
 
-# Initialize OpenAI client with API key from config
-client = openai.OpenAI(api_key=config.OPENAI_API_KEY)
+def update_obituary_embeddings(model=EMBEDDING_MODEL, dims=None):
+    """Embed obituaries that are new or whose text changed since they were last embedded with `model`.
 
-def get_embedding(text):
-    """Generate OpenAI embeddings for the given text using the new API format."""
-    response = client.embeddings.create(
-        model="text-embedding-ada-002",
-        input=text
-    )
-    return response.data[0].embedding
-
-def update_obituary_embeddings():
-    """Retrieve obituaries without embeddings, generate them, and store in the database."""
+    Only rows updated since the last complete run are checked, a page at a time.
+    """
     db: Session = next(get_db())
-    obituaries = db.query(Obituary).filter(Obituary.embedding == None).all()  # Find obits without embeddings
-
-    if not obituaries:
-        print("No obituaries found that need embeddings.")
-        return
-
-    print(f"Found {len(obituaries)} obituaries to process.")
-
-    for obit in obituaries:
-        print(f"Generating embedding for: {obit.generated_text[:50]}...")
-        embedding = get_embedding(obit.generated_text)  # Generate embedding for obituary text
-        obit.embedding = embedding  # Store in database
-        db.commit()
-        print(f"Updated obituary ID {obit.id} with embeddings.")
+    updated = backfill_embeddings(db, model, dims, priority=Priority.BACKGROUND)
+    print(f"Updated {updated} obituaries with embeddings using {model}.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed new and changed obituaries.")
+    parser.add_argument("--model", default=EMBEDDING_MODEL, help="embedding model")
+    parser.add_argument("--dims", type=int, default=None, help="embedding size (default: the model's native size)")
+    args = parser.parse_args()
+
     print("Starting obituary embedding update...")
-    update_obituary_embeddings()
+    update_obituary_embeddings(model=args.model, dims=args.dims)
     print("Embedding update complete.")
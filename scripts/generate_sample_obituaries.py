@@ -1,12 +1,19 @@
 import os
-import json
 import random
+import asyncio
+import argparse
 import openai
 from sqlalchemy.orm import sessionmaker
 from app.core.database import engine, Obituary
-
-# Initialize OpenAI client
-client = openai.OpenAI()
+from app.services.model_router import model_router
+from app.services.openai_client import (
+    chat_completion,
+    chat_completion_async,
+    create_embedding,
+    create_embedding_async,
+)
+from app.services.embeddings import embedding_record
+from app.services.rate_limiter import Priority
 
 # Sample data for generating varied obituaries
 first_names = ["John", "Mary", "Robert", "Patricia", "James", "Jennifer", "Michael", "Linda", "William", "Elizabeth"]
@@ -37,8 +44,10 @@ community_impacts = [
     "was a beloved member of the neighborhood"
 ]
 
-# Function to generate a sample obituary using OpenAI
-def generate_obituary():
+SAMPLE_SOURCE = "generate_sample_obituaries"
+
+def build_sample_input():
+    """Pick random sample details and build the obituary prompt for them."""
     name = f"{random.choice(first_names)} {random.choice(last_names)}"
     birth_year = random.randint(1930, 1985)
     death_year = birth_year + random.randint(50, 90)
@@ -52,47 +61,147 @@ def generate_obituary():
         f"They also made a significant impact on the community by {community_impact}."
     )
 
-    response = client.chat.completions.create(
-        model="gpt-4-turbo",
-        messages=[{"role": "system", "content": "You are an obituary writer."},
-                  {"role": "user", "content": obituary_prompt}],
-        temperature=0.7,
-    )
-    
-    generated_text = response.choices[0].message.content.strip()
-    openai_score = random.uniform(70, 100)  # Simulating AI score
-    teacher_score = random.uniform(60, 100)  # Simulating teacher's score
-    final_score = (openai_score + teacher_score) / 2
-
-    input_data = json.dumps({
+    input_data = {
         "name": name,
         "birth_year": birth_year,
         "death_year": death_year,
         "career": career,
         "achievement": achievement,
         "community_impact": community_impact
-    })
+    }
+
+    return input_data, obituary_prompt
+
+def build_completion_request(obituary_prompt):
+    choice = model_router.select("sample_obituary")
+    return dict(
+        model=choice.model,
+        messages=[{"role": "system", "content": "You are an obituary writer."},
+                  {"role": "user", "content": obituary_prompt}],
+        priority=Priority.BACKGROUND,
+        **choice.params,
+    )
+
+# Function to generate a sample obituary using OpenAI
+def generate_obituary():
+    input_data, obituary_prompt = build_sample_input()
+    response = chat_completion(**build_completion_request(obituary_prompt))
+    generated_text = response.choices[0].message.content.strip()
+    return input_data, generated_text
 
-    return input_data, generated_text, openai_score, teacher_score, final_score
+async def generate_obituary_async():
+    input_data, obituary_prompt = build_sample_input()
+    response = await chat_completion_async(**build_completion_request(obituary_prompt))
+    generated_text = response.choices[0].message.content.strip()
+    return input_data, generated_text
+
+def count_existing_samples(session):
+    """Samples already committed by earlier runs of this script."""
+    return session.query(Obituary).filter(
+        Obituary.obit_metadata["source"].as_string() == SAMPLE_SOURCE
+    ).count()
+
+def to_obituary(sample, embedding=None):
+    input_data, generated_text = sample
+    # Left unscored for scripts.score_obituaries, so samples only rank on
+    # real judge scores
+    return Obituary(
+        input_data=input_data,
+        generated_text=generated_text,
+        embedding=embedding,
+        embeddings=[embedding_record(generated_text, embedding)] if embedding is not None else [],
+        obit_metadata={"source": SAMPLE_SOURCE}
+    )
+
+def flush_batch(session, samples, embeddings=None):
+    """Commit one batch of samples, with their embeddings if provided."""
+    embeddings = embeddings or [None] * len(samples)
+    session.add_all([to_obituary(sample, embedding) for sample, embedding in zip(samples, embeddings)])
+    session.commit()
+    print(f"Committed {len(samples)} sample obituaries.")
+
+def embed_texts(samples):
+    """Embed a batch of generated texts with a single embeddings call."""
+    response = create_embedding([sample[1] for sample in samples], priority=Priority.BACKGROUND)
+    return [item.embedding for item in response.data]
+
+async def embed_texts_async(samples):
+    response = await create_embedding_async([sample[1] for sample in samples], priority=Priority.BACKGROUND)
+    return [item.embedding for item in response.data]
 
 # Insert sample obituaries into database
-def insert_sample_obituaries(n=100):
+def insert_sample_obituaries(n=100, batch_size=10, embed=False):
+    """Generate samples serially until the table holds `n`, committing every `batch_size` rows."""
     Session = sessionmaker(bind=engine)
     session = Session()
-    
-    for _ in range(n):
-        input_data, generated_text, openai_score, teacher_score, final_score = generate_obituary()
-        obituary = Obituary(
-            input_data=input_data,
-            generated_text=generated_text,
-            openai_score=openai_score,
-            teacher_score=teacher_score,
-            final_score=final_score
-        )
-        session.add(obituary)
-    
-    session.commit()
-    session.close()
+
+    try:
+        remaining = n - count_existing_samples(session)
+        batch = []
+        for _ in range(max(remaining, 0)):
+            batch.append(generate_obituary())
+            if len(batch) >= batch_size:
+                flush_batch(session, batch, embed_texts(batch) if embed else None)
+                batch = []
+        if batch:
+            flush_batch(session, batch, embed_texts(batch) if embed else None)
+    finally:
+        session.close()
+
+async def insert_sample_obituaries_async(n=100, concurrency=8, batch_size=10, embed=False):
+    """
+    Generate samples with up to `concurrency` requests in flight until the table
+    holds `n`. Finished samples are committed every `batch_size` rows, so a
+    failure only loses the uncommitted batch and a rerun picks up from there.
+    """
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded_generate():
+        async with semaphore:
+            return await generate_obituary_async()
+
+    async def flush(batch):
+        embeddings = await embed_texts_async(batch) if embed else None
+        flush_batch(session, batch, embeddings)
+
+    try:
+        remaining = n - count_existing_samples(session)
+        if remaining <= 0:
+            print(f"Table already holds {n} sample obituaries.")
+            return
+
+        tasks = [asyncio.create_task(bounded_generate()) for _ in range(remaining)]
+        batch, failures = [], 0
+        for finished in asyncio.as_completed(tasks):
+            try:
+                batch.append(await finished)
+            except openai.OpenAIError as e:
+                failures += 1
+                print(f"Sample generation failed: {e}")
+                continue
+            if len(batch) >= batch_size:
+                await flush(batch)
+                batch = []
+        if batch:
+            await flush(batch)
+        if failures:
+            print(f"{failures} samples failed; rerun to fill the gap.")
+    finally:
+        session.close()
 
 if __name__ == "__main__":
-    insert_sample_obituaries(10)  # Generates and inserts 10 sample obituaries
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate sample obituaries with OpenAI.")
+    parser.add_argument("--count", type=int, default=10, help="total sample obituaries the table should hold")
+    parser.add_argument("--concurrency", type=int, default=8, help="generation requests in flight")
+    parser.add_argument("--batch-size", type=int, default=10, help="rows per commit")
+    parser.add_argument("--embed", action="store_true", help="attach embeddings in the same pass")
+    parser.add_argument("--sync", action="store_true", help="generate serially without asyncio")
+    args = parser.parse_args()
+
+    if args.sync:
+        insert_sample_obituaries(args.count, args.batch_size, args.embed)
+    else:
+        asyncio.run(insert_sample_obituaries_async(args.count, args.concurrency, args.batch_size, args.embed))
+    print("Samples are unscored; run `python -m scripts.score_obituaries` to judge them.")
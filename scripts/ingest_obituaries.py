@@ -0,0 +1,217 @@
+"""
+Bulk-load obituaries from a JSONL or CSV archive.
+
+Each record holds the obituary input (either an `ObituaryCreate` or a
+`ScratchpadNotesRequest` shape, flat or nested under "input_data") plus the
+row columns `generated_text` and, optionally, `openai_score`, `teacher_score`,
+`final_score` and `obit_metadata`. In CSV files, list and object cells are
+JSON-encoded.
+
+Rows are validated, COPY'd into a temporary staging table chunk by chunk and
+merged into `obituaries` with a single INSERT ... SELECT. The checkpoint for
+the source is written in the same transaction as each merge, so an interrupted
+run resumes after the last committed chunk.
+
+Embeddings aren't generated here. New rows are past the embedding backfill's
+last run, so the next `python -m scripts.generate_embeddings` picks them up
+and embeds them page by page.
+
+Usage:
+    python -m scripts.ingest_obituaries archive.jsonl
+    python -m scripts.ingest_obituaries archive.csv --format csv --chunk-size 10000
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from pydantic import ValidationError
+
+from app.core.database import engine
+from app.core.schemas import ObituaryCreate
+from app.core.scratchpad_notes_request import ScratchpadNotesRequest
+
+ROW_COLUMNS = ("generated_text", "openai_score", "teacher_score", "final_score", "obit_metadata")
+STAGING_COLUMNS = ("input_data",) + ROW_COLUMNS
+
+STAGING_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS obituaries_staging (
+    input_data jsonb NOT NULL,
+    generated_text text NOT NULL,
+    openai_score double precision,
+    teacher_score double precision,
+    final_score double precision,
+    obit_metadata json
+) ON COMMIT DELETE ROWS
+"""
+
+COPY_SQL = f"COPY obituaries_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+MERGE_SQL = f"""
+INSERT INTO obituaries ({', '.join(STAGING_COLUMNS)})
+SELECT {', '.join(STAGING_COLUMNS)}
+FROM obituaries_staging
+RETURNING id
+"""
+
+CHECKPOINT_SQL = """
+INSERT INTO ingest_checkpoints (source, records_read, rows_loaded, updated_at)
+VALUES (%(source)s, %(records_read)s, %(rows_loaded)s, now())
+ON CONFLICT (source) DO UPDATE
+SET records_read = EXCLUDED.records_read,
+    rows_loaded = EXCLUDED.rows_loaded,
+    updated_at = now()
+"""
+
+
+def read_records(path, fmt):
+    """Stream raw records from the archive without loading it into memory."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "jsonl":
+            for line in f:
+                if line.strip():
+                    yield line
+        else:
+            for record in csv.DictReader(f):
+                yield {key: decode_csv_cell(value) for key, value in record.items() if value != ""}
+
+
+def decode_csv_cell(value):
+    """CSV cells holding lists or objects are JSON-encoded."""
+    if value[:1] in ("[", "{"):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            pass
+    return value
+
+
+def to_staging_row(record):
+    """Validate one record and return it as a tuple in STAGING_COLUMNS order."""
+    if isinstance(record, str):
+        record = json.loads(record)
+    record = dict(record)
+    row = {column: record.pop(column, None) for column in ROW_COLUMNS}
+    input_data = record.pop("input_data", record)
+
+    if not row["generated_text"]:
+        raise ValueError("generated_text is required")
+
+    model = ScratchpadNotesRequest if "unstructured_notes" in input_data else ObituaryCreate
+    validated = model(**input_data)
+
+    return (
+        json.dumps(validated.model_dump(mode="json")),
+        row["generated_text"],
+        row["openai_score"],
+        row["teacher_score"],
+        row["final_score"],
+        json.dumps(row["obit_metadata"]) if row["obit_metadata"] is not None else None,
+    )
+
+
+def copy_rows(cursor, rows):
+    """COPY validated rows into the staging table."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(COPY_SQL, buffer)
+
+
+def report_progress(rows_loaded, loaded_this_run, started):
+    elapsed = max(time.monotonic() - started, 1e-9)
+    print(
+        f"\r{rows_loaded:,} rows loaded ({loaded_this_run / elapsed:,.0f} rows/sec)",
+        end="",
+        file=sys.stderr,
+        flush=True,
+    )
+
+
+def ingest(path, fmt="jsonl", chunk_size=5000, source=None):
+    """
+    Load an archive into `obituaries`, resuming from the source's checkpoint;
+    returns the number of rows loaded by this run.
+    """
+    source = source or os.path.abspath(path)
+    rejected = 0
+    loaded_this_run = 0
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(STAGING_DDL)
+        cursor.execute(
+            "SELECT records_read, rows_loaded FROM ingest_checkpoints WHERE source = %s",
+            (source,),
+        )
+        records_read, rows_loaded = cursor.fetchone() or (0, 0)
+        connection.commit()
+
+        if records_read:
+            print(f"Resuming {source} after record {records_read:,}.")
+
+        records = islice(read_records(path, fmt), records_read, None)
+        started = time.monotonic()
+
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+
+            rows = []
+            for offset, record in enumerate(chunk, start=records_read + 1):
+                try:
+                    rows.append(to_staging_row(record))
+                except (ValidationError, ValueError, TypeError) as e:
+                    rejected += 1
+                    print(f"\nSkipping record {offset}: {e}", file=sys.stderr)
+
+            if rows:
+                copy_rows(cursor, rows)
+                cursor.execute(MERGE_SQL)
+                chunk_ids = [row[0] for row in cursor.fetchall()]
+            else:
+                chunk_ids = []
+
+            records_read += len(chunk)
+            rows_loaded += len(chunk_ids)
+            cursor.execute(
+                CHECKPOINT_SQL,
+                {"source": source, "records_read": records_read, "rows_loaded": rows_loaded},
+            )
+            connection.commit()
+
+            loaded_this_run += len(chunk_ids)
+            report_progress(rows_loaded, loaded_this_run, started)
+    finally:
+        connection.close()
+
+    print(f"\nLoaded {loaded_this_run:,} rows from {source} ({rejected:,} rejected).")
+    if loaded_this_run:
+        print("Run `python -m scripts.generate_embeddings` to embed them.")
+
+    return loaded_this_run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load obituaries through PostgreSQL COPY.")
+    parser.add_argument("path", help="JSONL or CSV file to load")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default=None,
+                        help="input format (default: from the file extension)")
+    parser.add_argument("--chunk-size", type=int, default=5000,
+                        help="records per COPY/merge transaction")
+    parser.add_argument("--source", default=None,
+                        help="checkpoint key (default: absolute path of the file)")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "jsonl")
+    ingest(args.path, fmt, args.chunk_size, args.source)
+
+
+if __name__ == "__main__":
+    main()
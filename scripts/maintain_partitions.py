@@ -0,0 +1,62 @@
+"""
+Maintain the monthly partitions of `obituaries`: create the upcoming months
+and detach months older than the retention window. Rows that landed in the
+default partition, `obituaries_default`, are moved into their months'
+partitions. Detached months stay as
+standalone tables (e.g. `obituaries_y2024m01`) for archiving, unless --drop
+is given. Run it from cron, e.g. daily:
+
+    python -m scripts.maintain_partitions --months-ahead 3 --retain-months 24
+"""
+import argparse
+from datetime import datetime, timezone
+
+from app.core.database import engine
+from app.core.partitions import (
+    MONTHS_AHEAD,
+    add_months,
+    detach_partitions,
+    ensure_future_partitions,
+    existing_partitions,
+    month_start,
+)
+
+
+def maintain(months_ahead=MONTHS_AHEAD, retain_months=None, drop=False, dry_run=False):
+    with engine.connect() as connection:
+        partitions = existing_partitions(connection)
+    print(f"{len(partitions)} partitions: {', '.join(partitions) or 'none'}")
+    if dry_run:
+        return
+
+    # In a transaction, so rows moved out of the default partition are never lost
+    with engine.begin() as connection:
+        created = ensure_future_partitions(connection, months_ahead)
+    print(f"Created {len(created)} partitions{': ' + ', '.join(created) if created else '.'}")
+
+    if retain_months is not None:
+        cutoff = add_months(month_start(datetime.now(timezone.utc)), -retain_months)
+        with engine.begin() as connection:
+            detached = detach_partitions(connection, cutoff, drop=drop)
+        action = "Dropped" if drop else "Detached"
+        print(f"{action} {len(detached)} partitions before {cutoff:%Y-%m}"
+              f"{': ' + ', '.join(detached) if detached else '.'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create upcoming and detach old obituary partitions.")
+    parser.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD,
+                        help="months of partitions to keep ready beyond the current one")
+    parser.add_argument("--retain-months", type=int, default=None,
+                        help="detach partitions older than this many months (default: keep all)")
+    parser.add_argument("--drop", action="store_true",
+                        help="drop detached partitions, with their embeddings and revisions, "
+                             "instead of keeping them as archive tables")
+    parser.add_argument("--dry-run", action="store_true", help="only list the current partitions")
+    args = parser.parse_args(argv)
+
+    maintain(args.months_ahead, args.retain_months, args.drop, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Score obituaries that have no judge scores yet, such as rows written by
+`scripts.batch_generate` or ingested without scores, or rows the background
+queue dropped.
+
+    python -m scripts.score_obituaries
+    python -m scripts.score_obituaries --rescore --style poetic --limit 500
+
+Rows are read in pages of --page-rows by id. Each page is packed into judge
+calls by token budget (JUDGE_BATCH_TOKENS), and each call's scores are
+written with one UPDATE. `--rescore` also re-judges rows that already have
+scores, e.g. after changing the rubric. A changed SCORE_WEIGHTS only needs
+`--reblend`, which recomputes final_score in SQL without calling the judge.
+"""
+import argparse
+import sys
+
+from sqlalchemy import select, text
+
+from app.core.database import SessionLocal, get_engine
+from app.core.models import Obituary
+from app.core.schemas import ObituaryFilters
+from app.services.judge import SCORE_WEIGHTS, score_obituaries
+from app.services.search import filter_conditions
+
+REBLEND_SQL = text("""
+UPDATE obituaries
+SET final_score = (COALESCE(:openai * openai_score, 0) + COALESCE(:teacher * teacher_score, 0))
+    / NULLIF(CASE WHEN openai_score IS NOT NULL THEN :openai ELSE 0 END
+             + CASE WHEN teacher_score IS NOT NULL THEN :teacher ELSE 0 END, 0)
+WHERE openai_score IS NOT NULL OR teacher_score IS NOT NULL
+""")
+
+
+def pages(db, filters, rescore=False, ids=None, limit=None, page_rows=500):
+    """Lists of (id, generated_text) in id order, stopping after `limit` rows."""
+    last_id, remaining = 0, limit
+    while remaining is None or remaining > 0:
+        size = page_rows if remaining is None else min(page_rows, remaining)
+        query = (select(Obituary.id, Obituary.generated_text)
+                 .where(Obituary.id > last_id, Obituary.generated_text.isnot(None), *filter_conditions(filters))
+                 .order_by(Obituary.id)
+                 .limit(size))
+        if not rescore:
+            query = query.where(Obituary.openai_score.is_(None))
+        if ids:
+            query = query.where(Obituary.id.in_(ids))
+        rows = [tuple(row) for row in db.execute(query)]
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+def reblend(db):
+    result = db.execute(REBLEND_SQL, {"openai": SCORE_WEIGHTS.get("openai", 0.0),
+                                      "teacher": SCORE_WEIGHTS.get("teacher", 0.0)})
+    db.commit()
+    return result.rowcount
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score obituaries with the LLM judge.")
+    parser.add_argument("--rescore", action="store_true", help="also re-judge obituaries that already have scores")
+    parser.add_argument("--reblend", action="store_true",
+                        help="only recompute final_score from stored scores with the current SCORE_WEIGHTS")
+    parser.add_argument("--ids", type=int, nargs="+", help="only these obituary ids")
+    parser.add_argument("--style", help="only obituaries in this style")
+    parser.add_argument("--length", help="only obituaries of this length")
+    parser.add_argument("--limit", type=int, help="at most this many obituaries")
+    parser.add_argument("--page-rows", type=int, default=500, help="rows read per query")
+    args = parser.parse_args(argv)
+
+    get_engine()
+    db = SessionLocal()
+    try:
+        if args.reblend:
+            print(f"Recomputed final_score for {reblend(db):,} obituaries.")
+            return
+        filters = ObituaryFilters(obituary_style=args.style, obituary_length=args.length)
+        seen = scored = 0
+        for page in pages(db, filters, args.rescore, args.ids, args.limit, args.page_rows):
+            seen += len(page)
+            scored += len(score_obituaries(db, page))
+            print(f"\rScored {scored:,} of {seen:,}", end="", file=sys.stderr, flush=True)
+        print(file=sys.stderr)
+        # Rows the judge skipped stay unscored and are retried on the next run
+        print(f"Scored {scored:,} obituaries; {seen - scored:,} left unscored.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
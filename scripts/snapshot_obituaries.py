@@ -0,0 +1,204 @@
+"""
+Write a columnar Parquet snapshot of `obituaries` for analytics.
+
+Rows are read from a server-side cursor and written one row group per batch,
+so memory holds a single batch. Embeddings are stored as a
+fixed_size_list<float32, 1536> column, which loads into NumPy as an (n, 1536)
+view of the Arrow buffer without copying.
+
+A full snapshot replaces the Parquet files in the output directory. With
+--incremental, only rows updated since the previous run are appended, as a
+new file. An obituary may then appear in several files, and the row with
+the latest `updated_at` is current:
+
+    python -m scripts.snapshot_obituaries snapshots/
+    python -m scripts.snapshot_obituaries snapshots/ --incremental
+
+Reading embeddings back:
+
+    from scripts.snapshot_obituaries import load_embeddings
+    ids, vectors, present = load_embeddings("snapshots/obituaries-20261019T210000.parquet")
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import select
+
+from app.core.database import engine
+from app.core.models import Obituary
+
+DIMENSIONS = Obituary.embedding.type.dim
+STATE_FILE = "_snapshot_state.json"
+# Incremental runs re-read this much before the last watermark, to catch
+# rows from transactions that committed after the previous snapshot read
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+SCHEMA = pa.schema([
+    ("id", pa.int32()),
+    ("created_at", pa.timestamp("us", tz="UTC")),
+    ("updated_at", pa.timestamp("us", tz="UTC")),
+    ("name", pa.string()),
+    ("birth_year", pa.int32()),
+    ("death_year", pa.int32()),
+    ("obituary_style", pa.string()),
+    ("obituary_length", pa.string()),
+    ("openai_score", pa.float64()),
+    ("teacher_score", pa.float64()),
+    ("final_score", pa.float64()),
+    ("generated_text", pa.string()),
+    ("input_data", pa.string()),
+    ("embedding", pa.list_(pa.float32(), DIMENSIONS)),
+])
+
+SCALAR_COLUMNS = [field.name for field in SCHEMA if field.name not in ("input_data", "embedding")]
+
+
+def embedding_array(embeddings):
+    """A fixed-size list column; missing embeddings are null (their slots are zero-filled)."""
+    values = np.zeros((len(embeddings), DIMENSIONS), dtype=np.float32)
+    missing = np.zeros(len(embeddings), dtype=bool)
+    for i, embedding in enumerate(embeddings):
+        if embedding is None:
+            missing[i] = True
+        else:
+            values[i] = embedding
+    return pa.FixedSizeListArray.from_arrays(
+        pa.array(values.reshape(-1)), DIMENSIONS, mask=pa.array(missing)
+    )
+
+
+def to_record_batch(rows):
+    columns = {name: [row[name] for row in rows] for name in SCALAR_COLUMNS}
+    columns["input_data"] = [json.dumps(row["input_data"]) for row in rows]
+    arrays = [
+        embedding_array([row["embedding"] for row in rows]) if field.name == "embedding"
+        else pa.array(columns[field.name], type=field.type)
+        for field in SCHEMA
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=SCHEMA)
+
+
+def read_state(out_dir):
+    path = os.path.join(out_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_state(out_dir, state):
+    path = os.path.join(out_dir, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def snapshot(out_dir, incremental=False, batch_rows=10000, compression="zstd"):
+    """Write a snapshot file into `out_dir`; returns its path, or None if nothing changed."""
+    os.makedirs(out_dir, exist_ok=True)
+    state = read_state(out_dir) if incremental else None
+    if incremental and state is None:
+        print("No previous snapshot; writing a full one.", file=sys.stderr)
+
+    query = select(*(getattr(Obituary, name) for name in SCHEMA.names)).order_by(Obituary.id)
+    if state:
+        since = datetime.fromisoformat(state["watermark"]) - WATERMARK_OVERLAP
+        query = query.where(Obituary.updated_at > since)
+
+    started = time.monotonic()
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(out_dir, f"obituaries-{stamp}.parquet")
+    watermark = datetime.fromisoformat(state["watermark"]) if state else None
+    rows_written = 0
+
+    writer = None
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=batch_rows).execute(query)
+        for rows in result.mappings().partitions():
+            if writer is None:
+                writer = pq.ParquetWriter(path + ".tmp", SCHEMA, compression=compression,
+                                          use_dictionary=[name for name in SCHEMA.names if name != "embedding"])
+            batch = to_record_batch(rows)
+            writer.write_batch(batch, row_group_size=len(rows))
+            rows_written += len(rows)
+            latest = max(row["updated_at"] for row in rows)
+            watermark = latest if watermark is None else max(watermark, latest)
+            print(f"\r{rows_written:,} rows written", end="", file=sys.stderr, flush=True)
+
+    if writer is None:
+        print("No rows changed since the last snapshot.")
+        return None
+    writer.close()
+
+    if not state:
+        # A full snapshot supersedes every earlier file
+        for old in glob.glob(os.path.join(out_dir, "obituaries-*.parquet")):
+            os.remove(old)
+    os.replace(path + ".tmp", path)
+    write_state(out_dir, {"watermark": watermark.isoformat(), "last_file": os.path.basename(path)})
+
+    print(f"\nWrote {rows_written:,} rows to {path} in {time.monotonic() - started:.1f}s.")
+    return path
+
+
+def iter_embeddings(path):
+    """
+    Yield (ids, vectors, present) per row group. `vectors` is an (n, dims)
+    float32 NumPy view of the Arrow buffer: no copy is made. Rows without
+    an embedding are False in `present`, and their vectors hold zeros.
+    """
+    parquet_file = pq.ParquetFile(path)
+    for index in range(parquet_file.num_row_groups):
+        table = parquet_file.read_row_group(index, columns=["id", "embedding"])
+        (ids,) = table.column("id").chunks
+        (embeddings,) = table.column("embedding").chunks
+        # Read the float buffer directly: to_numpy() would copy to fill in the
+        # child nulls Parquet writes under missing embeddings
+        values = embeddings.values
+        vectors = np.frombuffer(values.buffers()[1], dtype=np.float32,
+                                count=len(embeddings) * DIMENSIONS,
+                                offset=(values.offset + embeddings.offset * DIMENSIONS) * 4)
+        vectors = vectors.reshape(-1, DIMENSIONS)
+        present = embeddings.is_valid().to_numpy(zero_copy_only=False)
+        yield ids.to_numpy(zero_copy_only=True), vectors, present
+
+
+def load_embeddings(path):
+    """
+    (ids, vectors, present) for a whole snapshot file. A file with one row
+    group is returned as a zero-copy view; several are concatenated once.
+    """
+    blocks = list(iter_embeddings(path))
+    if len(blocks) == 1:
+        return blocks[0]
+    return (
+        np.concatenate([ids for ids, _, _ in blocks]),
+        np.concatenate([vectors for _, vectors, _ in blocks]),
+        np.concatenate([present for _, _, present in blocks]),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a Parquet snapshot of obituaries and embeddings.")
+    parser.add_argument("out_dir", help="directory for snapshot files")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only append rows updated since the last snapshot in out_dir")
+    parser.add_argument("--batch-rows", type=int, default=10000,
+                        help="rows per cursor fetch and Parquet row group")
+    parser.add_argument("--compression", default="zstd",
+                        help="Parquet compression codec (e.g. zstd, snappy, none)")
+    args = parser.parse_args(argv)
+
+    snapshot(args.out_dir, args.incremental, args.batch_rows, args.compression)
+
+
+if __name__ == "__main__":
+    main()